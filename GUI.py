@@ -1,500 +1,668 @@
-import tkinter as tk
-from tkinter import ttk, messagebox
-import numpy as np
-from catboost import CatBoostRegressor
-from sklearn.ensemble import AdaBoostRegressor
-import joblib
-import os
-
-# ==================== 常量配置 ====================
-PREDICTION_TYPES = ["OAC_W", "OCC_D", "OCC_W"]
-
-# 参数范围配置
-PARAMETER_RANGES = {
-    "Anode_Copper_content": (99.46, 99.90),
-    "Anode_Bismuth_content": (0.0074, 0.0406),
-    "Anode_Antimony_content": (0.0161, 0.0534),
-    "Anode_Nickel_content": (0.0145, 0.394),
-    "Anode_Arsenic_content": (0.0391, 0.190),
-    "Current Density": (259.073, 384.352),
-    "Inlet Sulfate ion concentration": (161.86, 191.73),
-    "Inlet Copper ion concentration": (38.81, 53.65),
-    "Inlet Antimony ion concentration": (0.16, 0.27),
-    "Inlet Bismuth ion concentration": (0.08, 0.319),
-    "Inlet Nickel ion concentration": (5.68, 14.98),
-    "Inlet Arsenic ion concentration": (5, 14.82),
-    "Electrolyte_Time": (3.33, 334),
-    "Inlet Chloride ion concentration": (0.043, 0.072),
-    "Number of Electrolysis Tanks": (42, 436)
-}
-
-# 输出浓度范围配置
-OUTPUT_CONCENTRATION_RANGES = {
-    "OAC_W": (6.36, 9.11),
-    "OCC_D": (44.35, 50.14),
-    "OCC_W": (44.35, 50.14)
-}
-
-# 模型配置
-MODEL_CONFIG = {
-    "OAC_W": {
-        "model_file": "catboost_OAC_W_model.pkl",
-        "scaler_X_file": "scaler_X_OAC_W.pkl",
-        "scaler_y_file": "scaler_y_OAC_W.pkl",
-        "model_type": "joblib"
-    },
-    "OCC_D": {
-        "model_file": "catboost_OCC_D_model.cbm",
-        "scaler_X_file": "scaler_X_OCC_D.pkl",
-        "scaler_y_file": "scaler_y_OCC_D.pkl",
-        "model_type": "catboost"
-    },
-    "OCC_W": {
-        "model_file": "adaboost_OCC_W_model.pkl",
-        "scaler_X_file": "scaler_X_OCC_W.pkl",
-        "scaler_y_file": "scaler_y_OCC_W.pkl",
-        "model_type": "joblib"
-    }
-}
-
-# 参数配置
-PARAMETERS_CONFIG = {
-    "OAC_W": {
-        "chemical": {
-            "Anode_Copper_content": 99.83,
-            "Anode_Bismuth_content": 0.0156,
-            "Anode_Antimony_content": 0.0255,
-            "Anode_Nickel_content": 0.0406,
-            "Anode_Arsenic_content": 0.0873
-        },
-        "physical": {
-            "Inlet Sulfate ion concentration": 178.18,
-            "Inlet Copper ion concentration": 48.97,
-            "Inlet Antimony ion concentration": 0.200,
-            "Inlet Bismuth ion concentration": 0.170,
-            "Inlet Nickel ion concentration": 10.700,
-            "Inlet Chloride ion concentration": 0.057,
-            "Inlet Arsenic ion concentration": 8.67
-        },
-        "experimental": {
-            "Current Density": 340.417,
-            "Electrolyte_Time": 164,
-            "Number of Electrolysis Tanks": 371.67,
-        }
-    },
-    "OCC_D": {
-        "chemical": {
-            "Anode_Copper_content": 99.83,
-            "Anode_Bismuth_content": 0.0226,
-            "Anode_Antimony_content": 0.02,
-            "Anode_Nickel_content": 0.0271,
-            "Anode_Arsenic_content": 0.09
-        },
-        "physical": {
-            "Inlet Sulfate ion concentration": 171.61,
-            "Inlet Copper ion concentration": 50.38,
-            "Inlet Chloride ion concentration": 0.056
-        },
-        "experimental": {
-            "Current Density": 327.204,
-            "Electrolyte_Time": 37.33,
-            "Number of Electrolysis Tanks": 415.83,
-        }
-    },
-    "OCC_W": {
-        "chemical": {
-            "Anode_Copper_content": 99.79,
-            "Anode_Bismuth_content": 0.0199,
-            "Anode_Antimony_content": 0.0437,
-            "Anode_Nickel_content": 0.0392,
-            "Anode_Arsenic_content": 0.1015
-        },
-        "physical": {
-            "Inlet Sulfate ion concentration": 168,
-            "Inlet Copper ion concentration": 49.33,
-            "Inlet Antimony ion concentration": 0.240,
-            "Inlet Bismuth ion concentration": 0.093,
-            "Inlet Nickel ion concentration": 9.9,
-            "Inlet Chloride ion concentration": 0.056,
-            "Inlet Arsenic ion concentration": 9.30
-        },
-        "experimental": {
-            "Current Density": 327.015,
-            "Electrolyte_Time": 108,
-            "Number of Electrolysis Tanks": 269.5,
-        }
-    }
-}
-
-# 输入字段标签映射
-INPUT_LABELS = {
-    "Anode_Copper_content": "Anode Copper content (%):",
-    "Anode_Bismuth_content": "Anode Bismuth content (%):",
-    "Anode_Antimony_content": "Anode Antimony content (%):",
-    "Anode_Nickel_content": "Anode Nickel content (%):",
-    "Anode_Arsenic_content": "Anode Arsenic content (%):",
-    "Current Density": "Current Density (A/m2):",
-    "Inlet Sulfate ion concentration": "Inlet Sulfate ion concentration (g/L):",
-    "Inlet Copper ion concentration": "Inlet Copper ion concentration (g/L):",
-    "Inlet Antimony ion concentration": "Inlet Antimony ion concentration (g/L):",
-    "Inlet Bismuth ion concentration": "Inlet Bismuth ion concentration (g/L):",
-    "Inlet Nickel ion concentration": "Inlet Nickel ion concentration (g/L):",
-    "Inlet Arsenic ion concentration": "Inlet Arsenic ion concentration (g/L):",
-    "Electrolyte_Time": "Electrolyte Time (Day):",
-    "Inlet Chloride ion concentration": "Inlet Chloride ion concentration (g/L):",
-    "Number of Electrolysis Tanks": "Number of Electrolysis Tanks (Set):"
-}
-
-# 参数步长
-PARAMETER_STEPS = {
-    "Electrolyte_Time": 0.2,
-    "Anode_Copper_content": 0.5,
-    "Anode_Bismuth_content": 0.02,
-    "Anode_Antimony_content": 0.02,
-    "Anode_Nickel_content": 0.5,
-    "Anode_Arsenic_content": 0.2,
-    "Current Density": 1.0,
-    "Inlet Sulfate ion concentration": 5.0,
-    "Inlet Copper ion concentration": 0.1,
-    "Inlet Antimony ion concentration": 0.1,
-    "Inlet Bismuth ion concentration": 0.1,
-    "Inlet Nickel ion concentration": 0.1,
-    "Inlet Chloride ion concentration": 0.02,
-    "Inlet Arsenic ion concentration": 0.1,
-    "Number of Electrolysis Tanks": 5.0,
-}
-
-# 预测类型的输入顺序
-INPUT_ORDER = {
-    "OAC_W": [
-        "Electrolyte_Time",
-        "Anode_Copper_content",
-        "Anode_Bismuth_content",
-        "Anode_Antimony_content",
-        "Anode_Nickel_content",
-        "Anode_Arsenic_content",
-        "Current Density",
-        "Inlet Sulfate ion concentration",
-        "Inlet Copper ion concentration",
-        "Inlet Antimony ion concentration",
-        "Inlet Bismuth ion concentration",
-        "Inlet Nickel ion concentration",
-        "Inlet Chloride ion concentration",
-        "Inlet Arsenic ion concentration",
-        "Number of Electrolysis Tanks"
-    ],
-    "OCC_D": [
-        "Electrolyte_Time",
-        "Anode_Copper_content",
-        "Anode_Bismuth_content",
-        "Anode_Antimony_content",
-        "Anode_Nickel_content",
-        "Anode_Arsenic_content",
-        "Current Density",
-        "Inlet Sulfate ion concentration",
-        "Inlet Copper ion concentration",
-        "Inlet Chloride ion concentration",
-        "Number of Electrolysis Tanks"
-    ],
-    "OCC_W": [
-        "Electrolyte_Time",
-        "Anode_Copper_content",
-        "Anode_Bismuth_content",
-        "Anode_Antimony_content",
-        "Anode_Nickel_content",
-        "Anode_Arsenic_content",
-        "Current Density",
-        "Inlet Sulfate ion concentration",
-        "Inlet Copper ion concentration",
-        "Inlet Antimony ion concentration",
-        "Inlet Bismuth ion concentration",
-        "Inlet Nickel ion concentration",
-        "Inlet Chloride ion concentration",
-        "Inlet Arsenic ion concentration",
-        "Number of Electrolysis Tanks"
-    ]
-}
-
-
-class IntegratedPredictor:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("Integrated ML Prediction for electrolyte outlet Copper and Arsenic ion concentration")
-        self.root.geometry("1300x900")
-        self.root.configure(bg="#f0f8ff")
-
-        # 设置字体
-        self.root.option_add("*TButton.Font", ("Times New Roman", 16, "bold"))
-        self.root.option_add("*TLabel.Font", ("Times New Roman", 14))
-        self.root.option_add("*TEntry.Font", ("Times New Roman", 14))
-
-        # 初始化模型字典
-        self.models = {pred_type: {"model": None, "scaler_X": None, "scaler_y": None}
-                       for pred_type in PREDICTION_TYPES}
-        self.input_vars = {}
-        self.current_prediction_type = tk.StringVar(value="OAC_W")
-
-        # 加载模型和创建界面
-        self.load_all_models()
-        self.create_widgets()
-
-    def load_all_models(self):
-        """加载所有预测类型的模型"""
-        for pred_type in PREDICTION_TYPES:
-            config = MODEL_CONFIG[pred_type]
-            self.load_model(pred_type, config["model_file"],
-                          config["scaler_X_file"], config["scaler_y_file"],
-                          config["model_type"])
-
-    def load_model(self, prediction_type, model_file, scaler_X_file, scaler_y_file, model_type):
-        """加载单个模型和对应的scaler"""
-        try:
-            if not os.path.exists(model_file):
-                messagebox.showerror("错误", f"未找到 {prediction_type} 的模型文件: {model_file}")
-                return
-
-            # 加载模型
-            if model_type == "catboost":
-                model = CatBoostRegressor()
-                model.load_model(model_file)
-            else:
-                model = joblib.load(model_file)
-
-            self.models[prediction_type]["model"] = model
-            print(f"{prediction_type} 模型加载成功")
-
-            # 加载scaler
-            if not (os.path.exists(scaler_X_file) and os.path.exists(scaler_y_file)):
-                messagebox.showerror("错误", f"未找到 {prediction_type} 的scaler文件")
-                return
-
-            self.models[prediction_type]["scaler_X"] = joblib.load(scaler_X_file)
-            self.models[prediction_type]["scaler_y"] = joblib.load(scaler_y_file)
-            print(f"{prediction_type} Scaler加载成功")
-
-        except Exception as e:
-            messagebox.showerror("错误", f"{prediction_type} 加载失败: {str(e)}")
-
-    def create_widgets(self):
-        """创建主界面"""
-        # 设置样式
-        self._setup_styles()
-
-        # 创建主框架
-        main_frame = ttk.Frame(self.root, padding="20", style="Main.TFrame")
-        main_frame.pack(fill=tk.BOTH, expand=True, padx=30, pady=20)
-
-        # 创建标题
-        title_frame = ttk.Frame(main_frame, style="Title.TFrame")
-        title_frame.pack(fill=tk.X, pady=(0, 20))
-        ttk.Label(title_frame,
-                 text="Copper and Arsenic ion concentration prediction system",
-                 font=("Times New Roman", 22, "bold"),
-                 style="Title.TLabel").pack(pady=10)
-
-        # 创建预测类型选择
-        pred_type_frame = ttk.Frame(main_frame)
-        pred_type_frame.pack(fill=tk.X, pady=10)
-        ttk.Label(pred_type_frame, text="Select prediction type:").pack(side=tk.LEFT, padx=10)
-        ttk.Combobox(pred_type_frame, textvariable=self.current_prediction_type,
-                    values=PREDICTION_TYPES).pack(side=tk.LEFT, padx=10)
-        self.current_prediction_type.trace("w", lambda *args: self.update_input_fields())
-
-        # 创建参数输入框架
-        self.params_frame = ttk.Frame(main_frame, style="Params.TFrame")
-        self.params_frame.pack(fill=tk.BOTH, expand=True, pady=10)
-
-        # 初始化输入字段
-        self.update_input_fields()
-
-        # 预测按钮
-        ttk.Button(main_frame, text="Predict", command=self.predict,
-                  style="Predict.TButton").pack(fill=tk.X, padx=5, pady=5)
-
-        # 结果显示框架
-        result_frame = ttk.Frame(main_frame, style="Result.TFrame")
-        result_frame.pack(expand=True, fill=tk.BOTH, pady=20)
-
-        # 预测结果标签
-        self.result_var = tk.StringVar(value="Prediction results will be displayed here...")
-        result_label = ttk.Label(result_frame, textvariable=self.result_var,
-                                font=("Times New Roman", 18, "bold"),
-                                foreground="#004d99", anchor='center')
-        result_label.pack(expand=True, fill=tk.BOTH, pady=10)
-
-        # 最佳范围标签
-        self.range_var = tk.StringVar(value="")
-        range_label = ttk.Label(result_frame, textvariable=self.range_var,
-                               font=("Times New Roman", 18, "bold"),
-                               foreground="#004d99", anchor='center')
-        range_label.pack(expand=True, fill=tk.BOTH, pady=10)
-
-    def _setup_styles(self):
-        """设置UI样式"""
-        style = ttk.Style()
-        bg_color = "#f0f8ff"
-
-        # 框架样式
-        style.configure("Main.TFrame", background=bg_color)
-        style.configure("Title.TFrame", background=bg_color)
-        style.configure("Params.TFrame", background=bg_color)
-        style.configure("Result.TFrame", background=bg_color)
-        style.configure("ParamGroup.TLabelFrame", background="#f0f8ff")
-
-        # 标签样式
-        style.configure("TLabel", background=bg_color, font=("Times New Roman", 13))
-        style.configure("Title.TLabel", background=bg_color, foreground="#004d99")
-        style.configure("Input.TLabel", background=bg_color)
-
-        # 按钮样式
-        style.configure("TButton", font=("Times New Roman", 14), padding=5)
-        style.configure("Predict.TButton", font=("Times New Roman", 24, "bold"),
-                       background="#0066cc", foreground="#004d99", padding=15, borderwidth=0)
-        style.map("Predict.TButton",
-                 background=[('active', '#0052a3'), ('pressed', '#003d7a')])
-        style.configure("Param.TButton", font=("Times New Roman", 12))
-
-        # 输入框样式
-        style.configure("TEntry", padding=8, font=("Times New Roman", 13))
-        style.configure("Input.TEntry", padding=8)
-
-    def update_input_fields(self, event=None):
-        """更新输入字段"""
-        # 清空当前的输入字段
-        for widget in self.params_frame.winfo_children():
-            widget.destroy()
-
-        prediction_type = self.current_prediction_type.get()
-        params = PARAMETERS_CONFIG.get(prediction_type)
-
-        if params:
-            self._create_parameter_group(self.params_frame, "Copper anode metal content",
-                                        params["chemical"])
-            self._create_parameter_group(self.params_frame, "Electrolyte inlet ion concentration",
-                                        params["physical"])
-            self._create_parameter_group(self.params_frame, "Electrolysis operating conditions",
-                                        params["experimental"])
-
-    def _create_parameter_group(self, parent, title, params):
-        """创建参数分组"""
-        frame = tk.LabelFrame(parent, text=title, font=("Times New Roman", 16, "bold"),
-                             bg="#f0f8ff", padx=15, pady=15)
-        frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=10, pady=10)
-
-        for row, (key, value) in enumerate(params.items()):
-            var = tk.DoubleVar(value=value)
-            self.input_vars[key] = var
-            self._create_input_row(frame, key, var, row)
-
-    def _create_input_row(self, parent, key, var, row):
-        """创建单个输入行"""
-        # 创建标签
-        label_text = INPUT_LABELS.get(key, key)
-        ttk.Label(parent, text=label_text, style="Input.TLabel").grid(
-            row=row, column=0, sticky=tk.W, pady=10, padx=5)
-
-        # 创建输入框
-        ttk.Entry(parent, textvariable=var, width=12, style="Input.TEntry").grid(
-            row=row, column=1, padx=10, pady=10, sticky=tk.W)
-
-        # 创建增减按钮
-        btn_frame = ttk.Frame(parent)
-        btn_frame.grid(row=row, column=2, padx=5, pady=10, sticky=tk.W)
-
-        step = PARAMETER_STEPS.get(key, 0.1)
-        ttk.Button(btn_frame, text="+", width=3, style="Param.TButton",
-                  command=lambda v=var, s=step: self.update_value(v, s)).pack(side=tk.LEFT, padx=2)
-        ttk.Button(btn_frame, text="-", width=3, style="Param.TButton",
-                  command=lambda v=var, s=step: self.update_value(v, -s)).pack(side=tk.LEFT, padx=2)
-
-    def update_value(self, var, delta):
-        current = var.get()
-        var.set(current + delta)
-
-    def validate_parameters(self, prediction_type):
-        """验证输入参数是否在允许范围内"""
-        input_order = INPUT_ORDER[prediction_type]
-        invalid_params = []
-
-        for key in input_order:
-            value = self.input_vars[key].get()
-            if key in PARAMETER_RANGES:
-                min_val, max_val = PARAMETER_RANGES[key]
-                if value < min_val or value > max_val:
-                    param_label = INPUT_LABELS.get(key, key)
-                    invalid_params.append(
-                        f"{param_label}\n当前值: {value:.4f}\n允许范围: {min_val} – {max_val}"
-                    )
-
-        return invalid_params
-
-    def validate_output_concentration(self, prediction_type, prediction_value):
-        """验证输出浓度是否在允许范围内"""
-        if prediction_type in OUTPUT_CONCENTRATION_RANGES:
-            min_val, max_val = OUTPUT_CONCENTRATION_RANGES[prediction_type]
-            is_in_range = min_val <= prediction_value <= max_val
-            return is_in_range, min_val, max_val
-        return True, None, None
-
-    def predict(self):
-        """执行预测"""
-        prediction_type = self.current_prediction_type.get()
-        model_info = self.models[prediction_type]
-
-        # 检查模型是否加载
-        if not all([model_info["model"], model_info["scaler_X"], model_info["scaler_y"]]):
-            messagebox.showerror("错误", f"{prediction_type} 模型或scaler未加载")
-            return
-
-        # 验证参数范围
-        invalid_params = self.validate_parameters(prediction_type)
-        if invalid_params:
-            error_message = "以下参数值不在允许范围内:\n\n" + "\n\n".join(invalid_params)
-            messagebox.showerror("参数范围错误", error_message)
-            self.result_var.set("❌ 参数值超出范围，预测失败")
-            self.range_var.set("")
-            return
-
-        try:
-            # 获取输入值
-            input_order = INPUT_ORDER[prediction_type]
-            input_values = [self.input_vars[key].get() for key in input_order]
-            input_array = np.array([input_values])
-
-            # 预测
-            normalized_input = model_info["scaler_X"].transform(input_array)
-            normalized_prediction = model_info["model"].predict(normalized_input)[0]
-            prediction = model_info["scaler_y"].inverse_transform([[normalized_prediction]])[0][0]
-            prediction = max(0, prediction)  # 确保预测值为正
-
-            # 验证输出浓度范围
-            is_in_range, min_val, max_val = self.validate_output_concentration(prediction_type, prediction)
-
-            # 显示最佳范围
-            range_text = f"Optimal concentration range: {min_val} – {max_val} g/L"
-            self.range_var.set(range_text)
-
-            # 显示预测结果
-            if is_in_range:
-                result_text = f"✅ {prediction_type} Prediction ion concentration: {prediction:.2f} g/L"
-                self.result_var.set(result_text)
-            else:
-                result_text = f"⚠️ {prediction_type} Prediction ion concentration: {prediction:.2f} g/L (Out of optimal range)"
-                self.result_var.set(result_text)
-                # 显示警告对话框
-                warning_message = (
-                    f"Predicted concentration is out of optimal range!\n\n"
-                    f"Predicted value: {prediction:.2f} g/L\n"
-                    f"Optimal range: {min_val} – {max_val} g/L"
-                )
-                messagebox.showwarning("Concentration Range Warning", warning_message)
-
-        except Exception as e:
-            messagebox.showerror("预测错误", f"预测失败: {str(e)}")
-            self.range_var.set("")
-
-
-if __name__ == "__main__":
-    root = tk.Tk()
-    app = IntegratedPredictor(root)
+import queue
+import time
+import tkinter as tk
+from tkinter import ttk, messagebox
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from config import (PREDICTION_TYPES, PARAMETERS_CONFIG, INPUT_LABELS, PARAMETER_STEPS,
+                    INPUT_ORDER, ALL_TARGETS, combined_parameters_config)
+from cache import PredictionCache
+from metrics import METRICS, enable_from_env
+from optimizer import optimize_setpoint
+from predictor import BatchPredictor, MultiTargetPredictor
+from registry import ModelRegistry
+from sweep import sweep
+from uncertainty import CONVERGENCE
+from validation import input_columns, validate_inputs, output_in_range, output_range
+
+# 实时预测的防抖间隔和后台结果的轮询间隔 (毫秒)
+LIVE_DEBOUNCE_MS = 250
+RESULT_POLL_MS = 30
+
+
+class IntegratedPredictor:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("Integrated ML Prediction for electrolyte outlet Copper and Arsenic ion concentration")
+        self.root.geometry("1300x900")
+        self.root.configure(bg="#f0f8ff")
+
+        # 设置字体
+        self.root.option_add("*TButton.Font", ("Times New Roman", 16, "bold"))
+        self.root.option_add("*TLabel.Font", ("Times New Roman", 14))
+        self.root.option_add("*TEntry.Font", ("Times New Roman", 14))
+
+        self.input_vars = {}
+        self.current_prediction_type = tk.StringVar(value="OAC_W")
+        self.live_var = tk.BooleanVar(value=False)
+
+        # 预测在单个后台线程中执行, 结果经队列交回主线程; 序号用于丢弃过期结果
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gui-predict")
+        self._results = queue.Queue()
+        self._prediction_seq = 0
+        self._in_flight = 0
+        self._poll_id = None
+        self._debounce_id = None
+
+        # 后台并行加载模型, 界面无需等待; 模型文件更新后自动切换到新版本
+        self.loader = ModelRegistry(on_swap=lambda old, new: print(
+            f"{new.prediction_type} 模型已切换到 v{new.version} (原 v{old.version}; "
+            f"{new.format_artifact_times()})"))
+        # +/- 按钮会反复回到相同的设定点, 以 PARAMETER_STEPS 网格对齐的输入为键缓存最近的预测结果
+        self.predictor = BatchPredictor(loader=self.loader,
+                                        cache=PredictionCache(tolerance=PARAMETER_STEPS))
+        self.multi_predictor = MultiTargetPredictor(self.predictor)
+        # 扫描的相邻点常落在同一网格内, 不经过缓存, 逐点按原始输入预测
+        self.exact_predictor = BatchPredictor(loader=self.loader)
+        # 设置 ION_METRICS_LOG_INTERVAL 时记录各阶段耗时并定期输出
+        self._metrics_log = enable_from_env()
+        self.create_widgets()
+        self.root.after(100, self._check_model_loading)
+
+    def _check_model_loading(self):
+        """轮询后台加载状态, 完成后输出各产物加载耗时并提示失败项"""
+        if self.loader.pending():
+            self.root.after(100, self._check_model_loading)
+            return
+
+        print(self.loader.format_load_report())
+        for prediction_type, error in self.loader.errors().items():
+            messagebox.showerror("错误", f"{prediction_type} 加载失败: {str(error)}")
+
+    def create_widgets(self):
+        """创建主界面"""
+        # 设置样式
+        self._setup_styles()
+
+        # 创建主框架
+        main_frame = ttk.Frame(self.root, padding="20", style="Main.TFrame")
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=30, pady=20)
+
+        # 创建标题
+        title_frame = ttk.Frame(main_frame, style="Title.TFrame")
+        title_frame.pack(fill=tk.X, pady=(0, 20))
+        ttk.Label(title_frame,
+                 text="Copper and Arsenic ion concentration prediction system",
+                 font=("Times New Roman", 22, "bold"),
+                 style="Title.TLabel").pack(pady=10)
+
+        # 创建预测类型选择
+        pred_type_frame = ttk.Frame(main_frame)
+        pred_type_frame.pack(fill=tk.X, pady=10)
+        ttk.Label(pred_type_frame, text="Select prediction type:").pack(side=tk.LEFT, padx=10)
+        ttk.Combobox(pred_type_frame, textvariable=self.current_prediction_type,
+                    values=PREDICTION_TYPES + [ALL_TARGETS]).pack(side=tk.LEFT, padx=10)
+        self.current_prediction_type.trace("w", lambda *args: self.update_input_fields())
+        ttk.Checkbutton(pred_type_frame, text="Live prediction", variable=self.live_var,
+                        command=self._on_input_changed).pack(side=tk.LEFT, padx=20)
+
+        # 创建参数输入框架
+        self.params_frame = ttk.Frame(main_frame, style="Params.TFrame")
+        self.params_frame.pack(fill=tk.BOTH, expand=True, pady=10)
+
+        # 初始化输入字段
+        self.update_input_fields()
+
+        # 预测按钮
+        ttk.Button(main_frame, text="Predict", command=self.predict,
+                  style="Predict.TButton").pack(fill=tk.X, padx=5, pady=5)
+
+        # 分析工具按钮
+        tools_frame = ttk.Frame(main_frame, style="Main.TFrame")
+        tools_frame.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Button(tools_frame, text="Sensitivity sweep", command=self.open_sweep_window).pack(
+            side=tk.LEFT, padx=5)
+        ttk.Button(tools_frame, text="Optimize setpoints", command=self.optimize_setpoints).pack(
+            side=tk.LEFT, padx=5)
+
+        # 结果显示框架
+        result_frame = ttk.Frame(main_frame, style="Result.TFrame")
+        result_frame.pack(expand=True, fill=tk.BOTH, pady=20)
+
+        # 预测结果标签
+        self.result_var = tk.StringVar(value="Prediction results will be displayed here...")
+        result_label = ttk.Label(result_frame, textvariable=self.result_var,
+                                font=("Times New Roman", 18, "bold"),
+                                foreground="#004d99", anchor='center')
+        result_label.pack(expand=True, fill=tk.BOTH, pady=10)
+
+        # 最佳范围标签
+        self.range_var = tk.StringVar(value="")
+        range_label = ttk.Label(result_frame, textvariable=self.range_var,
+                               font=("Times New Roman", 18, "bold"),
+                               foreground="#004d99", anchor='center')
+        range_label.pack(expand=True, fill=tk.BOTH, pady=10)
+
+    def _setup_styles(self):
+        """设置UI样式"""
+        style = ttk.Style()
+        bg_color = "#f0f8ff"
+
+        # 框架样式
+        style.configure("Main.TFrame", background=bg_color)
+        style.configure("Title.TFrame", background=bg_color)
+        style.configure("Params.TFrame", background=bg_color)
+        style.configure("Result.TFrame", background=bg_color)
+        style.configure("ParamGroup.TLabelFrame", background="#f0f8ff")
+
+        # 标签样式
+        style.configure("TLabel", background=bg_color, font=("Times New Roman", 13))
+        style.configure("Title.TLabel", background=bg_color, foreground="#004d99")
+        style.configure("Input.TLabel", background=bg_color)
+
+        # 按钮样式
+        style.configure("TButton", font=("Times New Roman", 14), padding=5)
+        style.configure("Predict.TButton", font=("Times New Roman", 24, "bold"),
+                       background="#0066cc", foreground="#004d99", padding=15, borderwidth=0)
+        style.map("Predict.TButton",
+                 background=[('active', '#0052a3'), ('pressed', '#003d7a')])
+        style.configure("Param.TButton", font=("Times New Roman", 12))
+
+        # 输入框样式
+        style.configure("TEntry", padding=8, font=("Times New Roman", 13))
+        style.configure("Input.TEntry", padding=8)
+
+    def update_input_fields(self, event=None):
+        """更新输入字段"""
+        # 清空当前的输入字段
+        for widget in self.params_frame.winfo_children():
+            widget.destroy()
+
+        prediction_type = self.current_prediction_type.get()
+        if prediction_type == ALL_TARGETS:
+            params = combined_parameters_config()
+        else:
+            params = PARAMETERS_CONFIG.get(prediction_type)
+
+        # 切换预测类型后, 尚未返回的旧结果作废
+        self._prediction_seq += 1
+
+        if params:
+            self._create_parameter_group(self.params_frame, "Copper anode metal content",
+                                        params["chemical"])
+            self._create_parameter_group(self.params_frame, "Electrolyte inlet ion concentration",
+                                        params["physical"])
+            self._create_parameter_group(self.params_frame, "Electrolysis operating conditions",
+                                        params["experimental"])
+            self._on_input_changed()
+
+    def _create_parameter_group(self, parent, title, params):
+        """创建参数分组"""
+        frame = tk.LabelFrame(parent, text=title, font=("Times New Roman", 16, "bold"),
+                             bg="#f0f8ff", padx=15, pady=15)
+        frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        for row, (key, value) in enumerate(params.items()):
+            var = tk.DoubleVar(value=value)
+            var.trace_add("write", self._on_input_changed)
+            self.input_vars[key] = var
+            self._create_input_row(frame, key, var, row)
+
+    def _create_input_row(self, parent, key, var, row):
+        """创建单个输入行"""
+        # 创建标签
+        label_text = INPUT_LABELS.get(key, key)
+        ttk.Label(parent, text=label_text, style="Input.TLabel").grid(
+            row=row, column=0, sticky=tk.W, pady=10, padx=5)
+
+        # 创建输入框
+        ttk.Entry(parent, textvariable=var, width=12, style="Input.TEntry").grid(
+            row=row, column=1, padx=10, pady=10, sticky=tk.W)
+
+        # 创建增减按钮
+        btn_frame = ttk.Frame(parent)
+        btn_frame.grid(row=row, column=2, padx=5, pady=10, sticky=tk.W)
+
+        step = PARAMETER_STEPS.get(key, 0.1)
+        ttk.Button(btn_frame, text="+", width=3, style="Param.TButton",
+                  command=lambda v=var, s=step: self.update_value(v, s)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(btn_frame, text="-", width=3, style="Param.TButton",
+                  command=lambda v=var, s=step: self.update_value(v, -s)).pack(side=tk.LEFT, padx=2)
+
+    def update_value(self, var, delta):
+        current = var.get()
+        var.set(current + delta)
+
+    def validate_parameters(self, prediction_type, input_values=None):
+        """验证输入参数是否在允许范围内, 返回每个超出范围参数的提示文字"""
+        if input_values is None:
+            input_values = [self.input_vars[key].get() for key in input_columns(prediction_type)]
+        validation = validate_inputs([input_values], prediction_type)
+        return [f"{INPUT_LABELS.get(item['name'], item['name'])}\n当前值: {item['value']:.4f}\n"
+                f"允许范围: {item['min']:g} – {item['max']:g}"
+                for item in validation.describe_row(0)]
+
+    def validate_output_concentration(self, prediction_type, prediction_value):
+        """验证输出浓度是否在允许范围内"""
+        limits = output_range(prediction_type)
+        if limits is None:
+            return True, None, None
+        return bool(output_in_range(prediction_value, prediction_type)), limits[0], limits[1]
+
+    def predict(self, live=False):
+        """读取输入并提交到后台线程预测, 界面保持响应; live=True 时不弹出对话框"""
+        prediction_type = self.current_prediction_type.get()
+
+        # 新的请求使之前未完成的结果作废
+        self._prediction_seq += 1
+
+        # 获取输入值 (Tk 变量只能在主线程读取)
+        try:
+            input_values = [self.input_vars[key].get() for key in input_columns(prediction_type)]
+        except tk.TclError:
+            if not live:
+                messagebox.showerror("参数错误", "请输入有效的数值")
+            self.result_var.set("❌ 输入值无效，预测失败")
+            self.range_var.set("")
+            return
+
+        # 验证参数范围
+        invalid_params = self.validate_parameters(prediction_type, input_values)
+        if invalid_params:
+            if not live:
+                error_message = "以下参数值不在允许范围内:\n\n" + "\n\n".join(invalid_params)
+                messagebox.showerror("参数范围错误", error_message)
+            self.result_var.set("❌ 参数值超出范围，预测失败")
+            self.range_var.set("")
+            return
+
+        if not live:
+            self.result_var.set(f"⏳ {prediction_type} Predicting...")
+        self._in_flight += 1
+        self._executor.submit(self._predict_worker, self._prediction_seq, prediction_type,
+                              np.array([input_values]), live)
+        if self._poll_id is None:
+            self._poll_id = self.root.after(RESULT_POLL_MS, self._poll_results)
+
+    def _predict_worker(self, seq, prediction_type, input_array, live):
+        """在后台线程中执行预测, 结果放入队列由 Tk 主线程取回"""
+        if seq != self._prediction_seq:
+            self._results.put((seq, prediction_type, None, None, live))
+            return
+        try:
+            if prediction_type == ALL_TARGETS:
+                # 三个模型在线程池中并行预测
+                prediction = {pred_type: float(values[0]) for pred_type, values
+                              in self.multi_predictor.predict_matrix(input_array).items()}
+                version = None
+                uncertainty = None
+            else:
+                # 区间和落入最佳范围的概率与点预测在同一次遍历中得到
+                result, version = self.predictor.predict_uncertainty(input_array, prediction_type)
+                prediction = float(result["prediction"][0])
+                uncertainty = {key: float(result[key][0])
+                               for key in ("lower", "upper", "prob_in_range")}
+                uncertainty.update(level=result["level"], method=result["method"])
+            self._results.put((seq, prediction_type, prediction, None, live, version,
+                               uncertainty))
+        except Exception as e:
+            self._results.put((seq, prediction_type, None, e, live))
+
+    def _poll_results(self):
+        """在 Tk 主线程中取回后台预测结果"""
+        self._poll_id = None
+        while True:
+            try:
+                result = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._in_flight -= 1
+            self._show_result(*result)
+
+        if self._in_flight > 0:
+            self._poll_id = self.root.after(RESULT_POLL_MS, self._poll_results)
+
+    def _show_result(self, seq, prediction_type, prediction, error, live, version=None,
+                     uncertainty=None):
+        """显示预测结果, 已过期的结果直接丢弃"""
+        if seq != self._prediction_seq:
+            return
+
+        started = time.perf_counter() if METRICS.enabled else None
+        self._render_result(prediction_type, prediction, error, live, version, uncertainty)
+        if started is not None:
+            METRICS.observe("stage_seconds", time.perf_counter() - started,
+                            prediction_type=prediction_type, stage="render")
+
+    def _render_result(self, prediction_type, prediction, error, live, version, uncertainty=None):
+        """把预测结果或错误写入界面"""
+        if error is not None:
+            if not live:
+                messagebox.showerror("预测错误", f"预测失败: {str(error)}")
+            self.result_var.set(f"❌ {prediction_type} 预测失败")
+            self.range_var.set("")
+            return
+
+        if prediction_type == ALL_TARGETS:
+            self._show_combined_result(prediction, live)
+            return
+
+        # 验证输出浓度范围
+        is_in_range, min_val, max_val = self.validate_output_concentration(prediction_type, prediction)
+
+        # 显示最佳范围和产生该结果的模型版本
+        range_text = f"Optimal concentration range: {min_val} – {max_val} g/L"
+        if uncertainty is not None and uncertainty["method"] == CONVERGENCE:
+            # 未校准的 CatBoost 区间只是收敛幅度, 不显示与预测区间不可比的概率
+            range_text += (f"    convergence spread: {uncertainty['lower']:.2f} – "
+                           f"{uncertainty['upper']:.2f} g/L (uncalibrated)")
+            uncertainty = None
+        elif uncertainty is not None:
+            range_text += (f"    {uncertainty['level']:.0%} interval: {uncertainty['lower']:.2f} – "
+                           f"{uncertainty['upper']:.2f} g/L, "
+                           f"P(in range) = {uncertainty['prob_in_range']:.0%}")
+        if version is not None:
+            range_text += f"    (model v{version})"
+        self.range_var.set(range_text)
+
+        # 显示预测结果
+        if is_in_range:
+            result_text = f"✅ {prediction_type} Prediction ion concentration: {prediction:.2f} g/L"
+            self.result_var.set(result_text)
+        else:
+            result_text = f"⚠️ {prediction_type} Prediction ion concentration: {prediction:.2f} g/L (Out of optimal range)"
+            self.result_var.set(result_text)
+            # 实时模式下只更新结果文字, 不弹出警告对话框
+            if not live:
+                warning_message = (
+                    f"Predicted concentration is out of optimal range!\n\n"
+                    f"Predicted value: {prediction:.2f} g/L\n"
+                    f"Optimal range: {min_val} – {max_val} g/L"
+                )
+                if uncertainty is not None:
+                    warning_message += (f"\nProbability in range: "
+                                        f"{uncertainty['prob_in_range']:.0%}")
+                messagebox.showwarning("Concentration Range Warning", warning_message)
+
+    def _show_combined_result(self, predictions, live):
+        """同时显示砷和铜的出口浓度预测结果"""
+        result_lines = []
+        range_lines = []
+        out_of_range = []
+        for pred_type, prediction in predictions.items():
+            is_in_range, min_val, max_val = self.validate_output_concentration(pred_type, prediction)
+            mark = "✅" if is_in_range else "⚠️"
+            result_lines.append(f"{mark} {pred_type}: {prediction:.2f} g/L")
+            range_lines.append(f"{pred_type} optimal: {min_val} – {max_val} g/L")
+            if not is_in_range:
+                out_of_range.append(f"{pred_type}: {prediction:.2f} g/L "
+                                    f"(optimal {min_val} – {max_val} g/L)")
+
+        self.result_var.set("    ".join(result_lines))
+        self.range_var.set("    ".join(range_lines))
+        if out_of_range and not live:
+            messagebox.showwarning("Concentration Range Warning",
+                                   "Predicted concentration is out of optimal range!\n\n"
+                                   + "\n".join(out_of_range))
+
+    def current_input_values(self, prediction_type):
+        """读取当前输入框中的数值 {参数名: 数值}, 非法输入时抛出 tk.TclError"""
+        return {key: self.input_vars[key].get() for key in input_columns(prediction_type)}
+
+    def _require_single_type(self):
+        """扫描和优化只针对单个预测类型"""
+        if self.current_prediction_type.get() == ALL_TARGETS:
+            messagebox.showinfo("提示", "请先选择单个预测类型")
+            return False
+        return True
+
+    def open_sweep_window(self):
+        """打开敏感性扫描窗口"""
+        if self._require_single_type():
+            SweepWindow(self)
+
+    def optimize_setpoints(self):
+        """在后台搜索使预测浓度落入最佳范围的电流密度、电解时间和电解槽数"""
+        if not self._require_single_type():
+            return
+        prediction_type = self.current_prediction_type.get()
+        try:
+            base_values = self.current_input_values(prediction_type)
+        except tk.TclError:
+            messagebox.showerror("参数错误", "请输入有效的数值")
+            return
+
+        self.result_var.set(f"⏳ {prediction_type} Searching setpoints...")
+        self.range_var.set("")
+        future = self._executor.submit(self._optimize_worker, prediction_type, base_values)
+        self.root.after(RESULT_POLL_MS, self._poll_optimization, future, prediction_type)
+
+    def _optimize_worker(self, prediction_type, base_values):
+        """在后台线程中搜索设定点, 不经过缓存; 按写回输入框的 3 位小数重新预测后再报告"""
+        result = optimize_setpoint(self.exact_predictor, prediction_type, base_values)
+        result["values"] = {key: round(value, 3) for key, value in result["values"].items()}
+        result["inputs"].update(result["values"])
+        matrix = np.array([[result["inputs"][key] for key in INPUT_ORDER[prediction_type]]])
+        prediction = float(self.exact_predictor.predict_matrix(matrix, prediction_type)[0])
+        result["prediction"] = prediction
+        result["success"] = result["success"] and bool(output_in_range(prediction, prediction_type))
+        return result
+
+    def _poll_optimization(self, future, prediction_type):
+        if not future.done():
+            self.root.after(RESULT_POLL_MS, self._poll_optimization, future, prediction_type)
+            return
+        if prediction_type != self.current_prediction_type.get():
+            return
+
+        try:
+            result = future.result()
+        except Exception as e:
+            messagebox.showerror("优化错误", f"设定点搜索失败: {str(e)}")
+            self.result_var.set("❌ 设定点搜索失败")
+            return
+
+        values_text = "\n".join(f"{INPUT_LABELS.get(key, key)} {value:.3f}"
+                                for key, value in result["values"].items())
+        if not result["success"]:
+            self.result_var.set(f"⚠️ {prediction_type} No setpoint reaches the optimal range")
+            messagebox.showwarning(
+                "Setpoint optimization",
+                f"No setpoint within the allowed parameter ranges reaches the optimal range.\n\n"
+                f"Closest prediction: {result['prediction']:.2f} g/L\n{values_text}\n\n"
+                f"Evaluations: {result['n_evaluations']}")
+            return
+
+        for key, value in result["values"].items():
+            self.input_vars[key].set(value)
+        messagebox.showinfo(
+            "Setpoint optimization",
+            f"Found setpoints after {result['n_evaluations']} evaluations:\n\n{values_text}\n\n"
+            f"Predicted value: {result['prediction']:.2f} g/L")
+        self.predict()
+
+    def _on_input_changed(self, *args):
+        """实时模式下, 输入变化后防抖一段时间再重新预测"""
+        if not self.live_var.get():
+            return
+        if self._debounce_id is not None:
+            self.root.after_cancel(self._debounce_id)
+        self._debounce_id = self.root.after(LIVE_DEBOUNCE_MS, self._live_predict)
+
+    def _live_predict(self):
+        self._debounce_id = None
+        self.predict(live=True)
+
+
+class SweepWindow:
+    """敏感性扫描窗口: 以当前输入为基准扫描一个或两个参数, 并标出最佳浓度范围"""
+
+    CANVAS_WIDTH = 640
+    CANVAS_HEIGHT = 620
+    MARGIN = 60
+    NO_PARAM = "(none)"
+    # 界面上的单轴分辨率上限; 更高的分辨率 (至 sweep.MAX_RESOLUTION) 只在命令行使用
+    MAX_RESOLUTION = 500
+
+    def __init__(self, app):
+        self.app = app
+        self.prediction_type = app.current_prediction_type.get()
+        self.window = tk.Toplevel(app.root)
+        self.window.title(f"{self.prediction_type} sensitivity sweep")
+        self.window.configure(bg="#f0f8ff")
+        self._image = None
+
+        input_order = INPUT_ORDER[self.prediction_type]
+        controls = ttk.Frame(self.window, padding=10, style="Main.TFrame")
+        controls.pack(fill=tk.X)
+
+        self.param_x = tk.StringVar(value="Current Density" if "Current Density" in input_order
+                                    else input_order[0])
+        self.param_y = tk.StringVar(value=self.NO_PARAM)
+        self.resolution = tk.IntVar(value=200)
+
+        ttk.Label(controls, text="X:").pack(side=tk.LEFT)
+        ttk.Combobox(controls, textvariable=self.param_x, values=input_order, width=30,
+                     state="readonly").pack(side=tk.LEFT, padx=5)
+        ttk.Label(controls, text="Y:").pack(side=tk.LEFT)
+        ttk.Combobox(controls, textvariable=self.param_y, values=[self.NO_PARAM] + input_order,
+                     width=30, state="readonly").pack(side=tk.LEFT, padx=5)
+        ttk.Label(controls, text="Resolution:").pack(side=tk.LEFT)
+        ttk.Spinbox(controls, textvariable=self.resolution, from_=2, to=self.MAX_RESOLUTION,
+                    increment=50, width=6).pack(side=tk.LEFT, padx=5)
+        ttk.Button(controls, text="Run", command=self.run).pack(side=tk.LEFT, padx=5)
+
+        self.canvas = tk.Canvas(self.window, width=self.CANVAS_WIDTH, height=self.CANVAS_HEIGHT,
+                                bg="white")
+        self.canvas.pack(padx=10, pady=10)
+        self.status_var = tk.StringVar(value="")
+        ttk.Label(self.window, textvariable=self.status_var).pack(pady=(0, 10))
+
+    def run(self):
+        """在后台线程中执行扫描"""
+        try:
+            base_values = self.app.current_input_values(self.prediction_type)
+            num = self.resolution.get()
+        except tk.TclError:
+            messagebox.showerror("参数错误", "请输入有效的数值", parent=self.window)
+            return
+        if not 2 <= num <= self.MAX_RESOLUTION:
+            messagebox.showerror("参数错误", f"分辨率需在 2 – {self.MAX_RESOLUTION} 之间",
+                                 parent=self.window)
+            return
+
+        params = [self.param_x.get()]
+        if self.param_y.get() not in (self.NO_PARAM, params[0]):
+            params.append(self.param_y.get())
+
+        self.status_var.set(f"Sweeping {' × '.join(params)} ...")
+        future = self.app._executor.submit(self._sweep, base_values, params, num)
+        self.window.after(RESULT_POLL_MS, self._poll, future, base_values)
+
+    def _sweep(self, base_values, params, num):
+        """在后台线程中扫描, 双参数时同时生成热力图的像素数据, 主线程只需 put"""
+        result = sweep(self.app.exact_predictor, self.prediction_type, base_values, params, num)
+        image_data = self._grid_image_data(result) if len(params) == 2 else None
+        return result, image_data
+
+    def _poll(self, future, base_values):
+        if not future.done():
+            self.window.after(RESULT_POLL_MS, self._poll, future, base_values)
+            return
+        try:
+            result, image_data = future.result()
+        except Exception as e:
+            self.status_var.set("")
+            messagebox.showerror("扫描错误", f"扫描失败: {str(e)}", parent=self.window)
+            return
+
+        self.canvas.delete("all")
+        if len(result["params"]) == 1:
+            self._draw_curve(result, base_values[result["params"][0]])
+        else:
+            self._draw_grid(result, image_data)
+        min_val, max_val = result["optimal_range"]
+        self.status_var.set(f"{result['predictions'].size} points, "
+                            f"{result['in_range'].mean():.1%} inside optimal range "
+                            f"{min_val} – {max_val} g/L")
+
+    def _draw_curve(self, result, current_value):
+        """绘制单参数曲线, 绿色带为最佳浓度范围"""
+        x = result["axes"][0]
+        y = result["predictions"]
+        min_val, max_val = result["optimal_range"]
+        y_low = min(y.min(), min_val)
+        y_high = max(y.max(), max_val)
+        pad = (y_high - y_low) * 0.05 or 1.0
+        y_low, y_high = y_low - pad, y_high + pad
+
+        left, top = self.MARGIN, self.MARGIN / 2
+        right, bottom = self.CANVAS_WIDTH - self.MARGIN / 2, self.CANVAS_HEIGHT - self.MARGIN
+
+        def px(value):
+            return left + (value - x[0]) / (x[-1] - x[0]) * (right - left)
+
+        def py(value):
+            return bottom - (value - y_low) / (y_high - y_low) * (bottom - top)
+
+        self.canvas.create_rectangle(left, py(max_val), right, py(min_val),
+                                     fill="#d4f4d4", outline="")
+        self.canvas.create_rectangle(left, top, right, bottom, outline="#888888")
+        points = np.column_stack([px(x), py(y)]).ravel().tolist()
+        self.canvas.create_line(*points, fill="#004d99", width=2)
+        if x[0] <= current_value <= x[-1]:
+            self.canvas.create_line(px(current_value), top, px(current_value), bottom,
+                                    fill="#cc6600", dash=(4, 2))
+
+        self.canvas.create_text(left, bottom + 15, text=f"{x[0]:.4g}", anchor=tk.W)
+        self.canvas.create_text(right, bottom + 15, text=f"{x[-1]:.4g}", anchor=tk.E)
+        self.canvas.create_text((left + right) / 2, bottom + 35, text=result["params"][0])
+        self.canvas.create_text(left - 5, top, text=f"{y_high:.3g}", anchor=tk.NE)
+        self.canvas.create_text(left - 5, bottom, text=f"{y_low:.3g}", anchor=tk.SE)
+
+    def _grid_image_data(self, result):
+        """热力图的 (PhotoImage.put 数据, 宽, 高, 放大倍数)
+
+        绿色为最佳范围内, 蓝色低于, 红色高于, 颜色深浅表示浓度. 网格大于绘图区时按整数
+        步长抽取, 使图像不超出画布
+        """
+        nx, ny = result["predictions"].shape
+        width = self.CANVAS_WIDTH - 2 * self.MARGIN
+        height = self.CANVAS_HEIGHT - 2 * self.MARGIN
+        values = result["predictions"][::-(-nx // width), ::-(-ny // height)]
+        min_val, max_val = result["optimal_range"]
+        span = values.max() - values.min()
+        if span > 0:
+            level = ((values - values.min()) / span * 63).astype(int)
+        else:
+            level = np.full(values.shape, 32)
+
+        shades = np.linspace(0.85, 0.35, 64)
+        palette = np.array(
+            [f"#{int(40 * s):02x}{int(90 * s):02x}{int(255 * s):02x}" for s in shades]
+            + [f"#{int(60 * s):02x}{int(220 * s):02x}{int(60 * s):02x}" for s in shades]
+            + [f"#{int(255 * s):02x}{int(60 * s):02x}{int(40 * s):02x}" for s in shades])
+        category = np.where(values < min_val, 0, np.where(values > max_val, 2, 1))
+        colors = palette[category * 64 + level]
+
+        # 图像的行从上到下对应 Y 从大到小
+        nx, ny = values.shape
+        data = " ".join("{" + " ".join(row) + "}" for row in colors.T[::-1])
+        zoom = max(1, min(width // nx, height // ny))
+        return data, nx, ny, zoom
+
+    def _draw_grid(self, result, image_data):
+        """绘制双参数热力图"""
+        data, nx, ny, zoom = image_data
+        image = tk.PhotoImage(width=nx, height=ny)
+        image.put(data)
+        self._image = image.zoom(zoom) if zoom > 1 else image
+
+        left, top = self.MARGIN, self.MARGIN / 2
+        self.canvas.create_image(left, top, image=self._image, anchor=tk.NW)
+        right, bottom = left + nx * zoom, top + ny * zoom
+        x_axis, y_axis = result["axes"]
+        self.canvas.create_text(left, bottom + 15, text=f"{x_axis[0]:.4g}", anchor=tk.W)
+        self.canvas.create_text(right, bottom + 15, text=f"{x_axis[-1]:.4g}", anchor=tk.E)
+        self.canvas.create_text((left + right) / 2, bottom + 35, text=result["params"][0])
+        self.canvas.create_text(left - 5, top, text=f"{y_axis[-1]:.4g}", anchor=tk.NE)
+        self.canvas.create_text(left - 5, bottom, text=f"{y_axis[0]:.4g}", anchor=tk.SE)
+        self.canvas.create_text(right + 5, (top + bottom) / 2, text=result["params"][1],
+                                angle=90, anchor=tk.S)
+
+
+if __name__ == "__main__":
+    root = tk.Tk()
+    app = IntegratedPredictor(root)
     root.mainloop()
\ No newline at end of file
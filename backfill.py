@@ -0,0 +1,186 @@
+"""多进程历史数据回填: 输入按行切分到进程池, 数据通过内存映射的 .npy 文件共享
+
+每个工作进程只在启动时加载一次模型, 分片只传递行号区间, 不序列化数组;
+各分片直接写入输出文件中对应的位置, 结果与输入行顺序一致.
+
+用法示例:
+    python backfill.py OCC_W history.parquet -o predictions.parquet --workers 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from config import PREDICTION_TYPES
+from fused import load_fused
+from loader import BASE_DIR, load_artifacts
+from predictor import read_table, write_table, to_feature_matrix, predict_array
+from validation import REJECT, POLICIES, validate_inputs
+
+# 每个分片的行数, 分片越小负载越均衡, 调度开销越大
+DEFAULT_SHARD_SIZE = 65536
+
+# 工作进程内的模型和内存映射数组, 由 _init_worker 设置
+_worker = {}
+
+
+class _SingleThreadModel:
+    """让 CatBoost 在工作进程内单线程预测, 避免多个进程争抢全部 CPU"""
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, input_array):
+        return self.model.predict(input_array, thread_count=1)
+
+
+def _init_worker(prediction_type, base_dir, fused, input_path, output_path, invalid_path,
+                 policy):
+    """工作进程初始化: 加载一次模型并打开输入、输出和违规标记的内存映射"""
+    if fused:
+        predict = load_fused(prediction_type, base_dir).predict
+    else:
+        model_info = load_artifacts(prediction_type, base_dir)
+        if type(model_info["model"]).__module__.split(".")[0] == "catboost":
+            model_info["model"] = _SingleThreadModel(model_info["model"])
+        predict = partial(predict_array, model_info)
+    _worker.update(predict=predict, prediction_type=prediction_type, policy=policy,
+                   input=np.load(input_path, mmap_mode="r"),
+                   output=np.load(output_path, mmap_mode="r+"),
+                   invalid=np.load(invalid_path, mmap_mode="r+"))
+
+
+def _score_shard(start, stop):
+    """校验并预测 [start, stop) 行, 写入输出文件的对应位置; 不参与预测的行输出 NaN"""
+    validation = validate_inputs(_worker["input"][start:stop], _worker["prediction_type"],
+                                 _worker["policy"])
+    # 共享映射的写入经页缓存对主进程立即可见, 无需逐片 flush
+    _worker["invalid"][start:stop] = validation.invalid
+    if validation.valid_rows.all():
+        _worker["output"][start:stop] = _worker["predict"](validation.matrix)
+    else:
+        output = np.full(stop - start, np.nan)
+        # 整片都被拒绝时不调用模型, 部分模型不接受 0 行输入
+        if validation.valid_rows.any():
+            output[validation.valid_rows] = _worker["predict"](
+                validation.matrix[validation.valid_rows])
+        _worker["output"][start:stop] = output
+    return stop - start
+
+
+def write_input_npy(data, prediction_type, path):
+    """把输入数据按 INPUT_ORDER 写为 N×F 的 float64 .npy 文件"""
+    matrix = to_feature_matrix(data, prediction_type)
+    array = np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=matrix.shape)
+    array[:] = matrix
+    array.flush()
+    del array
+    return matrix.shape[0]
+
+
+def backfill(data, prediction_type, output=None, workers=None, shard_size=DEFAULT_SHARD_SIZE,
+             base_dir=BASE_DIR, fused=False, work_dir=None, progress=None, policy=REJECT,
+             return_invalid=False):
+    """多进程预测, 返回长度为 N 的一维数组 (g/L)
+
+    每个分片先按 policy (reject/clip/flag, 见 validation.py) 做向量化范围检查,
+    不参与预测的行输出 NaN; 默认 reject, 与界面和预测服务一致, 需要照常预测超出范围的
+    历史行时显式传入 flag. return_invalid=True 时返回 (预测值, 每行是否超出范围).
+
+    data 为 .npy 文件路径时直接内存映射使用, 否则先按 INPUT_ORDER 转换并写入
+    work_dir 下的临时 .npy 文件. output 为 .npy 路径时结果直接写入该文件并以
+    只读内存映射返回, 否则返回内存中的数组. progress(已完成行数, 总行数) 在
+    每个分片完成后调用.
+    """
+    workers = max(1, workers or os.cpu_count() or 1)
+    shard_size = max(1, int(shard_size))
+    with tempfile.TemporaryDirectory(prefix="backfill-", dir=work_dir) as tmp_dir:
+        if isinstance(data, (str, os.PathLike)) and str(data).lower().endswith(".npy"):
+            input_path = str(data)
+            matrix = np.load(input_path, mmap_mode="r")
+            to_feature_matrix(matrix[:1], prediction_type)  # 只检查列数
+            total = matrix.shape[0]
+            del matrix
+        else:
+            input_path = os.path.join(tmp_dir, "input.npy")
+            total = write_input_npy(data, prediction_type, input_path)
+
+        output_path = str(output) if output is not None else os.path.join(tmp_dir, "output.npy")
+        result = np.lib.format.open_memmap(output_path, mode="w+", dtype=np.float64,
+                                           shape=(total,))
+        del result
+        invalid_path = os.path.join(tmp_dir, "invalid.npy")
+        invalid = np.lib.format.open_memmap(invalid_path, mode="w+", dtype=bool, shape=(total,))
+        del invalid
+
+        starts = list(range(0, total, shard_size))
+        stops = [min(start + shard_size, total) for start in starts]
+        done = 0
+        with ProcessPoolExecutor(max_workers=min(workers, max(1, len(starts))),
+                                 initializer=_init_worker,
+                                 initargs=(prediction_type, base_dir, fused, input_path,
+                                           output_path, invalid_path, policy)) as executor:
+            for rows in executor.map(_score_shard, starts, stops):
+                done += rows
+                if progress is not None:
+                    progress(done, total)
+
+        if output is not None:
+            predictions = np.load(output_path, mmap_mode="r")
+        else:
+            predictions = np.load(output_path)
+        if return_invalid:
+            return predictions, np.load(invalid_path)
+        return predictions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多进程回填历史数据的预测值")
+    parser.add_argument("prediction_type", choices=PREDICTION_TYPES)
+    parser.add_argument("input", help="输入 CSV/Parquet 文件, 或按 INPUT_ORDER 排列的 N×F .npy 文件")
+    parser.add_argument("-o", "--output", required=True,
+                        help="输出文件: .npy 只保存预测值, CSV/Parquet 在输入表上追加预测列")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="工作进程数")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE)
+    parser.add_argument("--work-dir", help="临时 .npy 文件所在目录, 默认为系统临时目录")
+    parser.add_argument("--model-dir", default=BASE_DIR, help="模型和scaler所在目录")
+    parser.add_argument("--fused", action="store_true", help="使用 fused.py 导出的融合模型")
+    parser.add_argument("--invalid", choices=POLICIES, default=REJECT,
+                        help="输入超出范围时: reject (默认) 输出 NaN, clip 裁剪到范围内后预测, "
+                             "flag 照常预测 (clip/flag 时 CSV/Parquet 输出追加 <类型>_invalid 列)")
+    args = parser.parse_args(argv)
+
+    npy_input = args.input.lower().endswith(".npy")
+    npy_output = args.output.lower().endswith(".npy")
+    if npy_input and not npy_output:
+        parser.error(".npy 输入只能输出为 .npy")
+
+    frame = None if npy_input else read_table(args.input)
+    started = time.perf_counter()
+    predictions, invalid = backfill(args.input if npy_input else frame, args.prediction_type,
+                                    args.output if npy_output else None, args.workers,
+                                    args.shard_size, args.model_dir, args.fused, args.work_dir,
+                                    policy=args.invalid, return_invalid=True)
+    elapsed = time.perf_counter() - started
+
+    if not npy_output:
+        frame[args.prediction_type] = predictions
+        if args.invalid != REJECT:
+            frame[f"{args.prediction_type}_invalid"] = invalid
+        write_table(frame, args.output)
+    if invalid.any():
+        print(f"{int(invalid.sum())} 行输入超出允许范围 (--invalid {args.invalid})",
+              file=sys.stderr)
+    print(f"{len(predictions)} 行预测结果已写入 {args.output} "
+          f"({args.workers} 个进程, {elapsed:.2f} 秒, {len(predictions) / elapsed:,.0f} 行/秒)",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
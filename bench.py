@@ -0,0 +1,267 @@
+"""可复现的性能基准: 冷启动加载耗时、单行预测延迟和不同批大小下的吞吐量
+
+输入在 PARAMETER_RANGES 内按固定种子均匀采样. 结果输出为 JSON, 可与保存的基线对比,
+任一指标劣化超过容差时返回非零退出码.
+
+用法示例:
+    python bench.py -o baseline.json
+    python bench.py --baseline baseline.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from config import PREDICTION_TYPES
+from fused import usable_fused, load_fused, sample_inputs
+from loader import BASE_DIR, ARTIFACT_KINDS, load_artifacts
+from bundle import usable_bundle
+from predictor import predict_array
+
+BENCH_FORMAT_VERSION = 1
+DEFAULT_BATCH_SIZES = [1, 10, 100, 1000, 10000, 100000]
+DEFAULT_VARIANTS = ["original", "bundle", "fused"]
+
+# 冷启动在独立的子进程中测量, 保证每次都重新导入 catboost/sklearn
+_COLD_START_PROBE = """
+import json, sys, time, warnings
+warnings.simplefilter("ignore")
+start = time.perf_counter()
+sys.path.insert(0, {repo_dir!r})
+from fused import load_fused
+from loader import load_artifact
+result = {{"import_s": time.perf_counter() - start}}
+for kind in {kinds!r}:
+    start = time.perf_counter()
+    if kind == "fused":
+        load_fused({prediction_type!r}, {base_dir!r})
+    else:
+        load_artifact({prediction_type!r}, kind, {base_dir!r}, use_bundle={use_bundle!r})
+    result[kind + "_s"] = time.perf_counter() - start
+print(json.dumps(result))
+"""
+
+
+def metric(value, unit, better="lower"):
+    return {"value": float(value), "unit": unit, "better": better}
+
+
+def available_variants(prediction_type, base_dir, variants):
+    """过滤掉所需文件不存在或已过期的实现 (模型包或融合模型尚未导出)"""
+    usable = []
+    for variant in variants:
+        if variant == "bundle" and usable_bundle(prediction_type, base_dir) is None:
+            continue
+        if variant == "fused" and usable_fused(prediction_type, base_dir) is None:
+            continue
+        usable.append(variant)
+    return usable
+
+
+def load_predict_function(prediction_type, variant, base_dir):
+    """返回某实现的 predict(矩阵) 函数"""
+    if variant == "fused":
+        return load_fused(prediction_type, base_dir).predict
+    model_info = load_artifacts(prediction_type, base_dir, use_bundle=(variant == "bundle"))
+    return lambda X: predict_array(model_info, X)
+
+
+def bench_cold_start(prediction_type, variant, base_dir, repeats=3):
+    """在子进程中测量导入和每个产物的加载耗时, 取多次运行的中位数"""
+    kinds = ["fused"] if variant == "fused" else list(ARTIFACT_KINDS)
+    code = _COLD_START_PROBE.format(repo_dir=os.path.dirname(os.path.abspath(__file__)),
+                                    kinds=kinds, base_dir=base_dir,
+                                    prediction_type=prediction_type,
+                                    use_bundle=(variant == "bundle"))
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    metrics = {}
+    for key in runs[0]:
+        metrics[f"cold_start.{key[:-2]}_ms"] = metric(
+            np.median([run[key] for run in runs]) * 1000, "ms")
+    metrics["cold_start.total_ms"] = metric(
+        np.median([sum(run.values()) for run in runs]) * 1000, "ms")
+    return metrics
+
+
+def bench_latency(predict, X, iterations=200, warmup=20):
+    """逐行调用 predict, 返回单行延迟的分位数 (微秒)"""
+    rows = [X[i % len(X)][None, :] for i in range(iterations + warmup)]
+    for row in rows[:warmup]:
+        predict(row)
+    timings = np.empty(iterations)
+    for i, row in enumerate(rows[warmup:]):
+        start = time.perf_counter()
+        predict(row)
+        timings[i] = time.perf_counter() - start
+    timings *= 1e6
+    return {"latency.p50_us": metric(np.percentile(timings, 50), "us"),
+            "latency.p95_us": metric(np.percentile(timings, 95), "us"),
+            "latency.mean_us": metric(timings.mean(), "us")}
+
+
+def bench_throughput(predict, X, batch_sizes, min_time=0.2):
+    """每个批大小至少运行 min_time 秒, 返回行/秒"""
+    metrics = {}
+    for batch_size in batch_sizes:
+        batch = X[:batch_size] if batch_size <= len(X) else np.resize(X, (batch_size, X.shape[1]))
+        predict(batch)
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            predict(batch)
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        metrics[f"throughput.batch_{batch_size}_rows_per_s"] = metric(
+            calls * batch_size / elapsed, "rows/s", better="higher")
+    return metrics
+
+
+def run_benchmarks(prediction_types=None, variants=None, base_dir=BASE_DIR,
+                   batch_sizes=None, iterations=200, cold_repeats=3, min_time=0.2, seed=0,
+                   log=None):
+    """运行全部基准, 返回可写为 JSON 的字典; 指标名形如 "OCC_W.original.latency.p50_us" """
+    batch_sizes = batch_sizes or DEFAULT_BATCH_SIZES
+    metrics = {}
+    for pred_type in prediction_types or PREDICTION_TYPES:
+        X = sample_inputs(pred_type, max(max(batch_sizes), iterations), seed)
+        for variant in available_variants(pred_type, base_dir, variants or DEFAULT_VARIANTS):
+            prefix = f"{pred_type}.{variant}"
+            if log is not None:
+                log(f"{prefix} ...")
+            results = {}
+            if cold_repeats > 0:
+                results.update(bench_cold_start(pred_type, variant, base_dir, cold_repeats))
+            predict = load_predict_function(pred_type, variant, base_dir)
+            results.update(bench_latency(predict, X, iterations))
+            results.update(bench_throughput(predict, X, batch_sizes, min_time))
+            metrics.update({f"{prefix}.{name}": value for name, value in results.items()})
+
+    return {
+        "format_version": BENCH_FORMAT_VERSION,
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                 "python": platform.python_version(), "numpy": np.__version__,
+                 "platform": platform.platform(), "cpu_count": os.cpu_count(),
+                 "seed": seed, "batch_sizes": batch_sizes, "iterations": iterations},
+        "metrics": metrics,
+    }
+
+
+def compare(results, baseline, tolerance=0.2, in_scope=None):
+    """与基线对比, 返回 [(指标名, 基线值, 当前值, 变化比例, 是否劣化)]
+
+    变化比例为正表示变好; 劣化超过 tolerance 的指标标记为回退. 基线中有而本次没有的
+    指标 (基准消失或中途失败) 当前值和变化比例为 None, 同样标记为回退; in_scope(指标名)
+    为 False 的指标 (本次未要求运行的预测类型、实现等) 不计为缺失
+    """
+    rows = []
+    for name, current in results["metrics"].items():
+        previous = baseline.get("metrics", {}).get(name)
+        if previous is None or previous["value"] == 0:
+            continue
+        change = (current["value"] - previous["value"]) / previous["value"]
+        if current["better"] == "lower":
+            change = -change
+        rows.append((name, previous["value"], current["value"], change, change < -tolerance))
+    for name, previous in baseline.get("metrics", {}).items():
+        if name not in results["metrics"] and (in_scope is None or in_scope(name)):
+            rows.append((name, previous["value"], None, None, True))
+    return rows
+
+
+def format_comparison(rows):
+    lines = []
+    for name, previous, current, change, regressed in rows:
+        if current is None:
+            lines.append(f"{name:<60} {previous:>14.2f} {'缺失':>12} {'':>8}  <-- 缺失")
+            continue
+        flag = "  <-- 回退" if regressed else ""
+        lines.append(f"{name:<60} {previous:>14.2f} {current:>14.2f} {change:>+8.1%}{flag}")
+    return "\n".join(lines)
+
+
+def requested_scope(prediction_types, variants, batch_sizes, cold_repeats):
+    """返回 in_scope(指标名): 指标是否属于本次要求运行的预测类型、实现、批大小和冷启动"""
+    batch_names = {f"throughput.batch_{batch_size}_rows_per_s" for batch_size in batch_sizes}
+
+    def in_scope(name):
+        pred_type, variant, measure = (name.split(".", 2) + ["", ""])[:3]
+        if pred_type not in prediction_types or variant not in variants:
+            return False
+        if measure.startswith("cold_start."):
+            return cold_repeats > 0
+        if measure.startswith("throughput."):
+            return measure in batch_names
+        return True
+
+    return in_scope
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="测量加载耗时、单行延迟和批量吞吐量")
+    parser.add_argument("prediction_types", nargs="*", metavar="prediction_type",
+                        help=f"默认测量全部: {', '.join(PREDICTION_TYPES)}")
+    parser.add_argument("--variants", nargs="+", default=DEFAULT_VARIANTS,
+                        help="original: 原始产物, bundle: 模型包, fused: 融合模型 (缺少文件时跳过)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=DEFAULT_BATCH_SIZES)
+    parser.add_argument("--iterations", type=int, default=200, help="单行延迟的测量次数")
+    parser.add_argument("--cold-repeats", type=int, default=3,
+                        help="冷启动子进程的运行次数 (0 表示跳过)")
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="每个批大小至少运行的秒数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="结果 JSON 文件, 默认输出到标准输出")
+    parser.add_argument("--baseline", help="对比的基线 JSON 文件")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="允许的劣化比例, 超过时返回非零退出码")
+    parser.add_argument("--model-dir", default=BASE_DIR, help="模型和scaler所在目录")
+    args = parser.parse_args(argv)
+
+    prediction_types = args.prediction_types or PREDICTION_TYPES
+    unknown = [pred_type for pred_type in prediction_types if pred_type not in PREDICTION_TYPES]
+    unknown += [variant for variant in args.variants if variant not in DEFAULT_VARIANTS]
+    if unknown:
+        parser.error(f"未知的预测类型或实现: {', '.join(unknown)}")
+
+    results = run_benchmarks(prediction_types, args.variants, args.model_dir, args.batch_sizes,
+                             args.iterations, args.cold_repeats, args.min_time, args.seed,
+                             log=lambda message: print(message, file=sys.stderr))
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"基准结果已写入 {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        in_scope = requested_scope(prediction_types, args.variants, args.batch_sizes,
+                                   args.cold_repeats)
+        rows = compare(results, baseline, args.tolerance, in_scope)
+        print(format_comparison(rows), file=sys.stderr)
+        missing = [row for row in rows if row[2] is None]
+        regressions = [row for row in rows if row[4] and row[2] is not None]
+        if missing:
+            print(f"{len(missing)} 项基线指标本次缺失", file=sys.stderr)
+        if regressions:
+            print(f"{len(regressions)} 项指标劣化超过 {args.tolerance:.0%}", file=sys.stderr)
+        if missing or regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""单文件、可内存映射的模型包: 每个预测类型一个文件, 取代 模型 + scaler_X + scaler_y 三个产物
+
+文件布局 (小端):
+    8 字节魔数 | uint32 格式版本 | uint32 头部长度 | UTF-8 JSON 头部 | 按 64 字节对齐的数组数据
+
+头部记录预测类型、INPUT_ORDER、PARAMETER_RANGES、来源产物的大小、修改时间和 SHA-256
+以及每个数组的 dtype、形状、偏移和 SHA-256. 加载时只解析头部并映射文件, 数组直接引用
+映射的页面, 多个进程加载同一文件时共享物理内存. 每次加载都检查头部的 INPUT_ORDER 和
+PARAMETER_RANGES 与当前配置一致; 来源产物与记录不一致时模型包视为过期.
+
+由现有产物生成并校验:
+    python bundle.py --check-samples 20000
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+import numpy as np
+
+from config import (PREDICTION_TYPES, PARAMETER_RANGES, OUTPUT_CONCENTRATION_RANGES,
+                    INPUT_ORDER)
+from fused import (ENSEMBLE_KINDS, EVAL_CHUNK_SIZE, ensemble_from_model, scaler_params,
+                   sample_inputs)
+from loader import (BASE_DIR, ARTIFACT_KINDS, load_artifacts, resolve_paths, source_record,
+                    stale_sources)
+
+BUNDLE_MAGIC = b"IONBNDL\0"
+BUNDLE_FORMAT_VERSION = 1
+BUNDLE_FILE_PATTERN = "{}.bundle"
+
+# 魔数 + 版本 + 头部长度
+_PREFIX = struct.Struct("<8sII")
+_ALIGNMENT = 64
+
+
+class ArrayScaler:
+    """以 transform(x) = x * scale + offset 表示的 scaler, 运算顺序与 sklearn 的 MinMaxScaler 一致"""
+
+    def __init__(self, scale, offset):
+        self.scale = scale
+        self.offset = offset
+
+    def transform(self, X):
+        return np.asarray(X, dtype=np.float64) * self.scale + self.offset
+
+    def inverse_transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.offset) / self.scale
+
+
+class TreeModel:
+    """对归一化输入预测的数组化树集成, 按块评估以限制中间数组大小"""
+
+    def __init__(self, ensemble):
+        self.ensemble = ensemble
+
+    def predict(self, X):
+        # 与 CatBoost 和 sklearn 的树一致, 以 float32 的特征值与阈值比较
+        X = np.asarray(X, dtype=np.float32)
+        output = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), EVAL_CHUNK_SIZE):
+            stop = start + EVAL_CHUNK_SIZE
+            output[start:stop] = self.ensemble.predict(X[start:stop])
+        return output
+
+
+def bundle_path(prediction_type, base_dir=BASE_DIR):
+    return os.path.join(base_dir, BUNDLE_FILE_PATTERN.format(prediction_type))
+
+
+def _align(offset):
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def bundle_arrays(model_info):
+    """把已加载的 {"model", "scaler_X", "scaler_y"} 展开为 (模型类型, {数组名: 数组})"""
+    ensemble = ensemble_from_model(model_info["model"])
+    arrays = {f"model/{name}": value for name, value in ensemble.to_arrays().items()}
+    for kind in ("scaler_X", "scaler_y"):
+        scale, offset = scaler_params(model_info[kind])
+        arrays[f"{kind}/scale"] = scale
+        arrays[f"{kind}/offset"] = offset
+    return ensemble.kind, arrays
+
+
+def write_bundle(path, prediction_type, model_info, sources=None):
+    """写入模型包; sources 为 {产物: 文件路径}, 记录其文件名、大小、修改时间和 SHA-256"""
+    kind, arrays = bundle_arrays(model_info)
+    input_order = INPUT_ORDER[prediction_type]
+    header = {
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "prediction_type": prediction_type,
+        "model_kind": kind,
+        "input_order": input_order,
+        "parameter_ranges": {key: list(PARAMETER_RANGES[key]) for key in input_order
+                             if key in PARAMETER_RANGES},
+        "output_range": list(OUTPUT_CONCENTRATION_RANGES.get(prediction_type, ())),
+        "sources": {name: source_record(source) for name, source in (sources or {}).items()},
+        "arrays": {},
+    }
+
+    # 整数统一存为 int64, 浮点存为 float64, 加载后可直接作为 intp/float64 视图使用
+    blobs = []
+    offset = 0
+    for name, value in arrays.items():
+        value = np.asarray(value)
+        value = value.astype("<i8" if np.issubdtype(value.dtype, np.integer) else "<f8")
+        offset = _align(offset)
+        data = value.tobytes()
+        header["arrays"][name] = {"dtype": value.dtype.str, "shape": list(value.shape),
+                                  "offset": offset, "sha256": hashlib.sha256(data).hexdigest()}
+        blobs.append((offset, data))
+        offset += len(data)
+
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = _align(_PREFIX.size + len(header_bytes))
+
+    # 先写临时文件再替换, 正在映射旧文件的进程不受影响
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREFIX.pack(BUNDLE_MAGIC, BUNDLE_FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for offset, data in blobs:
+            f.seek(data_start + offset)
+            f.write(data)
+    os.replace(tmp_path, path)
+    return header
+
+
+def read_header(buffer):
+    """解析模型包头部, 返回 (头部字典, 数据区起始偏移)"""
+    if len(buffer) < _PREFIX.size:
+        raise ValueError("模型包文件不完整")
+    magic, version, header_size = _PREFIX.unpack_from(buffer, 0)
+    if magic != BUNDLE_MAGIC:
+        raise ValueError("不是模型包文件")
+    if version != BUNDLE_FORMAT_VERSION:
+        raise ValueError(f"不支持的模型包版本: {version}")
+    header = json.loads(bytes(buffer[_PREFIX.size:_PREFIX.size + header_size]).decode("utf-8"))
+    return header, _align(_PREFIX.size + header_size)
+
+
+def read_header_file(path):
+    """只读取模型包头部, 不映射数组数据"""
+    with open(path, "rb") as f:
+        prefix = f.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            raise ValueError("模型包文件不完整")
+        header_size = _PREFIX.unpack(prefix)[2]
+        return read_header(prefix + f.read(header_size))[0]
+
+
+def config_mismatch(header):
+    """头部的 INPUT_ORDER 和 PARAMETER_RANGES 与当前配置不一致时返回说明, 一致时返回 None"""
+    input_order = INPUT_ORDER.get(header["prediction_type"])
+    if header["input_order"] != input_order:
+        return "输入顺序与 INPUT_ORDER 不一致"
+    ranges = {key: list(PARAMETER_RANGES[key]) for key in input_order if key in PARAMETER_RANGES}
+    if header["parameter_ranges"] != ranges:
+        return "参数范围与 PARAMETER_RANGES 不一致"
+    return None
+
+
+class ModelBundle:
+    """内存映射的模型包, 数组为只读视图, 不复制到进程私有内存"""
+
+    def __init__(self, path, verify=False):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.header, data_start = read_header(self._mmap)
+        self.prediction_type = self.header["prediction_type"]
+        mismatch = config_mismatch(self.header)
+        if mismatch is not None:
+            raise ValueError(f"模型包 {path} 的{mismatch}, 请重新运行 python bundle.py 生成")
+
+        self.arrays = {}
+        for name, spec in self.header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"], dtype=np.int64))
+            start = data_start + spec["offset"]
+            if start + count * dtype.itemsize > len(self._mmap):
+                raise ValueError(f"模型包 {path} 已损坏: 数组 {name} 超出文件末尾")
+            self.arrays[name] = np.frombuffer(self._mmap, dtype=dtype, count=count,
+                                              offset=start).reshape(tuple(spec["shape"]))
+        if verify:
+            self.verify()
+
+    def verify(self):
+        """逐个数组校验 SHA-256 (需读取整个文件, 因此只在 verify=True 时执行)"""
+        for name, spec in self.header["arrays"].items():
+            if hashlib.sha256(self.arrays[name].tobytes()).hexdigest() != spec["sha256"]:
+                raise ValueError(f"模型包 {self.path} 校验失败: 数组 {name}")
+
+    def _group(self, prefix):
+        return {name[len(prefix):]: value for name, value in self.arrays.items()
+                if name.startswith(prefix)}
+
+    def artifact(self, kind):
+        """构建单个产物: "model" 为 TreeModel, "scaler_X"/"scaler_y" 为 ArrayScaler"""
+        if kind == "model":
+            ensemble_cls = ENSEMBLE_KINDS[self.header["model_kind"]]
+            return TreeModel(ensemble_cls.from_arrays(self._group("model/")))
+        arrays = self._group(f"{kind}/")
+        return ArrayScaler(arrays["scale"], arrays["offset"])
+
+    def model_info(self):
+        """返回与 load_artifacts 相同结构的 {"model", "scaler_X", "scaler_y"}"""
+        return {kind: self.artifact(kind) for kind in ARTIFACT_KINDS}
+
+
+def load_bundle(path, verify=False):
+    """加载模型包, 返回 {"model", "scaler_X", "scaler_y"}"""
+    return ModelBundle(path, verify).model_info()
+
+
+def usable_bundle(prediction_type, base_dir=BASE_DIR):
+    """与当前配置和原始产物一致的模型包路径, 否则返回 None (回退到原始产物)
+
+    原始产物被替换 (包括 cp -p 还原的旧文件) 或配置中的 INPUT_ORDER/PARAMETER_RANGES
+    已改变时模型包视为过期; 原始产物不存在时 (只部署模型包) 照常使用模型包.
+    """
+    path = bundle_path(prediction_type, base_dir)
+    try:
+        header = read_header_file(path)
+    except (OSError, ValueError):
+        return None
+    if config_mismatch(header) is not None:
+        return None
+    if stale_sources(header.get("sources", {}), prediction_type, base_dir):
+        return None
+    return path
+
+
+def check_parity(bundle_info, model_info, prediction_type, n_samples=10000, atol=1e-6, seed=0):
+    """与原始三步预测对比, 返回 (最大绝对误差, 超出 atol 的行比例)"""
+    from predictor import predict_array
+
+    X = sample_inputs(prediction_type, n_samples, seed)
+    error = np.abs(predict_array(bundle_info, X) - predict_array(model_info, X))
+    return float(error.max()), float(np.mean(error > atol))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把模型和scaler转换为单文件内存映射模型包")
+    parser.add_argument("prediction_types", nargs="*", metavar="prediction_type",
+                        help=f"默认转换全部: {', '.join(PREDICTION_TYPES)}")
+    parser.add_argument("--model-dir", default=BASE_DIR, help="原始模型和scaler所在目录")
+    parser.add_argument("--output-dir", default=None, help="模型包输出目录, 默认与模型目录相同")
+    parser.add_argument("--check-samples", type=int, default=10000)
+    parser.add_argument("--atol", type=float, default=1e-6)
+    parser.add_argument("--max-mismatch", type=float, default=1e-3,
+                        help="允许超出 atol 的行比例 (阈值恰好落在浮点边界上的样本)")
+    args = parser.parse_args(argv)
+
+    prediction_types = args.prediction_types or PREDICTION_TYPES
+    unknown = [pred_type for pred_type in prediction_types if pred_type not in PREDICTION_TYPES]
+    if unknown:
+        parser.error(f"未知的预测类型: {', '.join(unknown)}")
+
+    output_dir = args.output_dir or args.model_dir
+    failed = False
+    for pred_type in prediction_types:
+        model_info = load_artifacts(pred_type, args.model_dir, use_bundle=False)
+        path = bundle_path(pred_type, output_dir)
+        write_bundle(path, pred_type, model_info, resolve_paths(pred_type, args.model_dir))
+
+        bundle_info = load_bundle(path, verify=True)
+        max_error, mismatch = check_parity(bundle_info, model_info, pred_type,
+                                           args.check_samples, args.atol)
+        print(f"{pred_type}: 最大误差 {max_error:.3e} g/L, 不一致比例 {mismatch:.4%}")
+        if mismatch > args.max_mismatch:
+            print(f"{pred_type} 一致性校验失败, 已删除 {path}", file=sys.stderr)
+            os.remove(path)
+            failed = True
+            continue
+        print(f"{pred_type} 模型包已写入 {path} ({os.path.getsize(path) / 1024:.1f} KB)")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""按预测类型划分的有界 LRU 预测缓存"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from config import INPUT_ORDER
+from metrics import METRICS
+
+DEFAULT_CACHE_SIZE = 4096
+
+
+class PredictionCache:
+    """以 INPUT_ORDER 排列的输入向量为键缓存预测值
+
+    tolerance 为 None 时按精确值匹配; 为数值或 {参数名: 容差} 时, 输入对齐到容差网格后
+    作为键, 同一格内的输入共用一个缓存结果. 对齐只用于键, 未命中时模型仍以原始输入计算,
+    不会把输入移到网格点 (可能超出 PARAMETER_RANGES) 上.
+    产物签名变化时 (模型或scaler文件更新) 对应预测类型的缓存整体失效.
+    """
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE, tolerance=None):
+        self.max_size = max_size
+        self.tolerance = tolerance
+        self._entries = {}
+        self._signatures = {}
+        self._steps = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def _counter(self, prediction_type):
+        return self._counters.setdefault(prediction_type,
+                                         {"hits": 0, "misses": 0, "evictions": 0})
+
+    def _tolerance_vector(self, prediction_type):
+        """每列的对齐步长, 0 表示该列不对齐"""
+        if prediction_type not in self._steps:
+            input_order = INPUT_ORDER[prediction_type]
+            if isinstance(self.tolerance, dict):
+                steps = [self.tolerance.get(key) or 0.0 for key in input_order]
+            else:
+                steps = [self.tolerance or 0.0] * len(input_order)
+            self._steps[prediction_type] = np.asarray(steps, dtype=np.float64)
+        return self._steps[prediction_type]
+
+    def quantize(self, matrix, prediction_type):
+        """把输入对齐到容差网格, 结果只用作缓存键"""
+        matrix = np.asarray(matrix, dtype=np.float64)
+        steps = self._tolerance_vector(prediction_type)
+        if not steps.any():
+            return matrix
+        snapped = np.round(matrix / np.where(steps > 0, steps, 1.0)) * steps
+        return np.where(steps > 0, snapped, matrix) + 0.0  # +0.0 把 -0.0 归一为 0.0
+
+    def _check_signature(self, prediction_type, signature):
+        """签名变化时清空该预测类型的缓存 (需持有锁)"""
+        if (prediction_type not in self._entries
+                or self._signatures.get(prediction_type) != signature):
+            self._signatures[prediction_type] = signature
+            self._entries[prediction_type] = OrderedDict()
+        return self._entries[prediction_type]
+
+    def predict(self, matrix, prediction_type, compute, signature=None, kind=None):
+        """返回每行的预测值; 批内重复行只算一次, 只对未命中的行调用 compute(矩阵)
+
+        kind 用于在同一缓存中区分同一输入的其他结果 (如带区间的预测), 此时 compute
+        可返回 N×K 矩阵, 结果相应为 N×K
+        """
+        matrix = np.asarray(matrix, dtype=np.float64)
+        keys = np.ascontiguousarray(self.quantize(matrix, prediction_type))
+        row_view = keys.view(np.dtype((np.void, keys.dtype.itemsize * keys.shape[1]))).ravel()
+        unique_rows, first_index, inverse = np.unique(row_view, return_index=True,
+                                                      return_inverse=True)
+        unique_keys = unique_rows.tolist()
+        if kind is not None:
+            unique_keys = [(kind, key) for key in unique_keys]
+        values = [None] * len(unique_keys)
+        missing = []
+
+        with self._lock:
+            entries = self._check_signature(prediction_type, signature)
+            for i, key in enumerate(unique_keys):
+                value = entries.get(key)
+                if value is None:
+                    missing.append(i)
+                else:
+                    entries.move_to_end(key)
+                    values[i] = value
+
+        if missing:
+            computed = np.asarray(compute(matrix[first_index[missing]]),
+                                  dtype=np.float64).tolist()
+            for i, value in zip(missing, computed):
+                values[i] = value
+            self._store(prediction_type, signature,
+                        [unique_keys[i] for i in missing], computed)
+
+        with self._lock:
+            counter = self._counter(prediction_type)
+            counter["hits"] += len(keys) - len(missing)
+            counter["misses"] += len(missing)
+        if METRICS.enabled:
+            METRICS.increment("cache_hits_total", len(keys) - len(missing),
+                              prediction_type=prediction_type)
+            METRICS.increment("cache_misses_total", len(missing), prediction_type=prediction_type)
+        return np.asarray(values, dtype=np.float64)[inverse.ravel()]
+
+    def _store(self, prediction_type, signature, keys, values):
+        with self._lock:
+            if (prediction_type not in self._entries
+                    or self._signatures.get(prediction_type) != signature):
+                return  # 计算期间模型已更新或缓存被清空, 结果不再写入
+            entries = self._entries[prediction_type]
+            counter = self._counter(prediction_type)
+            for key, value in zip(keys, values):
+                entries[key] = value
+                entries.move_to_end(key)
+            while len(entries) > self.max_size:
+                entries.popitem(last=False)
+                counter["evictions"] += 1
+
+    def invalidate(self, prediction_type=None):
+        """清空某个或全部预测类型的缓存"""
+        with self._lock:
+            for pred_type in ([prediction_type] if prediction_type else list(self._entries)):
+                self._entries.pop(pred_type, None)
+                self._signatures.pop(pred_type, None)
+
+    def stats(self):
+        """返回 {预测类型: {"size", "hits", "misses", "evictions", "hit_rate"}}"""
+        with self._lock:
+            result = {}
+            for pred_type, counter in self._counters.items():
+                lookups = counter["hits"] + counter["misses"]
+                result[pred_type] = dict(counter, size=len(self._entries.get(pred_type, ())),
+                                         hit_rate=counter["hits"] / lookups if lookups else 0.0)
+            return result
@@ -0,0 +1,233 @@
+"""电解液离子浓度预测的共享常量配置"""
+
+# ==================== 常量配置 ====================
+PREDICTION_TYPES = ["OAC_W", "OCC_D", "OCC_W"]
+
+# 参数范围配置
+PARAMETER_RANGES = {
+    "Anode_Copper_content": (99.46, 99.90),
+    "Anode_Bismuth_content": (0.0074, 0.0406),
+    "Anode_Antimony_content": (0.0161, 0.0534),
+    "Anode_Nickel_content": (0.0145, 0.394),
+    "Anode_Arsenic_content": (0.0391, 0.190),
+    "Current Density": (259.073, 384.352),
+    "Inlet Sulfate ion concentration": (161.86, 191.73),
+    "Inlet Copper ion concentration": (38.81, 53.65),
+    "Inlet Antimony ion concentration": (0.16, 0.27),
+    "Inlet Bismuth ion concentration": (0.08, 0.319),
+    "Inlet Nickel ion concentration": (5.68, 14.98),
+    "Inlet Arsenic ion concentration": (5, 14.82),
+    "Electrolyte_Time": (3.33, 334),
+    "Inlet Chloride ion concentration": (0.043, 0.072),
+    "Number of Electrolysis Tanks": (42, 436)
+}
+
+# 输出浓度范围配置
+OUTPUT_CONCENTRATION_RANGES = {
+    "OAC_W": (6.36, 9.11),
+    "OCC_D": (44.35, 50.14),
+    "OCC_W": (44.35, 50.14)
+}
+
+# 模型配置
+MODEL_CONFIG = {
+    "OAC_W": {
+        "model_file": "catboost_OAC_W_model.pkl",
+        "scaler_X_file": "scaler_X_OAC_W.pkl",
+        "scaler_y_file": "scaler_y_OAC_W.pkl",
+        "model_type": "joblib"
+    },
+    "OCC_D": {
+        "model_file": "catboost_OCC_D_model.cbm",
+        "scaler_X_file": "scaler_X_OCC_D.pkl",
+        "scaler_y_file": "scaler_y_OCC_D.pkl",
+        "model_type": "catboost"
+    },
+    "OCC_W": {
+        "model_file": "adaboost_OCC_W_model.pkl",
+        "scaler_X_file": "scaler_X_OCC_W.pkl",
+        "scaler_y_file": "scaler_y_OCC_W.pkl",
+        "model_type": "joblib"
+    }
+}
+
+# 参数配置
+PARAMETERS_CONFIG = {
+    "OAC_W": {
+        "chemical": {
+            "Anode_Copper_content": 99.83,
+            "Anode_Bismuth_content": 0.0156,
+            "Anode_Antimony_content": 0.0255,
+            "Anode_Nickel_content": 0.0406,
+            "Anode_Arsenic_content": 0.0873
+        },
+        "physical": {
+            "Inlet Sulfate ion concentration": 178.18,
+            "Inlet Copper ion concentration": 48.97,
+            "Inlet Antimony ion concentration": 0.200,
+            "Inlet Bismuth ion concentration": 0.170,
+            "Inlet Nickel ion concentration": 10.700,
+            "Inlet Chloride ion concentration": 0.057,
+            "Inlet Arsenic ion concentration": 8.67
+        },
+        "experimental": {
+            "Current Density": 340.417,
+            "Electrolyte_Time": 164,
+            "Number of Electrolysis Tanks": 371.67,
+        }
+    },
+    "OCC_D": {
+        "chemical": {
+            "Anode_Copper_content": 99.83,
+            "Anode_Bismuth_content": 0.0226,
+            "Anode_Antimony_content": 0.02,
+            "Anode_Nickel_content": 0.0271,
+            "Anode_Arsenic_content": 0.09
+        },
+        "physical": {
+            "Inlet Sulfate ion concentration": 171.61,
+            "Inlet Copper ion concentration": 50.38,
+            "Inlet Chloride ion concentration": 0.056
+        },
+        "experimental": {
+            "Current Density": 327.204,
+            "Electrolyte_Time": 37.33,
+            "Number of Electrolysis Tanks": 415.83,
+        }
+    },
+    "OCC_W": {
+        "chemical": {
+            "Anode_Copper_content": 99.79,
+            "Anode_Bismuth_content": 0.0199,
+            "Anode_Antimony_content": 0.0437,
+            "Anode_Nickel_content": 0.0392,
+            "Anode_Arsenic_content": 0.1015
+        },
+        "physical": {
+            "Inlet Sulfate ion concentration": 168,
+            "Inlet Copper ion concentration": 49.33,
+            "Inlet Antimony ion concentration": 0.240,
+            "Inlet Bismuth ion concentration": 0.093,
+            "Inlet Nickel ion concentration": 9.9,
+            "Inlet Chloride ion concentration": 0.056,
+            "Inlet Arsenic ion concentration": 9.30
+        },
+        "experimental": {
+            "Current Density": 327.015,
+            "Electrolyte_Time": 108,
+            "Number of Electrolysis Tanks": 269.5,
+        }
+    }
+}
+
+# 输入字段标签映射
+INPUT_LABELS = {
+    "Anode_Copper_content": "Anode Copper content (%):",
+    "Anode_Bismuth_content": "Anode Bismuth content (%):",
+    "Anode_Antimony_content": "Anode Antimony content (%):",
+    "Anode_Nickel_content": "Anode Nickel content (%):",
+    "Anode_Arsenic_content": "Anode Arsenic content (%):",
+    "Current Density": "Current Density (A/m2):",
+    "Inlet Sulfate ion concentration": "Inlet Sulfate ion concentration (g/L):",
+    "Inlet Copper ion concentration": "Inlet Copper ion concentration (g/L):",
+    "Inlet Antimony ion concentration": "Inlet Antimony ion concentration (g/L):",
+    "Inlet Bismuth ion concentration": "Inlet Bismuth ion concentration (g/L):",
+    "Inlet Nickel ion concentration": "Inlet Nickel ion concentration (g/L):",
+    "Inlet Arsenic ion concentration": "Inlet Arsenic ion concentration (g/L):",
+    "Electrolyte_Time": "Electrolyte Time (Day):",
+    "Inlet Chloride ion concentration": "Inlet Chloride ion concentration (g/L):",
+    "Number of Electrolysis Tanks": "Number of Electrolysis Tanks (Set):"
+}
+
+# 参数步长
+PARAMETER_STEPS = {
+    "Electrolyte_Time": 0.2,
+    "Anode_Copper_content": 0.5,
+    "Anode_Bismuth_content": 0.02,
+    "Anode_Antimony_content": 0.02,
+    "Anode_Nickel_content": 0.5,
+    "Anode_Arsenic_content": 0.2,
+    "Current Density": 1.0,
+    "Inlet Sulfate ion concentration": 5.0,
+    "Inlet Copper ion concentration": 0.1,
+    "Inlet Antimony ion concentration": 0.1,
+    "Inlet Bismuth ion concentration": 0.1,
+    "Inlet Nickel ion concentration": 0.1,
+    "Inlet Chloride ion concentration": 0.02,
+    "Inlet Arsenic ion concentration": 0.1,
+    "Number of Electrolysis Tanks": 5.0,
+}
+
+# 预测类型的输入顺序
+INPUT_ORDER = {
+    "OAC_W": [
+        "Electrolyte_Time",
+        "Anode_Copper_content",
+        "Anode_Bismuth_content",
+        "Anode_Antimony_content",
+        "Anode_Nickel_content",
+        "Anode_Arsenic_content",
+        "Current Density",
+        "Inlet Sulfate ion concentration",
+        "Inlet Copper ion concentration",
+        "Inlet Antimony ion concentration",
+        "Inlet Bismuth ion concentration",
+        "Inlet Nickel ion concentration",
+        "Inlet Chloride ion concentration",
+        "Inlet Arsenic ion concentration",
+        "Number of Electrolysis Tanks"
+    ],
+    "OCC_D": [
+        "Electrolyte_Time",
+        "Anode_Copper_content",
+        "Anode_Bismuth_content",
+        "Anode_Antimony_content",
+        "Anode_Nickel_content",
+        "Anode_Arsenic_content",
+        "Current Density",
+        "Inlet Sulfate ion concentration",
+        "Inlet Copper ion concentration",
+        "Inlet Chloride ion concentration",
+        "Number of Electrolysis Tanks"
+    ],
+    "OCC_W": [
+        "Electrolyte_Time",
+        "Anode_Copper_content",
+        "Anode_Bismuth_content",
+        "Anode_Antimony_content",
+        "Anode_Nickel_content",
+        "Anode_Arsenic_content",
+        "Current Density",
+        "Inlet Sulfate ion concentration",
+        "Inlet Copper ion concentration",
+        "Inlet Antimony ion concentration",
+        "Inlet Bismuth ion concentration",
+        "Inlet Nickel ion concentration",
+        "Inlet Chloride ion concentration",
+        "Inlet Arsenic ion concentration",
+        "Number of Electrolysis Tanks"
+    ]
+}
+
+
+def default_values(prediction_type):
+    """返回某预测类型在 PARAMETERS_CONFIG 中的默认输入 {参数名: 数值}"""
+    return {key: value for group in PARAMETERS_CONFIG[prediction_type].values()
+            for key, value in group.items()}
+
+
+# 同时预测全部类型时的输入顺序: 各预测类型输入特征的并集, 按首次出现的顺序排列
+ALL_TARGETS = "ALL"
+COMBINED_INPUT_ORDER = list(dict.fromkeys(
+    key for pred_type in PREDICTION_TYPES for key in INPUT_ORDER[pred_type]))
+
+
+def combined_parameters_config():
+    """合并各预测类型的参数分组, 同名参数取第一个预测类型中的默认值"""
+    combined = {}
+    for pred_type in PREDICTION_TYPES:
+        for group, params in PARAMETERS_CONFIG[pred_type].items():
+            target = combined.setdefault(group, {})
+            for key, value in params.items():
+                target.setdefault(key, value)
+    return combined
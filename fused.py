@@ -0,0 +1,446 @@
+"""把 scaler 折叠进树集成的紧凑数组表示, 推理时只依赖 NumPy
+
+导出文件记录来源产物的大小、修改时间和 SHA-256; 原始产物更新 (如 retrain.py 写入新模型)
+后融合模型视为过期, 加载时报错, 需重新导出.
+
+导出并做一致性校验:
+    python fused.py --check-samples 20000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from config import PREDICTION_TYPES, PARAMETER_RANGES, INPUT_ORDER, default_values
+from loader import BASE_DIR, load_artifacts, source_records, stale_sources
+
+# 2: 阈值按原始模型的 float32 比较精确折叠 (fold_borders), 旧版本需重新导出
+FUSED_FORMAT_VERSION = 2
+FUSED_FILE_PATTERN = "fused_{}.npz"
+
+# 评估时每块的行数, 限制 (行数 × 树数) 中间数组的大小
+EVAL_CHUNK_SIZE = 4096
+
+
+def scaler_params(scaler):
+    """把 scaler 表示为 transform(x) = x * scale + offset 的形式"""
+    name = type(scaler).__name__
+    if name == "MinMaxScaler":
+        return (np.asarray(scaler.scale_, dtype=np.float64),
+                np.asarray(scaler.min_, dtype=np.float64))
+    if name == "StandardScaler":
+        n_features = scaler.n_features_in_
+        std = np.asarray(scaler.scale_ if scaler.scale_ is not None else np.ones(n_features),
+                         dtype=np.float64)
+        mean = np.asarray(scaler.mean_ if scaler.mean_ is not None else np.zeros(n_features),
+                          dtype=np.float64)
+        return 1.0 / std, -mean / std
+    raise TypeError(f"不支持的 scaler 类型: {name}")
+
+
+def _check_positive(scale, what):
+    if np.any(scale <= 0):
+        raise ValueError(f"{what} 的缩放系数必须为正, 无法折叠进阈值")
+
+
+def fold_borders(borders, scale, offset):
+    """求原始输入空间的阈值 t, 使 x > t 与 float32(x * scale + offset) > border 对所有 float64 x 等价
+
+    CatBoost 和 sklearn 的树都先把归一化后的特征转为 float32 再与阈值比较, 直接取
+    (border - offset) / scale 时, 落在 float32 舍入区间内的输入会走错分支. 这里在
+    float64 上二分出精确的分界点; 非有限阈值 (补齐用的 +inf) 原样保留.
+    """
+    borders = np.asarray(borders, dtype=np.float64)
+    scale = np.broadcast_to(np.asarray(scale, dtype=np.float64), borders.shape)
+    offset = np.broadcast_to(np.asarray(offset, dtype=np.float64), borders.shape)
+    finite = np.isfinite(borders)
+    b, s, o = borders[finite], scale[finite], offset[finite]
+
+    def above(x):
+        return (x * s + o).astype(np.float32) > b
+
+    guess = (b - o) / s
+    step = (np.abs(guess) + 1.0) * 1e-6
+    # 扩大区间直到 lo 不满足、hi 满足条件
+    lo, hi = guess - step, guess + step
+    for _ in range(64):
+        low_bad, high_bad = above(lo), ~above(hi)
+        if not (low_bad.any() or high_bad.any()):
+            break
+        step *= 2
+        lo = np.where(low_bad, guess - step, lo)
+        hi = np.where(high_bad, guess + step, hi)
+    # 二分到相邻的两个 float64, lo 即最大的不满足条件的值
+    for _ in range(128):
+        mid = lo + (hi - lo) / 2
+        open_interval = (mid > lo) & (mid < hi)
+        if not open_interval.any():
+            break
+        is_above = above(mid)
+        hi = np.where(open_interval & is_above, mid, hi)
+        lo = np.where(open_interval & ~is_above, mid, lo)
+
+    folded = borders.copy()
+    folded[finite] = lo
+    return folded
+
+
+class ObliviousTreeEnsemble:
+    """CatBoost 对称树集成: 每棵树的每一层共用一个 (特征, 阈值) 分裂, x > 阈值 时该位为 1"""
+
+    kind = "oblivious"
+
+    def __init__(self, features, borders, leaf_values, bias=0.0):
+        self.features = np.asarray(features, dtype=np.intp)
+        self.borders = np.asarray(borders, dtype=np.float64)
+        self.leaf_values = np.asarray(leaf_values, dtype=np.float64)
+        self.bias = float(bias)
+        self.n_trees, self.depth = self.features.shape
+        self._leaf_offsets = (np.arange(self.n_trees, dtype=np.intp)
+                              * self.leaf_values.shape[1])[:, None]
+
+        # CatBoost 的阈值来自量化网格, 不同树大量复用同一分裂, 每个分裂只比较一次
+        splits = np.stack([self.features.ravel(), self.borders.ravel()], axis=1)
+        unique_splits, split_index = np.unique(splits, axis=0, return_inverse=True)
+        self._split_features = unique_splits[:, 0].astype(np.intp)
+        self._split_borders = unique_splits[:, 1][:, None]
+        self._split_index = split_index.reshape(self.features.shape)
+
+    def leaf_indices(self, X):
+        """返回每棵树上每行落入的叶子编号, 形状 (T, N)"""
+        bits = np.ascontiguousarray(X.T)[self._split_features] > self._split_borders
+        index = np.zeros((self.n_trees, len(X)), dtype=np.uint8 if self.depth <= 8 else np.uint16)
+        for level in range(self.depth):
+            index |= bits[self._split_index[:, level]].astype(index.dtype) << level
+        return index
+
+    def tree_outputs(self, X):
+        """每棵树对每行的贡献, 形状 (T, N)"""
+        return self.leaf_values.ravel()[self.leaf_indices(X) + self._leaf_offsets]
+
+    def predict(self, X):
+        return self.bias + self.tree_outputs(X).sum(axis=0)
+
+    def fold(self, x_scale, x_offset, y_scale, y_offset):
+        """把 scaler_X 折叠进阈值、把 scaler_y 的逆变换折叠进叶子值"""
+        _check_positive(x_scale, "scaler_X")
+        borders = fold_borders(self.borders, x_scale[self.features], x_offset[self.features])
+        return ObliviousTreeEnsemble(self.features, borders, self.leaf_values / y_scale,
+                                     (self.bias - y_offset) / y_scale)
+
+    def to_arrays(self):
+        return {"features": self.features, "borders": self.borders,
+                "leaf_values": self.leaf_values, "bias": np.array(self.bias)}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays["features"], arrays["borders"], arrays["leaf_values"],
+                   float(arrays["bias"]))
+
+    @classmethod
+    def from_catboost(cls, model):
+        """从 CatBoostRegressor 导出 (经由 CatBoost 的 JSON 模型格式)"""
+        fd, path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            model.save_model(path, format="json")
+            with open(path, encoding="utf-8") as f:
+                spec = json.load(f)
+        finally:
+            os.remove(path)
+
+        flat_index = {feature["feature_index"]: feature["flat_feature_index"]
+                      for feature in spec["features_info"]["float_features"]}
+        trees = spec["oblivious_trees"]
+        depth = max(len(tree["splits"]) for tree in trees)
+
+        # 较浅的树用永不成立的分裂 (阈值 +inf) 补齐到统一深度
+        features = np.zeros((len(trees), depth), dtype=np.intp)
+        borders = np.full((len(trees), depth), np.inf)
+        leaf_values = np.zeros((len(trees), 2 ** depth))
+        for t, tree in enumerate(trees):
+            for level, split in enumerate(tree["splits"]):
+                if split.get("split_type", "FloatFeature") != "FloatFeature":
+                    raise ValueError(f"不支持的 CatBoost 分裂类型: {split['split_type']}")
+                features[t, level] = flat_index[split["float_feature_index"]]
+                borders[t, level] = split["border"]
+            leaf_values[t, :len(tree["leaf_values"])] = tree["leaf_values"]
+
+        scale, bias = spec.get("scale_and_bias", [1.0, [0.0]])
+        bias = bias[0] if isinstance(bias, list) else bias
+        return cls(features, borders, leaf_values * scale, bias)
+
+
+class WeightedMedianTreeEnsemble:
+    """AdaBoost.R2 集成: 各回归树的输出按 estimator_weights 取加权中位数, x <= 阈值 时走左子树"""
+
+    kind = "weighted_median"
+
+    def __init__(self, feature, threshold, left, right, value, weights):
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.intp)
+        self.right = np.asarray(right, dtype=np.intp)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.n_trees, self.n_nodes = self.feature.shape
+        self._node_offsets = (np.arange(self.n_trees, dtype=np.intp) * self.n_nodes)[None, :]
+        self.depth = self._max_depth()
+
+    def _max_depth(self):
+        """从根节点沿左右子树同时推进, 直到所有路径都停在叶子上"""
+        trees = np.arange(self.n_trees)[:, None]
+        frontier = np.zeros((self.n_trees, 1), dtype=np.intp)
+        for depth in range(self.n_nodes):
+            children = np.hstack([self.left[trees, frontier], self.right[trees, frontier]])
+            if np.array_equal(children, np.hstack([frontier, frontier])):
+                return depth
+            frontier = children
+        return self.n_nodes
+
+    def tree_outputs(self, X):
+        """每棵树对每行的输出, 形状 (N, T); 叶子节点的左右子节点都指向自身"""
+        feature = self.feature.ravel()
+        threshold = self.threshold.ravel()
+        left = self.left.ravel()
+        right = self.right.ravel()
+        rows = np.arange(len(X))[:, None]
+
+        node = np.broadcast_to(self._node_offsets, (len(X), self.n_trees)).copy()
+        for _ in range(self.depth):
+            go_left = X[rows, feature[node]] <= threshold[node]
+            node = np.where(go_left, left[node], right[node]) + self._node_offsets
+        return self.value.ravel()[node]
+
+    def predict(self, X):
+        return self.weighted_median(self.tree_outputs(X))
+
+    def weighted_median(self, predictions):
+        """与 sklearn AdaBoostRegressor._get_median_predict 相同的加权中位数"""
+        rows = np.arange(len(predictions))
+        sorted_idx = np.argsort(predictions, axis=1)
+        weight_cdf = np.cumsum(self.weights[sorted_idx], axis=1)
+        median_or_above = weight_cdf >= 0.5 * weight_cdf[:, -1][:, None]
+        median_idx = median_or_above.argmax(axis=1)
+        return predictions[rows, sorted_idx[rows, median_idx]]
+
+    def fold(self, x_scale, x_offset, y_scale, y_offset):
+        """把 scaler_X 折叠进阈值、把 scaler_y 的逆变换折叠进叶子值"""
+        _check_positive(x_scale, "scaler_X")
+        _check_positive(np.atleast_1d(y_scale), "scaler_y")
+        threshold = fold_borders(self.threshold, x_scale[self.feature], x_offset[self.feature])
+        is_leaf = self.left == np.arange(self.n_nodes)[None, :]
+        threshold = np.where(is_leaf, self.threshold, threshold)
+        return WeightedMedianTreeEnsemble(self.feature, threshold, self.left, self.right,
+                                          (self.value - y_offset) / y_scale, self.weights)
+
+    def to_arrays(self):
+        return {"feature": self.feature, "threshold": self.threshold, "left": self.left,
+                "right": self.right, "value": self.value, "weights": self.weights}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays["feature"], arrays["threshold"], arrays["left"], arrays["right"],
+                   arrays["value"], arrays["weights"])
+
+    @classmethod
+    def from_adaboost(cls, model):
+        """从 sklearn AdaBoostRegressor (决策树基学习器) 导出"""
+        estimators = model.estimators_
+        trees = [estimator.tree_ for estimator in estimators]
+        n_nodes = max(tree.node_count for tree in trees)
+
+        # 叶子节点的左右子节点指向自身, 这样所有树都可以按同样的层数推进
+        feature = np.zeros((len(trees), n_nodes), dtype=np.intp)
+        threshold = np.zeros((len(trees), n_nodes))
+        left = np.tile(np.arange(n_nodes, dtype=np.intp), (len(trees), 1))
+        right = left.copy()
+        value = np.zeros((len(trees), n_nodes))
+        for t, tree in enumerate(trees):
+            count = tree.node_count
+            internal = tree.children_left[:count] != -1
+            feature[t, :count] = np.where(internal, tree.feature[:count], 0)
+            threshold[t, :count] = np.where(internal, tree.threshold[:count], 0.0)
+            left[t, :count] = np.where(internal, tree.children_left[:count], np.arange(count))
+            right[t, :count] = np.where(internal, tree.children_right[:count], np.arange(count))
+            value[t, :count] = tree.value[:count, 0, 0]
+
+        weights = np.asarray(model.estimator_weights_[:len(estimators)], dtype=np.float64)
+        return cls(feature, threshold, left, right, value, weights)
+
+
+ENSEMBLE_KINDS = {
+    ObliviousTreeEnsemble.kind: ObliviousTreeEnsemble,
+    WeightedMedianTreeEnsemble.kind: WeightedMedianTreeEnsemble,
+}
+
+
+def ensemble_from_model(model):
+    """根据模型类型导出对应的数组化集成"""
+    name = type(model).__name__
+    if name.startswith("CatBoost"):
+        return ObliviousTreeEnsemble.from_catboost(model)
+    if name == "AdaBoostRegressor":
+        return WeightedMedianTreeEnsemble.from_adaboost(model)
+    raise TypeError(f"不支持导出的模型类型: {name}")
+
+
+class FusedModel:
+    """单次遍历完成 scaler_X → model → scaler_y 的融合模型, 输入为原始单位, 输出为 g/L"""
+
+    def __init__(self, prediction_type, ensemble, sources=None):
+        self.prediction_type = prediction_type
+        self.input_order = INPUT_ORDER[prediction_type]
+        self.ensemble = ensemble
+        # {产物: {"file", "size", "mtime_ns", "sha256"}}, 见 loader.source_record
+        self.sources = sources
+
+    @classmethod
+    def from_artifacts(cls, prediction_type, model_info):
+        """由已加载的 {"model", "scaler_X", "scaler_y"} 构建"""
+        x_scale, x_offset = scaler_params(model_info["scaler_X"])
+        y_scale, y_offset = scaler_params(model_info["scaler_y"])
+        ensemble = ensemble_from_model(model_info["model"])
+        return cls(prediction_type, ensemble.fold(x_scale, x_offset, float(y_scale[0]),
+                                                  float(y_offset[0])))
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != len(self.input_order):
+            raise ValueError(f"{self.prediction_type} 需要 {len(self.input_order)} 列输入, "
+                             f"实际形状为 {X.shape}")
+
+        output = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), EVAL_CHUNK_SIZE):
+            stop = start + EVAL_CHUNK_SIZE
+            output[start:stop] = self.ensemble.predict(X[start:stop])
+        return np.maximum(output, 0)  # 确保预测值为正
+
+    def save(self, path):
+        np.savez(path, format_version=np.array(FUSED_FORMAT_VERSION),
+                 prediction_type=np.array(self.prediction_type),
+                 kind=np.array(self.ensemble.kind),
+                 sources=np.array(json.dumps(self.sources or {})), **self.ensemble.to_arrays())
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            version = int(arrays["format_version"])
+            if version != FUSED_FORMAT_VERSION:
+                raise ValueError(f"不支持的融合模型版本: {version}")
+            ensemble = ENSEMBLE_KINDS[str(arrays["kind"])].from_arrays(arrays)
+            sources = json.loads(str(arrays["sources"])) if "sources" in arrays else None
+            return cls(str(arrays["prediction_type"]), ensemble, sources)
+
+
+def fused_path(prediction_type, base_dir=BASE_DIR):
+    return os.path.join(base_dir, FUSED_FILE_PATTERN.format(prediction_type))
+
+
+def fused_signature(prediction_type, base_dir=BASE_DIR):
+    """融合模型文件的 (修改时间, 大小)"""
+    try:
+        stat = os.stat(fused_path(prediction_type, base_dir))
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def stale_reason(fused_model, base_dir=BASE_DIR):
+    """融合模型与当前原始产物不一致时返回说明, 一致时返回 None"""
+    if fused_model.sources is None:
+        return "没有记录来源产物"
+    stale = stale_sources(fused_model.sources, fused_model.prediction_type, base_dir)
+    if stale:
+        return f"来源产物 {', '.join(stale)} 已更新"
+    return None
+
+
+def load_fused(prediction_type, base_dir=BASE_DIR):
+    """加载已导出的融合模型, 文件过期 (原始产物已更新) 时报错而不是继续使用旧模型"""
+    path = fused_path(prediction_type, base_dir)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"未找到 {prediction_type} 的融合模型: {path}, "
+                                f"请先运行 python fused.py 导出")
+    fused_model = FusedModel.load(path)
+    reason = stale_reason(fused_model, base_dir)
+    if reason is not None:
+        raise ValueError(f"融合模型 {path} 已过期 ({reason}), 请重新运行 python fused.py 导出")
+    return fused_model
+
+
+def usable_fused(prediction_type, base_dir=BASE_DIR):
+    """存在且未过期的融合模型路径, 否则返回 None"""
+    path = fused_path(prediction_type, base_dir)
+    try:
+        return path if stale_reason(FusedModel.load(path), base_dir) is None else None
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def sample_inputs(prediction_type, n_samples, seed=0):
+    """在 PARAMETER_RANGES 内均匀采样, 并附上 PARAMETERS_CONFIG 中的默认值"""
+    rng = np.random.default_rng(seed)
+    input_order = INPUT_ORDER[prediction_type]
+    low = np.array([PARAMETER_RANGES[key][0] for key in input_order])
+    high = np.array([PARAMETER_RANGES[key][1] for key in input_order])
+    defaults = default_values(prediction_type)
+    default_row = np.array([[defaults[key] for key in input_order]])
+    return np.vstack([default_row, rng.uniform(low, high, size=(n_samples, len(input_order)))])
+
+
+def check_parity(fused_model, model_info, n_samples=10000, atol=1e-6, seed=0):
+    """与原始三步预测对比, 返回 (最大绝对误差, 超出 atol 的行比例)"""
+    from predictor import predict_array
+
+    X = sample_inputs(fused_model.prediction_type, n_samples, seed)
+    expected = predict_array(model_info, X)
+    error = np.abs(fused_model.predict(X) - expected)
+    return float(error.max()), float(np.mean(error > atol))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="导出融合模型并与原始预测流程做一致性校验")
+    parser.add_argument("prediction_types", nargs="*", metavar="prediction_type",
+                        help=f"默认导出全部: {', '.join(PREDICTION_TYPES)}")
+    parser.add_argument("--model-dir", default=BASE_DIR, help="原始模型和scaler所在目录")
+    parser.add_argument("--output-dir", default=None, help="融合模型输出目录, 默认与模型目录相同")
+    parser.add_argument("--check-samples", type=int, default=10000)
+    parser.add_argument("--atol", type=float, default=1e-6)
+    parser.add_argument("--max-mismatch", type=float, default=0.0,
+                        help="允许超出 atol 的行比例")
+    args = parser.parse_args(argv)
+
+    prediction_types = args.prediction_types or PREDICTION_TYPES
+    unknown = [pred_type for pred_type in prediction_types if pred_type not in PREDICTION_TYPES]
+    if unknown:
+        parser.error(f"未知的预测类型: {', '.join(unknown)}")
+
+    output_dir = args.output_dir or args.model_dir
+    failed = False
+    for pred_type in prediction_types:
+        model_info = load_artifacts(pred_type, args.model_dir, use_bundle=False)
+        fused_model = FusedModel.from_artifacts(pred_type, model_info)
+        fused_model.sources = source_records(pred_type, args.model_dir)
+        max_error, mismatch = check_parity(fused_model, model_info, args.check_samples, args.atol)
+        print(f"{pred_type}: 最大误差 {max_error:.3e} g/L, 不一致比例 {mismatch:.4%}")
+
+        if mismatch > args.max_mismatch:
+            print(f"{pred_type} 一致性校验失败, 未导出", file=sys.stderr)
+            failed = True
+            continue
+
+        path = fused_path(pred_type, output_dir)
+        fused_model.save(path)
+        print(f"{pred_type} 融合模型已写入 {path}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
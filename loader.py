@@ -0,0 +1,262 @@
+"""模型与scaler的加载, 支持即时、按需和后台并行三种模式"""
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import PREDICTION_TYPES, MODEL_CONFIG
+from metrics import METRICS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 每个预测类型包含的三个产物
+ARTIFACT_KINDS = ("model", "scaler_X", "scaler_y")
+
+LOAD_MODES = ("eager", "lazy", "background")
+
+
+def load_model_file(model_file, model_type):
+    """按 model_type 加载模型文件, catboost/joblib 在此处才导入"""
+    if model_type == "catboost":
+        from catboost import CatBoostRegressor
+        model = CatBoostRegressor()
+        model.load_model(model_file)
+        return model
+
+    import joblib
+    return joblib.load(model_file)
+
+
+def load_scaler(scaler_file):
+    """加载 scaler 文件"""
+    import joblib
+    return joblib.load(scaler_file)
+
+
+def resolve_paths(prediction_type, base_dir=BASE_DIR):
+    """返回某预测类型三个产物文件的绝对路径"""
+    if prediction_type not in MODEL_CONFIG:
+        raise ValueError(f"未知的预测类型: {prediction_type}")
+
+    config = MODEL_CONFIG[prediction_type]
+    return {
+        "model": os.path.join(base_dir, config["model_file"]),
+        "scaler_X": os.path.join(base_dir, config["scaler_X_file"]),
+        "scaler_y": os.path.join(base_dir, config["scaler_y_file"]),
+    }
+
+
+# (路径, 修改时间, 大小) → SHA-256, 避免每次加载都重新计算未变化文件的哈希
+_sha256_cache = {}
+
+
+def file_sha256(path, stat=None):
+    stat = stat or os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    digest = _sha256_cache.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        digest = _sha256_cache[key] = sha.hexdigest()
+    return digest
+
+
+def source_record(path):
+    """原始产物的 {"file", "size", "mtime_ns", "sha256"}, 写入派生产物以便判断是否过期"""
+    stat = os.stat(path)
+    return {"file": os.path.basename(path), "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns, "sha256": file_sha256(path, stat)}
+
+
+def source_records(prediction_type, base_dir=BASE_DIR):
+    return {kind: source_record(path)
+            for kind, path in resolve_paths(prediction_type, base_dir).items()}
+
+
+def stale_sources(records, prediction_type, base_dir=BASE_DIR):
+    """与记录不一致的原始产物列表, 不存在的原始产物不计入
+
+    大小不同即视为已更新; 大小和修改时间都与记录相同时视为未变;
+    只有修改时间不同 (如 cp -p 还原的旧文件) 时再比较 SHA-256.
+    """
+    stale = []
+    paths = resolve_paths(prediction_type, base_dir)
+    for kind, record in records.items():
+        path = paths.get(kind)
+        try:
+            stat = os.stat(path)
+        except (OSError, TypeError):
+            continue
+        if "size" in record and stat.st_size != record["size"]:
+            stale.append(kind)
+        elif (stat.st_mtime_ns != record.get("mtime_ns")
+              and file_sha256(path, stat) != record.get("sha256")):
+            stale.append(kind)
+    return stale
+
+
+def load_artifact(prediction_type, kind, base_dir=BASE_DIR, use_bundle=True):
+    """加载单个产物文件; 存在与原始产物一致的模型包 (bundle.py) 时直接从模型包映射"""
+    if use_bundle:
+        from bundle import ModelBundle, usable_bundle
+        bundle_file = usable_bundle(prediction_type, base_dir)
+        if bundle_file is not None:
+            return ModelBundle(bundle_file).artifact(kind)
+
+    path = resolve_paths(prediction_type, base_dir)[kind]
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"未找到 {prediction_type} 的文件: {path}")
+    if kind == "model":
+        return load_model_file(path, MODEL_CONFIG[prediction_type]["model_type"])
+    return load_scaler(path)
+
+
+def artifact_signature(prediction_type, base_dir=BASE_DIR):
+    """三个产物文件和模型包的 (修改时间, 大小), 任一文件变化时签名随之变化"""
+    from bundle import bundle_path
+    signature = []
+    paths = list(resolve_paths(prediction_type, base_dir).values())
+    for path in paths + [bundle_path(prediction_type, base_dir)]:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def load_artifacts(prediction_type, base_dir=BASE_DIR, use_bundle=True):
+    """加载单个预测类型的模型和对应的scaler, use_bundle=False 时只读取原始产物"""
+    return {kind: load_artifact(prediction_type, kind, base_dir, use_bundle)
+            for kind in ARTIFACT_KINDS}
+
+
+class ModelLoader:
+    """按预测类型管理模型加载, 并记录每个产物的加载耗时
+
+    - eager: 构造时并行加载全部产物并等待完成
+    - lazy: 首次 get() 时才加载该预测类型的产物
+    - background: 构造时在线程池中并行加载, get() 只等待自身的产物
+    """
+
+    def __init__(self, prediction_types=None, base_dir=BASE_DIR, mode="lazy", max_workers=None):
+        if mode not in LOAD_MODES:
+            raise ValueError(f"未知的加载模式: {mode}")
+
+        self.prediction_types = list(prediction_types or PREDICTION_TYPES)
+        self.base_dir = base_dir
+        self.mode = mode
+        self.max_workers = max_workers or len(ARTIFACT_KINDS) * len(self.prediction_types)
+        self.load_times = {}
+        self.signatures = {}
+        self._models = {}
+        self._futures = {}
+        self._executor = None
+        self._lock = threading.Lock()
+
+        if mode in ("eager", "background"):
+            self.start()
+        if mode == "eager":
+            for pred_type in self.prediction_types:
+                self.get(pred_type)
+
+    def _timed_load(self, prediction_type, kind):
+        start = time.perf_counter()
+        artifact = load_artifact(prediction_type, kind, self.base_dir)
+        self.load_times[(prediction_type, kind)] = time.perf_counter() - start
+        if METRICS.enabled:
+            METRICS.observe("stage_seconds", self.load_times[(prediction_type, kind)],
+                            prediction_type=prediction_type, stage=f"load_{kind}")
+        return artifact
+
+    def _submit(self, prediction_type):
+        """提交某预测类型的加载任务 (需持有锁)"""
+        if prediction_type not in self._futures:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="model-loader")
+            self.signatures[prediction_type] = artifact_signature(prediction_type, self.base_dir)
+            self._futures[prediction_type] = {
+                kind: self._executor.submit(self._timed_load, prediction_type, kind)
+                for kind in ARTIFACT_KINDS
+            }
+        return self._futures[prediction_type]
+
+    def start(self):
+        """在后台线程池中提交所有预测类型的加载任务"""
+        with self._lock:
+            for pred_type in self.prediction_types:
+                self._submit(pred_type)
+
+    def get(self, prediction_type):
+        """返回某预测类型的 {"model", "scaler_X", "scaler_y"}, 必要时等待加载完成"""
+        model_info = self._models.get(prediction_type)
+        if model_info is not None:
+            return model_info
+
+        with self._lock:
+            futures = self._submit(prediction_type)
+        model_info = {kind: future.result() for kind, future in futures.items()}
+        with self._lock:
+            if self._futures.get(prediction_type) is futures:
+                self._models[prediction_type] = model_info
+        return model_info
+
+    def acquire(self, prediction_type):
+        """返回 (model_info, 签名, 版本号); ModelLoader 不区分版本, 版本号为 None"""
+        model_info = self.get(prediction_type)
+        return model_info, self.signature(prediction_type), None
+
+    def signature(self, prediction_type):
+        """返回已加载 (或正在加载) 的产物签名, 尚未开始加载时为 None"""
+        return self.signatures.get(prediction_type)
+
+    def reload(self, prediction_type):
+        """丢弃已加载的模型, 下次 get() 时重新从磁盘加载"""
+        with self._lock:
+            self._models.pop(prediction_type, None)
+            self._futures.pop(prediction_type, None)
+            self.signatures.pop(prediction_type, None)
+            if self.mode != "lazy":
+                self._submit(prediction_type)
+
+    def is_loaded(self, prediction_type):
+        """某预测类型是否已加载完成 (不阻塞)"""
+        if prediction_type in self._models:
+            return True
+        futures = self._futures.get(prediction_type)
+        return futures is not None and all(f.done() and f.exception() is None
+                                           for f in futures.values())
+
+    def pending(self):
+        """返回仍在后台加载中的预测类型"""
+        return [pred_type for pred_type, futures in self._futures.items()
+                if not all(f.done() for f in futures.values())]
+
+    def errors(self):
+        """返回已结束但加载失败的 {预测类型: 异常}"""
+        failed = {}
+        for pred_type, futures in self._futures.items():
+            for future in futures.values():
+                if future.done() and future.exception() is not None:
+                    failed[pred_type] = future.exception()
+                    break
+        return failed
+
+    def format_load_report(self):
+        """按产物列出加载耗时"""
+        lines = []
+        for pred_type in self.prediction_types:
+            for kind in ARTIFACT_KINDS:
+                seconds = self.load_times.get((pred_type, kind))
+                if seconds is not None:
+                    lines.append(f"{pred_type} {kind} 加载耗时 {seconds * 1000:.1f} ms")
+        return "\n".join(lines)
+
+    def shutdown(self, wait=False):
+        """关闭后台线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
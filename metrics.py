@@ -0,0 +1,206 @@
+"""预测路径的分阶段计时与指标导出 (Prometheus 文本、JSON 快照、定期日志)
+
+默认关闭; 关闭时各埋点只多一次 METRICS.enabled 判断. 开启后按预测类型记录:
+    stage_seconds       各阶段耗时直方图, stage 为 load_*/validate/scaler_X/model/scaler_y/predict/render
+    batch_rows          每次预测的行数直方图
+    predictions_total, out_of_range_total, invalid_inputs_total, cache_hits_total, cache_misses_total
+
+环境变量 ION_METRICS_LOG_INTERVAL=秒数 可在 GUI 等没有命令行参数的入口开启指标并定期输出日志.
+"""
+import bisect
+import json
+import os
+import threading
+
+METRICS_PREFIX = "ion_"
+METRICS_ENV = "ION_METRICS_LOG_INTERVAL"
+
+# 直方图桶上界: 耗时 (秒) 和批大小 (行)
+LATENCY_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_BUCKETS = (1, 4, 16, 64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+METRIC_HELP = {
+    "stage_seconds": "Time spent in each stage of the prediction path",
+    "batch_rows": "Rows per prediction call",
+    "predictions_total": "Predicted rows",
+    "out_of_range_total": "Predictions outside OUTPUT_CONCENTRATION_RANGES",
+    "invalid_inputs_total": "Input rows outside PARAMETER_RANGES",
+    "cache_hits_total": "Prediction cache hits",
+    "cache_misses_total": "Prediction cache misses",
+}
+
+
+class Histogram:
+    """固定桶的直方图, 记录一次只做一次二分查找"""
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """按桶估计分位数, 返回所在桶的上界 (落在最后一个桶时返回最大上界)"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.bounds[-1]
+
+    def snapshot(self):
+        cumulative = []
+        seen = 0
+        for count in self.counts[:-1]:
+            seen += count
+            cumulative.append(seen)
+        return {"count": self.count, "sum": self.sum,
+                "buckets": dict(zip((str(bound) for bound in self.bounds), cumulative)),
+                "p50": self.quantile(0.5), "p95": self.quantile(0.95)}
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Metrics:
+    """进程内的指标集合, 按 (指标名, 标签) 区分"""
+
+    def __init__(self):
+        self.enabled = False
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def snapshot(self):
+        """返回 {"histograms": [...], "counters": [...]}, 可直接写为 JSON"""
+        with self._lock:
+            histograms = [dict(histogram.snapshot(), name=name, labels=dict(labels))
+                          for (name, labels), histogram in sorted(self._histograms.items())]
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+        return {"histograms": histograms, "counters": counters}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False)
+
+    def to_prometheus(self):
+        """Prometheus 文本格式 (0.0.4)"""
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {METRICS_PREFIX}{name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {METRICS_PREFIX}{name} {kind}")
+
+        with self._lock:
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                describe(name, "histogram")
+                full_name = METRICS_PREFIX + name
+                seen = 0
+                for bound, count in zip(histogram.bounds, histogram.counts):
+                    seen += count
+                    lines.append(f"{full_name}_bucket{_format_labels(labels, [('le', bound)])} "
+                                 f"{seen}")
+                lines.append(f"{full_name}_bucket{_format_labels(labels, [('le', '+Inf')])} "
+                             f"{histogram.count}")
+                lines.append(f"{full_name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{full_name}_count{_format_labels(labels)} {histogram.count}")
+            for (name, labels), value in sorted(self._counters.items()):
+                describe(name, "counter")
+                lines.append(f"{METRICS_PREFIX}{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary_line(self):
+        """每个预测类型一段: 预测耗时分位数、行数、缓存命中率和超范围比例"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = dict(self._histograms)
+
+        parts = []
+        prediction_types = sorted({dict(labels).get("prediction_type")
+                                   for _, labels in list(counters) + list(histograms)} - {None})
+        for pred_type in prediction_types:
+            def count(name):
+                return counters.get((name, (("prediction_type", pred_type),)), 0)
+
+            predict = histograms.get(("stage_seconds", (("prediction_type", pred_type),
+                                                        ("stage", "predict"))))
+            rows = count("predictions_total")
+            lookups = count("cache_hits_total") + count("cache_misses_total")
+            part = f"{pred_type}: {rows} 行"
+            if predict is not None:
+                part += (f", 预测 p50≤{predict.quantile(0.5) * 1000:g}ms "
+                         f"p95≤{predict.quantile(0.95) * 1000:g}ms ({predict.count} 次)")
+            if lookups:
+                part += f", 缓存命中 {count('cache_hits_total') / lookups:.1%}"
+            if rows:
+                part += f", 超范围 {count('out_of_range_total') / rows:.1%}"
+            parts.append(part)
+        return " | ".join(parts) if parts else "暂无预测指标"
+
+
+METRICS = Metrics()
+
+
+def log_periodically(interval, log=print, metrics=METRICS):
+    """在后台线程中每隔 interval 秒输出一次 summary_line, 返回用于停止的 Event"""
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            log(f"预测指标: {metrics.summary_line()}")
+
+    threading.Thread(target=run, name="metrics-log", daemon=True).start()
+    return stop
+
+
+def enable_from_env(log=print):
+    """环境变量 ION_METRICS_LOG_INTERVAL 为正数时开启指标并定期输出日志"""
+    try:
+        interval = float(os.environ.get(METRICS_ENV, "0"))
+    except ValueError:
+        return None
+    if interval <= 0:
+        return None
+    METRICS.enable()
+    return log_periodically(interval, log)
@@ -0,0 +1,184 @@
+"""设定点优化: 固定阳极成分和进口浓度, 搜索操作参数使预测浓度落入 OUTPUT_CONCENTRATION_RANGES
+
+采用差分进化, 每一代的候选解一次性批量预测; 找到满足目标的解后立即停止.
+
+用法示例:
+    python optimizer.py OCC_W --set "Inlet Copper ion concentration=52.1"
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from config import (PREDICTION_TYPES, PARAMETER_RANGES, OUTPUT_CONCENTRATION_RANGES,
+                    INPUT_ORDER, default_values)
+from loader import BASE_DIR
+from predictor import BatchPredictor
+from sweep import base_row, parse_overrides
+
+# 默认可调的操作参数
+DECISION_PARAMS = ["Current Density", "Electrolyte_Time", "Number of Electrolysis Tanks"]
+
+DEFAULT_POPULATION = 64
+DEFAULT_MAX_EVALUATIONS = 20000
+
+
+def target_bounds(prediction_type, margin=0.0):
+    """目标浓度区间, margin 为向区间内收缩的比例, 用来避开边界"""
+    min_val, max_val = OUTPUT_CONCENTRATION_RANGES[prediction_type]
+    shrink = (max_val - min_val) * margin
+    return min_val + shrink, max_val - shrink
+
+
+def range_distance(predictions, low, high):
+    """预测值到目标区间的距离, 区间内为 0"""
+    return np.maximum(low - predictions, 0) + np.maximum(predictions - high, 0)
+
+
+class SetpointOptimizer:
+    """以差分进化搜索操作参数, 所有候选解都限制在 PARAMETER_RANGES 内"""
+
+    def __init__(self, predictor, prediction_type, decision_params=None,
+                 population=DEFAULT_POPULATION, max_evaluations=DEFAULT_MAX_EVALUATIONS,
+                 margin=0.05, mutation=0.7, crossover=0.9, patience=30, seed=None):
+        self.predictor = predictor
+        self.prediction_type = prediction_type
+        self.decision_params = list(decision_params or DECISION_PARAMS)
+        input_order = INPUT_ORDER[prediction_type]
+        unknown = [param for param in self.decision_params if param not in input_order]
+        if unknown:
+            raise ValueError(f"{prediction_type} 不使用参数: {', '.join(unknown)}")
+
+        self.columns = np.array([input_order.index(param) for param in self.decision_params])
+        self.low = np.array([PARAMETER_RANGES[param][0] for param in self.decision_params])
+        self.high = np.array([PARAMETER_RANGES[param][1] for param in self.decision_params])
+        self.population = max(4, population)
+        self.max_evaluations = max_evaluations
+        self.margin = margin
+        self.mutation = mutation
+        self.crossover = crossover
+        self.patience = patience
+        self.rng = np.random.default_rng(seed)
+
+    def _evaluate(self, row, candidates):
+        """把候选操作参数代入基准行, 一次性预测整批"""
+        matrix = np.repeat(row[None, :], len(candidates), axis=0)
+        matrix[:, self.columns] = candidates
+        return self.predictor.predict_matrix(matrix, self.prediction_type)
+
+    def _pick_closest(self, candidates, mask, start):
+        """在满足目标的候选解中选择相对当前设定点改动最小的一个"""
+        scaled = (candidates - start) / (self.high - self.low)
+        distance = np.where(mask, np.linalg.norm(scaled, axis=1), np.inf)
+        return int(np.argmin(distance))
+
+    def optimize(self, base_values):
+        """返回字典: success, values, inputs, prediction, n_evaluations, generations, distance"""
+        row = base_row(base_values, self.prediction_type)
+        low, high = target_bounds(self.prediction_type, self.margin)
+        start = np.clip(row[self.columns], self.low, self.high)
+        dims = len(self.columns)
+
+        # 初始种群: 当前设定点加上范围内的均匀采样
+        population = self.rng.uniform(self.low, self.high, size=(self.population, dims))
+        population[0] = start
+        predictions = self._evaluate(row, population)
+        fitness = range_distance(predictions, low, high)
+        evaluations = len(population)
+        generations = 0
+        best_fitness = fitness.min()
+        stalled = 0
+
+        # 找到目标、用完预测次数或连续 patience 代没有改进时停止
+        while (best_fitness > 0 and stalled < self.patience
+               and evaluations + self.population <= self.max_evaluations):
+            # DE/rand/1/bin: 每个个体取三个不同的其他个体生成变异向量
+            keys = self.rng.random((self.population, self.population))
+            np.fill_diagonal(keys, np.inf)
+            idx = np.argsort(keys, axis=1)[:, :3]
+            a, b, c = population[idx[:, 0]], population[idx[:, 1]], population[idx[:, 2]]
+            mutant = np.clip(a + self.mutation * (b - c), self.low, self.high)
+
+            cross = self.rng.random((self.population, dims)) < self.crossover
+            cross[np.arange(self.population), self.rng.integers(0, dims, self.population)] = True
+            trial = np.where(cross, mutant, population)
+
+            trial_predictions = self._evaluate(row, trial)
+            trial_fitness = range_distance(trial_predictions, low, high)
+            evaluations += len(trial)
+            generations += 1
+
+            improved = trial_fitness <= fitness
+            population[improved] = trial[improved]
+            predictions[improved] = trial_predictions[improved]
+            fitness[improved] = trial_fitness[improved]
+
+            if fitness.min() < best_fitness:
+                best_fitness = fitness.min()
+                stalled = 0
+            else:
+                stalled += 1
+
+        success = bool((fitness == 0).any())
+        if success:
+            best = self._pick_closest(population, fitness == 0, start)
+        else:
+            best = int(np.argmin(fitness))
+        values = dict(zip(self.decision_params, population[best].tolist()))
+        inputs = dict(zip(INPUT_ORDER[self.prediction_type], row.tolist()))
+        inputs.update(values)
+        return {
+            "success": success,
+            "values": values,
+            "inputs": inputs,
+            "prediction": float(predictions[best]),
+            "target_range": (low, high),
+            "distance": float(fitness[best]),
+            "n_evaluations": evaluations,
+            "generations": generations,
+        }
+
+
+def optimize_setpoint(predictor, prediction_type, base_values, **kwargs):
+    """便捷函数, 参数同 SetpointOptimizer"""
+    return SetpointOptimizer(predictor, prediction_type, **kwargs).optimize(base_values)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="搜索使预测浓度落入最佳范围的操作参数")
+    parser.add_argument("prediction_type", choices=PREDICTION_TYPES)
+    parser.add_argument("--set", action="append", metavar="NAME=VALUE",
+                        help="覆盖默认的固定参数值, 可重复")
+    parser.add_argument("--params", nargs="+", default=DECISION_PARAMS,
+                        help="可调的操作参数")
+    parser.add_argument("--population", type=int, default=DEFAULT_POPULATION)
+    parser.add_argument("--max-evaluations", type=int, default=DEFAULT_MAX_EVALUATIONS)
+    parser.add_argument("--margin", type=float, default=0.05,
+                        help="目标区间向内收缩的比例, 避免解落在边界上")
+    parser.add_argument("--patience", type=int, default=30,
+                        help="连续多少代没有改进时提前停止")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--model-dir", default=BASE_DIR, help="模型和scaler所在目录")
+    parser.add_argument("--fused", action="store_true", help="使用 fused.py 导出的融合模型")
+    args = parser.parse_args(argv)
+
+    base_values = default_values(args.prediction_type)
+    base_values.update(parse_overrides(args.set))
+    predictor = BatchPredictor([args.prediction_type], args.model_dir, fused=args.fused)
+    result = optimize_setpoint(predictor, args.prediction_type, base_values,
+                               decision_params=args.params, population=args.population,
+                               max_evaluations=args.max_evaluations, margin=args.margin,
+                               patience=args.patience, seed=args.seed)
+
+    low, high = result["target_range"]
+    status = "已找到" if result["success"] else "未找到"
+    print(f"{status}满足目标 {low:.3f} – {high:.3f} g/L 的设定点 "
+          f"({result['n_evaluations']} 次预测, {result['generations']} 代)")
+    for param, value in result["values"].items():
+        print(f"  {param}: {value:.4f}")
+    print(f"  预测浓度: {result['prediction']:.3f} g/L")
+    return 0 if result["success"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,361 @@
+"""不依赖 Tk 界面的批量预测引擎
+
+用法示例:
+    python predictor.py OAC_W plant_data.csv -o predictions.csv --chunk-size 50000
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from cache import PredictionCache
+from config import PREDICTION_TYPES, INPUT_ORDER, ALL_TARGETS, COMBINED_INPUT_ORDER
+from fused import load_fused, fused_signature
+from loader import BASE_DIR, ModelLoader
+from metrics import METRICS, BATCH_BUCKETS
+from uncertainty import (CONVERGENCE, DEFAULT_LEVEL, UNCERTAINTY_KEYS, interval_method,
+                         load_residuals, model_ensemble, predict_with_uncertainty, residuals_path)
+from validation import output_in_range
+
+# 每个分块的默认行数
+DEFAULT_CHUNK_SIZE = 65536
+
+
+def read_table(path):
+    """读取 CSV 或 Parquet 文件为 DataFrame"""
+    try:
+        import pandas as pd
+    except ImportError as e:
+        raise ImportError("读取 CSV/Parquet 文件需要安装 pandas") from e
+
+    ext = os.path.splitext(str(path))[1].lower()
+    if ext in (".parquet", ".pq"):
+        return pd.read_parquet(path)
+    if ext in (".csv", ".txt"):
+        return pd.read_csv(path)
+    raise ValueError(f"不支持的文件格式: {path}")
+
+
+def write_table(frame, path):
+    """按扩展名把 DataFrame 写为 CSV 或 Parquet"""
+    ext = os.path.splitext(str(path))[1].lower()
+    if ext in (".parquet", ".pq"):
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_csv(path, index=False)
+
+
+def columns_to_matrix(data, input_order, name):
+    """将数组、DataFrame、字典或文件路径按给定列顺序映射为 N×F 矩阵"""
+    if isinstance(data, (str, os.PathLike)):
+        data = read_table(data)
+
+    if hasattr(data, "columns"):
+        missing = [key for key in input_order if key not in data.columns]
+        if missing:
+            raise ValueError(f"{name} 缺少输入列: {', '.join(missing)}")
+        matrix = data[input_order].to_numpy(dtype=np.float64)
+    elif isinstance(data, dict):
+        missing = [key for key in input_order if key not in data]
+        if missing:
+            raise ValueError(f"{name} 缺少输入列: {', '.join(missing)}")
+        matrix = np.column_stack([np.asarray(data[key], dtype=np.float64).reshape(-1)
+                                  for key in input_order])
+    else:
+        matrix = np.asarray(data, dtype=np.float64)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+
+    if matrix.ndim != 2 or matrix.shape[1] != len(input_order):
+        raise ValueError(f"{name} 需要 {len(input_order)} 列输入, 实际形状为 {matrix.shape}")
+    return np.ascontiguousarray(matrix)
+
+
+def to_feature_matrix(data, prediction_type):
+    """将数组、DataFrame、字典或文件路径按 INPUT_ORDER 映射为 N×F 矩阵"""
+    return columns_to_matrix(data, INPUT_ORDER[prediction_type], prediction_type)
+
+
+def predict_array(model_info, input_array, timings=None):
+    """对 N×F 矩阵执行 scaler_X → model → scaler_y 三步预测
+
+    timings 为字典时, 把三步的耗时 (秒) 分别累加到 "scaler_X"、"model"、"scaler_y"
+    """
+    if timings is not None:
+        return _timed_predict_array(model_info, input_array, timings)
+
+    normalized_input = model_info["scaler_X"].transform(input_array)
+    normalized_prediction = np.asarray(model_info["model"].predict(normalized_input),
+                                       dtype=np.float64)
+    prediction = model_info["scaler_y"].inverse_transform(normalized_prediction.reshape(-1, 1))
+    return np.maximum(prediction.ravel(), 0)  # 确保预测值为正
+
+
+def _timed_predict_array(model_info, input_array, timings):
+    """与 predict_array 相同, 同时记录各步耗时"""
+    start = time.perf_counter()
+    normalized_input = model_info["scaler_X"].transform(input_array)
+    model_start = time.perf_counter()
+    normalized_prediction = np.asarray(model_info["model"].predict(normalized_input),
+                                       dtype=np.float64)
+    inverse_start = time.perf_counter()
+    prediction = model_info["scaler_y"].inverse_transform(normalized_prediction.reshape(-1, 1))
+    end = time.perf_counter()
+    for stage, seconds in (("scaler_X", model_start - start), ("model", inverse_start - model_start),
+                           ("scaler_y", end - inverse_start)):
+        timings[stage] = timings.get(stage, 0.0) + seconds
+    return np.maximum(prediction.ravel(), 0)
+
+
+class BatchPredictor:
+    """向量化的批量预测器
+
+    fused=True 时使用 fused.py 导出的融合模型, 运行时不加载 catboost/sklearn;
+    cache 为 PredictionCache 时, 重复输入直接返回缓存结果
+    """
+
+    def __init__(self, prediction_types=None, base_dir=BASE_DIR, chunk_size=DEFAULT_CHUNK_SIZE,
+                 loader=None, load_mode="lazy", fused=False, cache=None):
+        self.base_dir = base_dir
+        self.chunk_size = chunk_size
+        self.fused = fused
+        self.cache = cache
+        self.loader = loader or ModelLoader(prediction_types, base_dir,
+                                            mode="lazy" if fused else load_mode)
+        self._fused_models = {}
+        self._residuals = {}
+
+    def get_model(self, prediction_type):
+        """获取某预测类型的模型和scaler, 未加载时等待其加载完成"""
+        return self.loader.get(prediction_type)
+
+    def get_fused_model(self, prediction_type):
+        """获取某预测类型的融合模型"""
+        if prediction_type not in self._fused_models:
+            signature = fused_signature(prediction_type, self.base_dir)
+            self._fused_models[prediction_type] = (load_fused(prediction_type, self.base_dir),
+                                                   signature)
+        return self._fused_models[prediction_type][0]
+
+    def get_residuals(self, prediction_type, signature):
+        """与当前产物一致的残差校准 (见 uncertainty.py), 校准文件或产物签名变化时重新读取"""
+        try:
+            stat = os.stat(residuals_path(prediction_type, self.base_dir))
+            key = (stat.st_mtime_ns, stat.st_size, signature)
+        except OSError:
+            return None
+        cached = self._residuals.get(prediction_type)
+        if cached is None or cached[0] != key:
+            cached = self._residuals[prediction_type] = (
+                key, load_residuals(prediction_type, self.base_dir))
+        return cached[1]
+
+    def predict(self, data, prediction_type, chunk_size=None):
+        """分块预测, 返回长度为 N 的一维数组 (g/L)"""
+        matrix = to_feature_matrix(data, prediction_type)
+        return self.predict_matrix(matrix, prediction_type, chunk_size)
+
+    def predict_matrix(self, matrix, prediction_type, chunk_size=None):
+        """对已按 INPUT_ORDER 排列的矩阵分块预测"""
+        return self.predict_versioned(matrix, prediction_type, chunk_size)[0]
+
+    def predict_versioned(self, matrix, prediction_type, chunk_size=None):
+        """返回 (预测值, 模型版本号), 整批使用同一版本的模型
+
+        版本号由 ModelRegistry 提供, 使用 ModelLoader 或融合模型时为 None
+        """
+        started = time.perf_counter() if METRICS.enabled else None
+        timings = {} if started is not None else None
+        if self.fused:
+            predict_chunk = self.get_fused_model(prediction_type).predict
+            signature = self._fused_models[prediction_type][1]
+            version = None
+        else:
+            model_info, signature, version = self.loader.acquire(prediction_type)
+            predict_chunk = partial(predict_array, model_info, timings=timings)
+
+        compute = partial(self._predict_chunks, predict_chunk=predict_chunk,
+                          chunk_size=chunk_size)
+        if self.cache is not None:
+            predictions = self.cache.predict(matrix, prediction_type, compute, signature)
+        else:
+            predictions = compute(matrix)
+        if started is not None:
+            self._record_metrics(prediction_type, predictions, timings,
+                                 time.perf_counter() - started)
+        return predictions, version
+
+    def predict_uncertainty(self, matrix, prediction_type, level=DEFAULT_LEVEL):
+        """返回 (结果字典, 模型版本号), 结果含 prediction、lower、upper、std、prob_in_range
+        和区间来源 method
+
+        区间和概率与点预测在同一次树集成遍历中计算, 有残差校准时使用经验预测区间,
+        见 uncertainty.py; 有预测缓存时整个结果按相同的键和产物签名缓存, 只对未命中的行计算
+        """
+        started = time.perf_counter() if METRICS.enabled else None
+        if self.fused:
+            ensemble = self.get_fused_model(prediction_type).ensemble
+            signature = self._fused_models[prediction_type][1]
+            residuals = self.get_residuals(prediction_type, signature)
+            compute = partial(predict_with_uncertainty, None, prediction_type=prediction_type,
+                              level=level, folded=ensemble, residuals=residuals)
+            version = None
+        else:
+            model_info, signature, version = self.loader.acquire(prediction_type)
+            ensemble = model_ensemble(model_info["model"])
+            residuals = self.get_residuals(prediction_type, signature)
+            compute = partial(predict_with_uncertainty, model_info,
+                              prediction_type=prediction_type, level=level, residuals=residuals)
+
+        if self.cache is not None:
+            def compute_columns(rows):
+                result = compute(X=rows)
+                return np.column_stack([result[key] for key in UNCERTAINTY_KEYS])
+
+            method = interval_method(ensemble, residuals)
+            columns = self.cache.predict(matrix, prediction_type, compute_columns, signature,
+                                         kind=("uncertainty", level, method))
+            columns = columns.reshape(-1, len(UNCERTAINTY_KEYS))
+            result = dict(zip(UNCERTAINTY_KEYS, columns.T), level=level, method=method)
+        else:
+            result = compute(X=matrix)
+        if started is not None:
+            self._record_metrics(prediction_type, result["prediction"], {},
+                                 time.perf_counter() - started)
+        return result, version
+
+    def _record_metrics(self, prediction_type, predictions, timings, elapsed):
+        """记录一次预测的分阶段耗时、行数和超范围数 (仅在开启指标时调用)"""
+        METRICS.observe("stage_seconds", elapsed, prediction_type=prediction_type,
+                        stage="predict")
+        for stage, seconds in timings.items():
+            METRICS.observe("stage_seconds", seconds, prediction_type=prediction_type,
+                            stage=stage)
+        METRICS.observe("batch_rows", len(predictions), BATCH_BUCKETS,
+                        prediction_type=prediction_type)
+        METRICS.increment("predictions_total", len(predictions), prediction_type=prediction_type)
+        METRICS.increment("out_of_range_total",
+                          int(len(predictions) - output_in_range(predictions,
+                                                                 prediction_type).sum()),
+                          prediction_type=prediction_type)
+
+    def artifact_signature(self, prediction_type):
+        """当前所用模型的产物签名, 用于缓存失效判断"""
+        if self.fused:
+            self.get_fused_model(prediction_type)
+            return self._fused_models[prediction_type][1]
+        self.get_model(prediction_type)
+        return self.loader.signature(prediction_type)
+
+    def _predict_chunks(self, matrix, predict_chunk, chunk_size=None):
+        chunk_size = max(1, int(chunk_size or self.chunk_size))
+        output = np.empty(len(matrix), dtype=np.float64)
+        for start in range(0, len(matrix), chunk_size):
+            stop = start + chunk_size
+            output[start:stop] = predict_chunk(matrix[start:stop])
+        return output
+
+
+class MultiTargetPredictor:
+    """一次输入全部特征 (COMBINED_INPUT_ORDER), 在线程池中并行预测各预测类型"""
+
+    def __init__(self, predictor=None, prediction_types=None, max_workers=None):
+        self.prediction_types = list(prediction_types or PREDICTION_TYPES)
+        self.predictor = predictor or BatchPredictor(self.prediction_types)
+        # 预先计算每个预测类型在并集中的列下标
+        self.columns = {pred_type: np.array([COMBINED_INPUT_ORDER.index(key)
+                                             for key in INPUT_ORDER[pred_type]])
+                        for pred_type in self.prediction_types}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or len(self.prediction_types),
+                                            thread_name_prefix="multi-target")
+
+    def predict(self, data, chunk_size=None):
+        """返回 {预测类型: 长度为 N 的一维数组}"""
+        matrix = columns_to_matrix(data, COMBINED_INPUT_ORDER, ALL_TARGETS)
+        return self.predict_matrix(matrix, chunk_size)
+
+    def predict_matrix(self, matrix, chunk_size=None):
+        """对已按 COMBINED_INPUT_ORDER 排列的矩阵预测全部类型"""
+        futures = {pred_type: self._executor.submit(
+                       self.predictor.predict_matrix,
+                       np.ascontiguousarray(matrix[:, self.columns[pred_type]]),
+                       pred_type, chunk_size)
+                   for pred_type in self.prediction_types}
+        return {pred_type: future.result() for pred_type, future in futures.items()}
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量预测电解液出口离子浓度")
+    parser.add_argument("prediction_type", choices=PREDICTION_TYPES + [ALL_TARGETS],
+                        help=f"{ALL_TARGETS} 表示同时预测全部类型")
+    parser.add_argument("input", help="输入 CSV/Parquet 文件, 列名与 INPUT_ORDER 一致")
+    parser.add_argument("-o", "--output", help="输出文件 (CSV/Parquet), 默认输出到标准输出")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--model-dir", default=BASE_DIR, help="模型和scaler所在目录")
+    parser.add_argument("--fused", action="store_true", help="使用 fused.py 导出的融合模型")
+    parser.add_argument("--cache-size", type=int, default=0,
+                        help="按输入向量缓存预测结果, 重复行只计算一次 (0 表示关闭)")
+    parser.add_argument("--verbose", action="store_true", help="输出每个产物的加载耗时")
+    parser.add_argument("--interval", type=float, metavar="LEVEL",
+                        help="同时输出该置信水平 (如 0.9) 的预测区间和落入最佳范围的概率")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="导出分阶段耗时等指标: .prom 为 Prometheus 文本, 其他为 JSON")
+    args = parser.parse_args(argv)
+    if args.interval is not None and not 0 < args.interval < 1:
+        parser.error("--interval 需在 0 到 1 之间")
+    if args.interval and args.prediction_type == ALL_TARGETS:
+        parser.error(f"--interval 不支持 {ALL_TARGETS}")
+
+    if args.metrics:
+        METRICS.enable()
+    frame = read_table(args.input)
+    cache = PredictionCache(args.cache_size) if args.cache_size > 0 else None
+    prediction_types = (PREDICTION_TYPES if args.prediction_type == ALL_TARGETS
+                        else [args.prediction_type])
+    predictor = BatchPredictor(prediction_types, args.model_dir, args.chunk_size,
+                               fused=args.fused, cache=cache)
+    if args.prediction_type == ALL_TARGETS:
+        multi_predictor = MultiTargetPredictor(predictor)
+        for pred_type, values in multi_predictor.predict(frame).items():
+            frame[pred_type] = values
+        multi_predictor.shutdown()
+    elif args.interval:
+        result, _ = predictor.predict_uncertainty(to_feature_matrix(frame, args.prediction_type),
+                                                  args.prediction_type, args.interval)
+        frame[args.prediction_type] = result["prediction"]
+        for key in ("lower", "upper", "prob_in_range"):
+            frame[f"{args.prediction_type}_{key}"] = result[key]
+        if result["method"] == CONVERGENCE:
+            print(f"{args.prediction_type} 没有残差校准, 区间只是模型的收敛幅度而非预测区间,"
+                  f" 可运行 python uncertainty.py {args.prediction_type} <留出数据> 生成校准",
+                  file=sys.stderr)
+    else:
+        frame[args.prediction_type] = predictor.predict(frame, args.prediction_type)
+    if args.verbose:
+        print(predictor.loader.format_load_report(), file=sys.stderr)
+        if cache is not None:
+            print(f"缓存统计: {cache.stats()}", file=sys.stderr)
+
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            f.write(METRICS.to_prometheus() if args.metrics.endswith(".prom")
+                    else METRICS.to_json())
+        print(f"预测指标: {METRICS.summary_line()}", file=sys.stderr)
+
+    if args.output:
+        write_table(frame, args.output)
+        print(f"{len(frame)} 行预测结果已写入 {args.output}", file=sys.stderr)
+    else:
+        frame.to_csv(sys.stdout, index=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
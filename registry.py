@@ -0,0 +1,276 @@
+"""模型注册表: 监视产物目录, 后台加载新版本, 试预测通过后按预测类型原子切换
+
+切换只替换当前版本的引用, 正在进行的预测继续使用它已取得的旧版本直到完成.
+每个预测类型最多保留 keep_versions 个已加载版本, 用于回滚.
+
+可直接替代 ModelLoader 传给 BatchPredictor:
+    registry = ModelRegistry(poll_interval=2.0)
+    predictor = BatchPredictor(loader=registry)
+    predictions, version = predictor.predict_versioned(matrix, "OCC_W")
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from config import PREDICTION_TYPES, INPUT_ORDER, default_values
+from loader import BASE_DIR, ARTIFACT_KINDS, artifact_signature, load_artifact
+from metrics import METRICS
+from predictor import predict_array
+
+DEFAULT_POLL_INTERVAL = 2.0
+DEFAULT_KEEP_VERSIONS = 3
+
+
+class ModelVersion:
+    """某预测类型的一个已加载版本, 版本号按加载顺序递增"""
+
+    def __init__(self, prediction_type, version, model_info, signature, load_time,
+                 warmup_prediction, artifact_times=None):
+        self.prediction_type = prediction_type
+        self.version = version
+        self.model_info = model_info
+        self.signature = signature
+        self.load_time = load_time
+        # {产物: 加载耗时 (秒)}, load_time 另含试预测的时间
+        self.artifact_times = artifact_times or {}
+        self.warmup_prediction = warmup_prediction
+        self.loaded_at = time.time()
+
+    @property
+    def cache_key(self):
+        """用作 PredictionCache 的签名, 回滚到旧版本时缓存同样失效"""
+        return self.version, self.signature
+
+    def format_artifact_times(self):
+        """各产物的加载耗时, 如 model 7.2 ms, scaler_X 0.4 ms, scaler_y 0.3 ms"""
+        return ", ".join(f"{kind} {seconds * 1000:.1f} ms"
+                         for kind, seconds in self.artifact_times.items())
+
+    def describe(self):
+        return {"version": self.version, "loaded_at": self.loaded_at,
+                "load_time_s": self.load_time,
+                "artifact_load_times_s": dict(self.artifact_times),
+                "warmup_prediction": self.warmup_prediction}
+
+
+def warm_up(prediction_type, model_info):
+    """用 PARAMETERS_CONFIG 中的默认输入试预测, 结果不是有限值时拒绝该版本"""
+    defaults = default_values(prediction_type)
+    row = np.array([[defaults[key] for key in INPUT_ORDER[prediction_type]]], dtype=np.float64)
+    prediction = predict_array(model_info, row)
+    if prediction.shape != (1,) or not np.isfinite(prediction).all():
+        raise ValueError(f"{prediction_type} 新版本试预测结果无效: {prediction}")
+    return float(prediction[0])
+
+
+class ModelRegistry:
+    """按预测类型管理模型版本, 接口与 ModelLoader 兼容
+
+    watch=True 时后台线程每隔 poll_interval 秒检查产物签名 (artifact_signature),
+    连续两次检查结果一致 (文件已写完) 后加载新版本. 加载或试预测失败时保留当前版本.
+    on_swap(旧版本, 新版本) 在切换后于加载线程中调用. 与 ModelLoader 一样,
+    load_times 记录最近一次加载中每个产物的耗时 {(预测类型, 产物): 秒}.
+    """
+
+    def __init__(self, prediction_types=None, base_dir=BASE_DIR,
+                 poll_interval=DEFAULT_POLL_INTERVAL, keep_versions=DEFAULT_KEEP_VERSIONS,
+                 watch=True, on_swap=None):
+        self.prediction_types = list(prediction_types or PREDICTION_TYPES)
+        self.base_dir = base_dir
+        self.poll_interval = poll_interval
+        self.on_swap = on_swap
+        self.load_times = {}
+        self._versions = {pred_type: deque(maxlen=max(1, keep_versions))
+                          for pred_type in self.prediction_types}
+        self._active = {}
+        self._next_version = {pred_type: 1 for pred_type in self.prediction_types}
+        self._seen = {}
+        self._candidates = {}
+        self._loading = {}
+        self._errors = {}
+        self._ready = {pred_type: threading.Event() for pred_type in self.prediction_types}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=len(self.prediction_types),
+                                            thread_name_prefix="model-registry")
+
+        with self._lock:
+            for pred_type in self.prediction_types:
+                self._submit(pred_type, artifact_signature(pred_type, base_dir))
+        self._watcher = None
+        if watch:
+            self._watcher = threading.Thread(target=self._watch, name="model-watcher",
+                                             daemon=True)
+            self._watcher.start()
+
+    def _check_type(self, prediction_type):
+        if prediction_type not in self._ready:
+            raise ValueError(f"注册表未管理该预测类型: {prediction_type}")
+
+    def _submit(self, prediction_type, signature):
+        """提交某预测类型的加载任务 (需持有锁)"""
+        self._seen[prediction_type] = signature
+        self._loading[prediction_type] = self._executor.submit(self._load, prediction_type,
+                                                               signature)
+
+    def _load(self, prediction_type, signature):
+        start = time.perf_counter()
+        model_info = {}
+        artifact_times = {}
+        try:
+            for kind in ARTIFACT_KINDS:
+                kind_start = time.perf_counter()
+                model_info[kind] = load_artifact(prediction_type, kind, self.base_dir)
+                artifact_times[kind] = time.perf_counter() - kind_start
+            warmup_prediction = warm_up(prediction_type, model_info)
+        except Exception as e:
+            with self._lock:
+                self._errors[prediction_type] = e
+            self._ready[prediction_type].set()
+            raise
+
+        load_time = time.perf_counter() - start
+        if METRICS.enabled:
+            METRICS.observe("stage_seconds", load_time, prediction_type=prediction_type,
+                            stage="load")
+            for kind, seconds in artifact_times.items():
+                METRICS.observe("stage_seconds", seconds, prediction_type=prediction_type,
+                                stage=f"load_{kind}")
+        with self._lock:
+            version = ModelVersion(prediction_type, self._next_version[prediction_type],
+                                   model_info, signature, load_time, warmup_prediction,
+                                   artifact_times)
+            self.load_times.update({(prediction_type, kind): seconds
+                                    for kind, seconds in artifact_times.items()})
+            self._next_version[prediction_type] += 1
+            previous = self._active.get(prediction_type)
+            self._versions[prediction_type].append(version)
+            self._active[prediction_type] = version
+            self._errors.pop(prediction_type, None)
+        self._ready[prediction_type].set()
+        if previous is not None and self.on_swap is not None:
+            self.on_swap(previous, version)
+        return version
+
+    def check(self):
+        """检查一次产物签名, 返回本次开始加载的预测类型"""
+        started = []
+        for pred_type in self.prediction_types:
+            signature = artifact_signature(pred_type, self.base_dir)
+            with self._lock:
+                loading = self._loading.get(pred_type)
+                if signature == self._seen.get(pred_type) or (loading and not loading.done()):
+                    self._candidates.pop(pred_type, None)
+                    continue
+                # 文件可能仍在写入, 连续两次看到同一签名才加载
+                if self._candidates.get(pred_type) != signature:
+                    self._candidates[pred_type] = signature
+                    continue
+                del self._candidates[pred_type]
+                self._submit(pred_type, signature)
+            started.append(pred_type)
+        return started
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"模型目录检查失败: {str(e)}")
+
+    def active(self, prediction_type):
+        """返回某预测类型当前使用的 ModelVersion, 首次加载未完成时等待"""
+        self._check_type(prediction_type)
+        self._ready[prediction_type].wait()
+        version = self._active.get(prediction_type)
+        if version is None:
+            raise self._errors[prediction_type]
+        return version
+
+    def get(self, prediction_type):
+        """返回当前版本的 {"model", "scaler_X", "scaler_y"}"""
+        return self.active(prediction_type).model_info
+
+    def acquire(self, prediction_type):
+        """返回同一版本的 (model_info, 签名, 版本号), 供整批预测使用"""
+        version = self.active(prediction_type)
+        return version.model_info, version.cache_key, version.version
+
+    def signature(self, prediction_type):
+        version = self._active.get(prediction_type)
+        return version.cache_key if version is not None else None
+
+    def versions(self, prediction_type):
+        """返回保留的版本, 按版本号从旧到新"""
+        self._check_type(prediction_type)
+        with self._lock:
+            return list(self._versions[prediction_type])
+
+    def rollback(self, prediction_type, version=None):
+        """切换到保留的旧版本, 默认为当前版本之前的一个; 产物文件再次变化前不会自动切回"""
+        self._check_type(prediction_type)
+        with self._lock:
+            current = self._active.get(prediction_type)
+            history = list(self._versions[prediction_type])
+            if version is None:
+                older = [v for v in history if current is None or v.version < current.version]
+                target = older[-1] if older else None
+            else:
+                target = next((v for v in history if v.version == version), None)
+            if target is None:
+                raise ValueError(f"{prediction_type} 没有可回滚的版本")
+            self._active[prediction_type] = target
+        if current is not None and self.on_swap is not None:
+            self.on_swap(current, target)
+        return target
+
+    def reload(self, prediction_type):
+        """立即从磁盘加载新版本, 不等待签名变化"""
+        self._check_type(prediction_type)
+        with self._lock:
+            self._submit(prediction_type, artifact_signature(prediction_type, self.base_dir))
+        return self._loading[prediction_type]
+
+    def is_loaded(self, prediction_type):
+        return prediction_type in self._active
+
+    def pending(self):
+        """返回正在加载新版本的预测类型"""
+        return [pred_type for pred_type, future in self._loading.items() if not future.done()]
+
+    def errors(self):
+        """返回最近一次加载失败的 {预测类型: 异常}, 之后加载成功时清除"""
+        with self._lock:
+            return dict(self._errors)
+
+    def describe(self):
+        """返回 {预测类型: {"active": 版本号, "versions": [...]}}"""
+        with self._lock:
+            return {pred_type: {"active": (self._active[pred_type].version
+                                           if pred_type in self._active else None),
+                                "versions": [v.describe() for v in self._versions[pred_type]]}
+                    for pred_type in self.prediction_types}
+
+    def format_load_report(self):
+        """按产物列出当前版本的加载耗时, 以及含试预测在内的总耗时"""
+        lines = []
+        for pred_type in self.prediction_types:
+            version = self._active.get(pred_type)
+            if version is None:
+                continue
+            for kind in ARTIFACT_KINDS:
+                seconds = version.artifact_times.get(kind)
+                if seconds is not None:
+                    lines.append(f"{pred_type} v{version.version} {kind} 加载耗时 "
+                                 f"{seconds * 1000:.1f} ms")
+            lines.append(f"{pred_type} v{version.version} 合计 (含试预测) "
+                         f"{version.load_time * 1000:.1f} ms")
+        return "\n".join(lines)
+
+    def shutdown(self, wait=False):
+        """停止监视线程并关闭加载线程池"""
+        self._stop.set()
+        self._executor.shutdown(wait=wait)
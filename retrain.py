@@ -0,0 +1,284 @@
+"""用新的化验数据增量更新模型: CatBoost 在现有模型上继续训练, OCC_W 的 AdaBoost 在有界样本上重新拟合
+
+新数据按块流式读取 (列为 INPUT_ORDER 加目标列, 目标列名默认为预测类型), 超出
+PARAMETER_RANGES 的行被丢弃. 训练集和留出集各自用蓄水池抽样保持固定上限, 内存占用与
+输入文件大小无关. scaler 的处理:
+    CatBoost  scaler_X/scaler_y 保持不变, 继续训练的树与原有的树工作在同一归一化空间
+    AdaBoost  在原 MinMaxScaler 的范围上用 partial_fit 扩展到新数据, 再重新拟合模型
+候选模型在留出集上的 RMSE (g/L) 不劣于当前模型 (允许 tolerance 的相对误差) 时,
+按 MODEL_CONFIG 的文件名写出新产物、留出集残差校准 residuals_<类型>.json (预测区间用)
+和 retrain_<类型>.json 报告.
+
+用法示例:
+    python retrain.py OCC_D new_lab.csv -o retrained/ --iterations 200 --time-limit 60
+    python retrain.py OCC_W new_lab.csv --holdout lab_holdout.csv -o . --replay-rows 5000
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from config import PREDICTION_TYPES, MODEL_CONFIG, INPUT_ORDER
+from fused import fused_path, sample_inputs
+from loader import BASE_DIR, load_artifacts, resolve_paths
+from predictor import read_table, columns_to_matrix, predict_array
+from uncertainty import residuals_path, write_residuals
+from validation import REJECT, validate_inputs
+
+DEFAULT_CHUNK_ROWS = 50000
+DEFAULT_MAX_ROWS = 200000
+DEFAULT_MAX_HOLDOUT_ROWS = 20000
+DEFAULT_HOLDOUT_FRACTION = 0.2
+DEFAULT_ITERATIONS = 200
+MIN_HOLDOUT_ROWS = 20
+
+
+class Reservoir:
+    """固定容量的蓄水池抽样 (Algorithm R), 按块批量加入, 每行被保留的概率相同"""
+
+    def __init__(self, capacity, n_columns, seed=0):
+        self.capacity = int(capacity)
+        self.rows = np.empty((self.capacity, n_columns), dtype=np.float64)
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+
+    def add(self, rows):
+        filled = min(self.seen, self.capacity)
+        take = min(len(rows), self.capacity - filled)
+        self.rows[filled:filled + take] = rows[:take]
+        rest = rows[take:]
+        if len(rest):
+            # 第 i 行 (从 0 计) 以 capacity/(i+1) 的概率替换随机一行
+            slots = self.rng.integers(0, self.seen + take + np.arange(1, len(rest) + 1))
+            keep = slots < self.capacity
+            self.rows[slots[keep]] = rest[keep]
+        self.seen += len(rows)
+
+    def sample(self):
+        return self.rows[:min(self.seen, self.capacity)]
+
+
+def labelled_chunks(path, prediction_type, target=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """按块读取带标签的数据, 产出 (X, y); CSV 真正流式读取, 其他格式整表读入后分块"""
+    columns = INPUT_ORDER[prediction_type] + [target or prediction_type]
+    if str(path).lower().endswith((".csv", ".txt")):
+        import pandas as pd
+        frames = pd.read_csv(path, usecols=columns, chunksize=chunk_rows)
+    else:
+        frame = read_table(path)
+        frames = (frame.iloc[start:start + chunk_rows]
+                  for start in range(0, len(frame), chunk_rows))
+    for frame in frames:
+        matrix = columns_to_matrix(frame, columns, prediction_type)
+        yield matrix[:, :-1], matrix[:, -1]
+
+
+class _Deadline:
+    """CatBoost 回调: 超过截止时间后停止继续训练"""
+
+    def __init__(self, seconds):
+        self.deadline = time.monotonic() + seconds
+
+    def after_iteration(self, info):
+        return time.monotonic() < self.deadline
+
+
+def collect(prediction_type, data, holdout=None, target=None, max_rows=DEFAULT_MAX_ROWS,
+            max_holdout_rows=DEFAULT_MAX_HOLDOUT_ROWS, holdout_fraction=DEFAULT_HOLDOUT_FRACTION,
+            chunk_rows=DEFAULT_CHUNK_ROWS, seed=0):
+    """流式读取新数据, 返回 (训练样本, 留出样本, 统计); 样本为最后一列是目标值的矩阵
+
+    没有单独的留出文件时, 每行以 holdout_fraction 的概率划入留出集
+    """
+    n_columns = len(INPUT_ORDER[prediction_type]) + 1
+    rng = np.random.default_rng(seed)
+    train = Reservoir(max_rows, n_columns, seed + 1)
+    held = Reservoir(max_holdout_rows, n_columns, seed + 2)
+    stats = {"rows": 0, "dropped_rows": 0}
+
+    def valid_rows(X, y):
+        keep = validate_inputs(X, prediction_type, REJECT).valid_rows & np.isfinite(y)
+        stats["rows"] += len(y)
+        stats["dropped_rows"] += int(len(y) - keep.sum())
+        return np.column_stack([X[keep], y[keep]])
+
+    for X, y in labelled_chunks(data, prediction_type, target, chunk_rows):
+        rows = valid_rows(X, y)
+        if holdout is None:
+            to_holdout = rng.random(len(rows)) < holdout_fraction
+            held.add(rows[to_holdout])
+            rows = rows[~to_holdout]
+        train.add(rows)
+    if holdout is not None:
+        for X, y in labelled_chunks(holdout, prediction_type, target, chunk_rows):
+            held.add(valid_rows(X, y))
+
+    stats.update(train_rows_seen=train.seen, holdout_rows_seen=held.seen)
+    return train.sample(), held.sample(), stats
+
+
+def rmse(model_info, X, y):
+    return float(np.sqrt(np.mean((predict_array(model_info, X) - y) ** 2)))
+
+
+def fit_candidate(prediction_type, model_info, X, y, iterations=DEFAULT_ITERATIONS,
+                  time_limit=None, thread_count=-1):
+    """由当前产物和训练样本得到候选 {"model", "scaler_X", "scaler_y"}"""
+    model = model_info["model"]
+    name = type(model).__name__
+    if name.startswith("CatBoost"):
+        from catboost import CatBoostRegressor
+
+        scaler_X, scaler_y = model_info["scaler_X"], model_info["scaler_y"]
+        params = dict(model.get_params(), iterations=iterations, thread_count=thread_count,
+                      verbose=False, allow_writing_files=False)
+        candidate = CatBoostRegressor(**params)
+        candidate.fit(scaler_X.transform(X), scaler_y.transform(y.reshape(-1, 1)).ravel(),
+                      init_model=model,
+                      callbacks=[_Deadline(time_limit)] if time_limit else None)
+        return {"model": candidate, "scaler_X": scaler_X, "scaler_y": scaler_y}
+
+    if name == "AdaBoostRegressor":
+        from sklearn.base import clone
+
+        scaler_X = copy.deepcopy(model_info["scaler_X"]).partial_fit(X)
+        scaler_y = copy.deepcopy(model_info["scaler_y"]).partial_fit(y.reshape(-1, 1))
+        candidate = clone(model)
+        candidate.fit(scaler_X.transform(X), scaler_y.transform(y.reshape(-1, 1)).ravel())
+        return {"model": candidate, "scaler_X": scaler_X, "scaler_y": scaler_y}
+    raise TypeError(f"不支持增量训练的模型类型: {name}")
+
+
+def write_artifacts(prediction_type, model_info, output_dir):
+    """按 MODEL_CONFIG 的文件名写出三个产物, 先写临时文件再替换; 模型最后写入"""
+    import joblib
+
+    os.makedirs(output_dir, exist_ok=True)
+    paths = resolve_paths(prediction_type, output_dir)
+    for kind in ("scaler_X", "scaler_y", "model"):
+        tmp_path = f"{paths[kind]}.tmp"
+        if kind == "model" and MODEL_CONFIG[prediction_type]["model_type"] == "catboost":
+            model_info[kind].save_model(tmp_path)
+        else:
+            joblib.dump(model_info[kind], tmp_path)
+        os.replace(tmp_path, paths[kind])
+    return paths
+
+
+def retrain(prediction_type, data, base_dir=BASE_DIR, output_dir=None, holdout=None,
+            target=None, max_rows=DEFAULT_MAX_ROWS, max_holdout_rows=DEFAULT_MAX_HOLDOUT_ROWS,
+            holdout_fraction=DEFAULT_HOLDOUT_FRACTION, iterations=DEFAULT_ITERATIONS,
+            time_limit=None, tolerance=0.0, replay_rows=0, thread_count=-1, seed=0,
+            log=print):
+    """读取新数据、训练候选模型并在留出集上与当前模型比较, 返回报告字典
+
+    replay_rows > 0 时在 PARAMETER_RANGES 内采样这么多行并以当前模型的预测为标签加入
+    训练样本, 减少只用新数据重新拟合时对原有工况的遗忘. 候选通过校验且给出 output_dir
+    时写出新产物. AdaBoost 是从头重新拟合, 不回放时会遗忘原有工况, 此时拒绝写出产物.
+    """
+    started = time.perf_counter()
+    model_info = load_artifacts(prediction_type, base_dir, use_bundle=False)
+    if (output_dir is not None and replay_rows <= 0
+            and type(model_info["model"]).__name__ == "AdaBoostRegressor"):
+        raise ValueError(f"{prediction_type} 的 AdaBoost 只用新数据重新拟合会遗忘原有工况, "
+                         f"写出产物时需指定 replay_rows > 0")
+    train, held, stats = collect(prediction_type, data, holdout, target, max_rows,
+                                 max_holdout_rows, holdout_fraction, seed=seed)
+    if len(train) == 0:
+        raise ValueError(f"{prediction_type} 没有可用于训练的新数据")
+    if len(held) < MIN_HOLDOUT_ROWS:
+        raise ValueError(f"{prediction_type} 留出集只有 {len(held)} 行, "
+                         f"至少需要 {MIN_HOLDOUT_ROWS} 行才能校验候选模型")
+
+    X, y = train[:, :-1], train[:, -1]
+    if replay_rows > 0:
+        X_replay = sample_inputs(prediction_type, replay_rows, seed)
+        X = np.vstack([X, X_replay])
+        y = np.concatenate([y, predict_array(model_info, X_replay)])
+    log(f"{prediction_type}: 读取 {stats['rows']} 行 (丢弃 {stats['dropped_rows']} 行), "
+        f"训练样本 {len(X)} 行, 留出集 {len(held)} 行")
+
+    fit_started = time.perf_counter()
+    candidate = fit_candidate(prediction_type, model_info, X, y, iterations, time_limit,
+                              thread_count)
+    fit_time = time.perf_counter() - fit_started
+
+    X_held, y_held = held[:, :-1], held[:, -1]
+    current_rmse = rmse(model_info, X_held, y_held)
+    candidate_rmse = rmse(candidate, X_held, y_held)
+    accepted = candidate_rmse <= current_rmse * (1.0 + tolerance)
+    report = dict(stats, prediction_type=prediction_type, train_rows=len(X),
+                  replay_rows=replay_rows, holdout_rows=len(held),
+                  current_rmse=current_rmse, candidate_rmse=candidate_rmse,
+                  tolerance=tolerance, accepted=bool(accepted), fit_time_s=fit_time,
+                  model=type(candidate["model"]).__name__, written=False,
+                  timestamp=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    if hasattr(candidate["model"], "tree_count_"):
+        report.update(tree_count=candidate["model"].tree_count_,
+                      previous_tree_count=model_info["model"].tree_count_)
+    log(f"{prediction_type}: 留出集 RMSE 当前 {current_rmse:.4f} g/L, "
+        f"候选 {candidate_rmse:.4f} g/L -> {'通过' if accepted else '未通过'}")
+
+    if accepted and output_dir is not None:
+        report["artifacts"] = {kind: os.path.basename(path) for kind, path
+                               in write_artifacts(prediction_type, candidate, output_dir).items()}
+        report["written"] = True
+        # 留出集未参与训练, 其残差作为新模型的经验预测区间 (uncertainty.py)
+        calibration = write_residuals(prediction_type,
+                                      y_held - predict_array(candidate, X_held), output_dir)
+        report["residual_calibration"] = os.path.basename(
+            residuals_path(prediction_type, output_dir))
+        report["residual_rows"] = calibration["rows"]
+        with open(os.path.join(output_dir, f"retrain_{prediction_type}.json"), "w",
+                  encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        log(f"{prediction_type}: 新产物已写入 {output_dir}")
+        if os.path.exists(fused_path(prediction_type, output_dir)):
+            log(f"{prediction_type}: 融合模型已过期, 使用 --fused 前请重新运行 python fused.py")
+    report["total_time_s"] = time.perf_counter() - started
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="用新的化验数据增量更新模型并在留出集上校验")
+    parser.add_argument("prediction_type", choices=PREDICTION_TYPES)
+    parser.add_argument("data", help="带标签的新数据 (CSV/Parquet), 列为 INPUT_ORDER 加目标列")
+    parser.add_argument("-o", "--output-dir",
+                        help="候选通过时写出新产物的目录, 不指定时只评估; 指定为模型目录时"
+                             "运行中的 --watch 服务会自动切换")
+    parser.add_argument("--holdout", help="单独的留出集文件, 默认从新数据中随机划出")
+    parser.add_argument("--target", help="目标列名, 默认与预测类型相同")
+    parser.add_argument("--holdout-fraction", type=float, default=DEFAULT_HOLDOUT_FRACTION)
+    parser.add_argument("--max-rows", type=int, default=DEFAULT_MAX_ROWS,
+                        help="训练样本上限 (蓄水池抽样), 决定内存占用和训练耗时")
+    parser.add_argument("--max-holdout-rows", type=int, default=DEFAULT_MAX_HOLDOUT_ROWS)
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS,
+                        help="CatBoost 继续训练的迭代次数")
+    parser.add_argument("--time-limit", type=float, help="CatBoost 继续训练的最长秒数")
+    parser.add_argument("--threads", type=int, default=-1, help="CatBoost 训练线程数")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="允许候选模型留出集 RMSE 比当前模型高的相对比例")
+    parser.add_argument("--replay-rows", type=int, default=0,
+                        help="以当前模型预测为标签的范围内采样行数, 与新数据一起训练; "
+                             "AdaBoost 指定 -o 时必须大于 0")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--model-dir", default=BASE_DIR, help="当前模型和scaler所在目录")
+    args = parser.parse_args(argv)
+    if not 0 < args.holdout_fraction < 1:
+        parser.error("--holdout-fraction 需在 0 到 1 之间")
+
+    report = retrain(args.prediction_type, args.data, args.model_dir, args.output_dir,
+                     args.holdout, args.target, args.max_rows, args.max_holdout_rows,
+                     args.holdout_fraction, args.iterations, args.time_limit, args.tolerance,
+                     args.replay_rows, args.threads, args.seed,
+                     log=lambda message: print(message, file=sys.stderr))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0 if report["accepted"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
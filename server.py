@@ -0,0 +1,344 @@
+"""基于 asyncio 的本地 HTTP/JSON 预测服务, 并发的单行请求会合并为批量模型调用
+
+启动:
+    python server.py --port 8765 --max-batch-size 256 --max-wait-ms 5
+
+请求:
+    POST /predict  {"prediction_type": "OAC_W", "inputs": {"Electrolyte_Time": 164, ...}}
+    inputs 也可以是多行组成的列表, 此时返回 {"results": [...]}
+    加上 "interval": 0.9 时结果另含该置信水平的 interval (g/L)、prob_in_range 和
+    interval_method (residual/ensemble/convergence, 见 uncertainty.py), 这类请求整批
+    直接预测, 不经过微批合并
+    GET /health, GET /stats
+    GET /metrics   Prometheus 文本格式的分阶段耗时等指标 (--metrics 开启时记录)
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from cache import PredictionCache
+from config import PREDICTION_TYPES, INPUT_ORDER
+from loader import BASE_DIR, ModelLoader
+from metrics import METRICS, log_periodically
+from predictor import BatchPredictor
+from registry import DEFAULT_POLL_INTERVAL, ModelRegistry
+from validation import REJECT, validate_inputs, output_in_range, output_range
+
+DEFAULT_MAX_BATCH_SIZE = 256
+DEFAULT_MAX_WAIT_MS = 5.0
+
+# 请求体上限, 防止异常客户端占满内存
+MAX_BODY_BYTES = 8 * 1024 * 1024
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                413: "Payload Too Large", 422: "Unprocessable Entity",
+                500: "Internal Server Error"}
+
+
+class RequestError(Exception):
+    """可直接返回给客户端的请求错误"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class MicroBatcher:
+    """在 max_wait_ms 的时间窗内收集单行请求, 攒够 max_batch_size 或超时后一次性预测"""
+
+    def __init__(self, predictor, prediction_type, executor,
+                 max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.predictor = predictor
+        self.prediction_type = prediction_type
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.rows = 0
+        self.max_seen_batch = 0
+        self._pending = []
+        self._timer = None
+
+    async def submit(self, row):
+        """提交一行 (按 INPUT_ORDER 排列), 返回 (预测值, 模型版本号)"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((row, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch):
+        rows, futures = zip(*batch)
+        matrix = np.asarray(rows, dtype=np.float64)
+        loop = asyncio.get_running_loop()
+        try:
+            predictions, version = await loop.run_in_executor(
+                self.executor, self.predictor.predict_versioned, matrix, self.prediction_type)
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.rows += len(batch)
+        self.max_seen_batch = max(self.max_seen_batch, len(batch))
+        for future, value in zip(futures, predictions.tolist()):
+            if not future.done():
+                future.set_result((value, version))
+
+    def stats(self):
+        return {"batches": self.batches, "rows": self.rows,
+                "max_batch_size": self.max_seen_batch,
+                "mean_batch_size": self.rows / self.batches if self.batches else 0.0}
+
+
+def parse_row(inputs, prediction_type):
+    """把一行 JSON 输入按 INPUT_ORDER 转为浮点列表"""
+    if not isinstance(inputs, dict):
+        raise RequestError(400, "inputs 中的每一行必须是 {参数名: 数值} 对象")
+    input_order = INPUT_ORDER[prediction_type]
+    missing = [key for key in input_order if key not in inputs]
+    if missing:
+        raise RequestError(400, f"{prediction_type} 缺少输入参数: {', '.join(missing)}")
+    try:
+        return [float(inputs[key]) for key in input_order]
+    except (TypeError, ValueError):
+        raise RequestError(400, "输入参数必须为数值")
+
+
+class PredictionServer:
+    """本地预测服务: 每个预测类型一个 MicroBatcher, 模型推理在线程池中执行"""
+
+    def __init__(self, predictor, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS, workers=len(PREDICTION_TYPES)):
+        self.predictor = predictor
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="predict")
+        self.batchers = {pred_type: MicroBatcher(predictor, pred_type, self.executor,
+                                                 max_batch_size, max_wait_ms)
+                         for pred_type in PREDICTION_TYPES}
+        self.started = time.time()
+
+    async def predict(self, payload):
+        if not isinstance(payload, dict):
+            raise RequestError(400, "请求体必须是 JSON 对象")
+        prediction_type = payload.get("prediction_type")
+        if prediction_type not in self.batchers:
+            raise RequestError(400, f"未知的预测类型: {prediction_type}")
+
+        inputs = payload.get("inputs")
+        single = isinstance(inputs, dict)
+        if not single and not isinstance(inputs, list):
+            raise RequestError(400, "inputs 必须是对象或对象列表")
+        rows = [parse_row(item, prediction_type) for item in ([inputs] if single else inputs)]
+        if not rows:
+            raise RequestError(400, "inputs 不能为空")
+
+        level = payload.get("interval")
+        if level is not None and (isinstance(level, bool) or not isinstance(level, (int, float))
+                                  or not 0 < level < 1):
+            raise RequestError(400, "interval 必须是 0 到 1 之间的置信水平")
+
+        validation = validate_inputs(rows, prediction_type, REJECT)
+
+        valid_index = np.flatnonzero(validation.valid_rows)
+        uncertainty = None
+        if level is not None and len(valid_index):
+            uncertainty, version = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.predictor.predict_uncertainty,
+                validation.matrix[valid_index], prediction_type, level)
+            predictions = uncertainty["prediction"]
+            outputs = [(None, version)] * len(valid_index)
+        else:
+            batcher = self.batchers[prediction_type]
+            outputs = await asyncio.gather(*(batcher.submit(rows[i]) for i in valid_index))
+            predictions = np.asarray([value for value, _ in outputs], dtype=np.float64)
+        in_range = output_in_range(predictions, prediction_type)
+        optimal_range = output_range(prediction_type)
+
+        results = [None] * len(rows)
+        for i, value, ok, (_, version) in zip(valid_index, predictions.tolist(),
+                                              in_range.tolist(), outputs):
+            results[i] = {"prediction": value, "unit": "g/L", "in_range": ok,
+                          "optimal_range": optimal_range, "model_version": version}
+        if uncertainty is not None:
+            for j, i in enumerate(valid_index):
+                results[i].update(interval=[float(uncertainty["lower"][j]),
+                                            float(uncertainty["upper"][j])],
+                                  interval_level=level,
+                                  interval_method=uncertainty["method"],
+                                  prob_in_range=float(uncertainty["prob_in_range"][j]))
+        for i in np.flatnonzero(~validation.valid_rows):
+            results[i] = {"error": "参数值不在允许范围内",
+                          "invalid_parameters": validation.describe_row(i)}
+
+        if single:
+            status = 422 if validation.invalid[0] else 200
+            return status, dict(results[0], prediction_type=prediction_type)
+        return 200, {"prediction_type": prediction_type, "results": results}
+
+    def stats(self):
+        stats = {"uptime_s": time.time() - self.started,
+                 "batchers": {pred_type: batcher.stats()
+                              for pred_type, batcher in self.batchers.items()}}
+        if self.predictor.cache is not None:
+            stats["cache"] = self.predictor.cache.stats()
+        return stats
+
+    def health(self):
+        loader = self.predictor.loader
+        health = {"status": "ok",
+                  "loaded": {pred_type: loader.is_loaded(pred_type)
+                             for pred_type in PREDICTION_TYPES},
+                  "errors": {pred_type: str(e) for pred_type, e in loader.errors().items()}}
+        # ModelLoader 和 ModelRegistry 都按产物记录最近一次加载耗时
+        load_times = {}
+        for (pred_type, kind), seconds in dict(getattr(loader, "load_times", {})).items():
+            load_times.setdefault(pred_type, {})[kind] = seconds * 1000
+        health["load_times_ms"] = load_times
+        if isinstance(loader, ModelRegistry):
+            health["versions"] = loader.describe()
+        return health
+
+    async def dispatch(self, method, path, body):
+        if path == "/predict":
+            if method != "POST":
+                raise RequestError(405, "请使用 POST")
+            try:
+                payload = json.loads(body or b"null")
+            except ValueError:
+                raise RequestError(400, "请求体不是合法的 JSON")
+            return await self.predict(payload)
+        if path == "/health" and method == "GET":
+            return 200, self.health()
+        if path == "/stats" and method == "GET":
+            return 200, self.stats()
+        if path == "/metrics" and method == "GET":
+            return 200, METRICS.to_prometheus()
+        raise RequestError(404, f"未知路径: {path}")
+
+    async def handle_connection(self, reader, writer):
+        """处理一个 HTTP/1.1 连接, 支持 keep-alive"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length", 0))
+                    if length > MAX_BODY_BYTES:
+                        raise RequestError(413, "请求体过大")
+                    body = await reader.readexactly(length) if length else b""
+                    status, response = await self.dispatch(method.upper(), target.split("?")[0],
+                                                           body)
+                except RequestError as e:
+                    status, response = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, response = 500, {"error": f"预测失败: {str(e)}"}
+
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and version.upper() == "HTTP/1.1")
+                if isinstance(response, str):
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                    payload = response.encode("utf-8")
+                else:
+                    content_type = "application/json; charset=utf-8"
+                    payload = json.dumps(response, ensure_ascii=False).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                    .encode("latin-1") + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"预测服务已启动: http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地电解液离子浓度预测服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS,
+                        help="合并请求的最长等待时间 (毫秒)")
+    parser.add_argument("--model-dir", default=BASE_DIR, help="模型和scaler所在目录")
+    parser.add_argument("--fused", action="store_true", help="使用 fused.py 导出的融合模型")
+    parser.add_argument("--cache-size", type=int, default=0, help="预测缓存大小 (0 表示关闭)")
+    parser.add_argument("--watch", action="store_true",
+                        help="监视模型目录, 产物更新后不停机切换到新版本")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help="--watch 时检查模型目录的间隔 (秒)")
+    parser.add_argument("--metrics", action="store_true",
+                        help="记录分阶段耗时、批大小、缓存命中和超范围比例, 由 GET /metrics 导出")
+    parser.add_argument("--metrics-log-interval", type=float, default=0,
+                        help="每隔多少秒输出一行指标摘要 (0 表示不输出)")
+    args = parser.parse_args(argv)
+    if args.watch and args.fused:
+        parser.error("--watch 不支持融合模型")
+    if args.metrics or args.metrics_log_interval > 0:
+        METRICS.enable()
+    if args.metrics_log_interval > 0:
+        log_periodically(args.metrics_log_interval)
+
+    if args.watch:
+        loader = ModelRegistry(base_dir=args.model_dir, poll_interval=args.poll_interval,
+                               on_swap=lambda old, new: print(
+                                   f"{new.prediction_type} 已切换到 v{new.version} "
+                                   f"(原 v{old.version}; {new.format_artifact_times()})"))
+    else:
+        loader = ModelLoader(base_dir=args.model_dir,
+                             mode="lazy" if args.fused else "background")
+    cache = PredictionCache(args.cache_size) if args.cache_size > 0 else None
+    predictor = BatchPredictor(base_dir=args.model_dir, loader=loader, fused=args.fused,
+                               cache=cache)
+    server = PredictionServer(predictor, args.max_batch_size, args.max_wait_ms)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,537 @@
+"""流式预测: 持续读取追加写入的 CSV/JSON-lines 文件或本地 socket, 按微批预测并输出告警
+
+数据流: 数据源 (生成器) → 解析 → 有界队列 → 微批 → 向量化范围检查 + 预测 → 输出
+队列满时读取线程阻塞, 不再读取文件或 socket (背压), 内存占用与运行时长无关.
+
+用法示例:
+    python stream.py OCC_W --follow plant_feed.jsonl -o predictions.jsonl
+    python stream.py OAC_W --listen 127.0.0.1:9100 --alerts alerts.jsonl
+"""
+import argparse
+import csv
+import json
+import os
+import queue
+import select
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+from config import PREDICTION_TYPES, INPUT_ORDER
+from loader import BASE_DIR
+from metrics import METRICS, log_periodically
+from predictor import BatchPredictor
+from registry import ModelRegistry
+from validation import POLICIES, REJECT, validate_inputs, output_in_range, output_range
+
+DEFAULT_MAX_BATCH_SIZE = 256
+DEFAULT_MAX_WAIT_MS = 50.0
+DEFAULT_QUEUE_SIZE = 4096
+POLL_INTERVAL = 0.2
+READ_SIZE = 65536
+
+# 单行上限, 超长的行截断后按解析失败处理
+MAX_LINE_BYTES = 64 * 1024
+
+# 随预测结果原样输出的记录字段
+META_FIELDS = ("id", "timestamp")
+
+# 吞吐量按最近若干秒统计, 延迟按最近若干条记录统计
+THROUGHPUT_WINDOW_S = 10.0
+LAG_WINDOW = 4096
+
+_EOF = object()
+
+
+class LineBuffer:
+    """把字节流切分为文本行, 未结束的行最多保留 MAX_LINE_BYTES"""
+
+    def __init__(self, max_line_bytes=MAX_LINE_BYTES):
+        self.max_line_bytes = max_line_bytes
+        self._buffer = bytearray()
+        self._skipping = False
+
+    def feed(self, data):
+        lines = []
+        start = 0
+        while True:
+            end = data.find(b"\n", start)
+            if end < 0:
+                break
+            if self._skipping:
+                self._skipping = False
+            else:
+                self._buffer += data[start:end]
+                lines.append(self._buffer.decode("utf-8", "replace"))
+            self._buffer = bytearray()
+            start = end + 1
+
+        if not self._skipping:
+            self._buffer += data[start:]
+            if len(self._buffer) > self.max_line_bytes:
+                # 超长行: 截断部分交给解析阶段报错, 其余内容丢弃到下一个换行
+                lines.append(self._buffer[:self.max_line_bytes].decode("utf-8", "replace"))
+                self._buffer = bytearray()
+                self._skipping = True
+        return lines
+
+    def flush(self):
+        """返回末尾未以换行结束的内容"""
+        rest = b"" if self._skipping else bytes(self._buffer)
+        self._buffer = bytearray()
+        self._skipping = False
+        return rest.decode("utf-8", "replace") if rest.strip() else None
+
+
+def tail_lines(path, follow=True, from_end=False, poll_interval=POLL_INTERVAL, stop=None):
+    """逐行读取文件, follow=True 时持续等待新追加的内容 (类似 tail -F)
+
+    暂无新数据时产出 None 作为心跳; 文件被截断或轮转时从新文件开头继续读取.
+    """
+    buffer = LineBuffer()
+    handle = None
+    try:
+        while stop is None or not stop.is_set():
+            if handle is None:
+                try:
+                    handle = open(path, "rb")
+                except FileNotFoundError:
+                    if not follow:
+                        raise
+                    yield None
+                    time.sleep(poll_interval)
+                    continue
+                if from_end:
+                    handle.seek(0, os.SEEK_END)
+                    from_end = False
+
+            data = handle.read(READ_SIZE)
+            if data:
+                yield from buffer.feed(data)
+                continue
+
+            if not follow:
+                rest = buffer.flush()
+                if rest is not None:
+                    yield rest
+                return
+
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                stat = None
+            if (stat is None or stat.st_ino != os.fstat(handle.fileno()).st_ino
+                    or stat.st_size < handle.tell()):
+                handle.close()
+                handle = None
+                buffer.flush()
+                continue
+            yield None
+            time.sleep(poll_interval)
+    finally:
+        if handle is not None:
+            handle.close()
+
+
+def socket_lines(host, port, poll_interval=POLL_INTERVAL, stop=None, on_listen=None):
+    """监听本地 TCP 端口, 逐行读取所有客户端发送的记录
+
+    暂无新数据时产出 None 作为心跳. 下游阻塞时本生成器不会被推进,
+    socket 不再被读取, 客户端随之被 TCP 流控限速.
+    """
+    server = socket.create_server((host, port))
+    server.setblocking(False)
+    if on_listen is not None:
+        on_listen(server.getsockname())
+    clients = {}
+    try:
+        while stop is None or not stop.is_set():
+            readable, _, _ = select.select([server, *clients], [], [], poll_interval)
+            if not readable:
+                yield None
+                continue
+            for sock in readable:
+                if sock is server:
+                    try:
+                        conn, _ = server.accept()
+                    except BlockingIOError:
+                        continue
+                    conn.setblocking(False)
+                    clients[conn] = LineBuffer()
+                    continue
+                try:
+                    data = sock.recv(READ_SIZE)
+                except BlockingIOError:
+                    continue
+                except ConnectionError:
+                    data = b""
+                if data:
+                    yield from clients[sock].feed(data)
+                else:
+                    rest = clients.pop(sock).flush()
+                    sock.close()
+                    if rest is not None:
+                        yield rest
+    finally:
+        for sock in clients:
+            sock.close()
+        server.close()
+
+
+def event_time(value):
+    """把记录中的 timestamp (Unix 秒或 ISO 8601) 转为 Unix 秒, 无法识别时返回 None"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+def parse_records(lines, prediction_type):
+    """把文本行解析为 (行向量, 元数据, 接收时间, 错误信息)
+
+    以 "{" 开头的行按 JSON 对象解析, 其余按 CSV 解析; CSV 的首行若包含
+    INPUT_ORDER 中的全部列名则作为表头, 否则按 INPUT_ORDER 的顺序读取.
+    心跳 (None) 原样传递.
+    """
+    input_order = INPUT_ORDER[prediction_type]
+    header = None
+    for line in lines:
+        if line is None:
+            yield None
+            continue
+        line = line.strip()
+        if not line:
+            continue
+
+        received = time.time()
+        try:
+            if line.startswith("{"):
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("JSON 记录必须是对象")
+            else:
+                fields = next(csv.reader([line]))
+                if header is None and all(key in fields for key in input_order):
+                    header = [field.strip() for field in fields]
+                    continue
+                if header is not None:
+                    record = dict(zip(header, fields))
+                elif len(fields) == len(input_order):
+                    record = dict(zip(input_order, fields))
+                else:
+                    raise ValueError(f"需要 {len(input_order)} 列输入, 实际为 {len(fields)}")
+
+            meta = {key: record[key] for key in META_FIELDS if key in record}
+            missing = [key for key in input_order if key not in record]
+            if missing:
+                yield None, meta, received, f"缺少输入参数: {', '.join(missing)}"
+                continue
+            try:
+                row = [float(record[key]) for key in input_order]
+            except (TypeError, ValueError):
+                yield None, meta, received, "输入参数必须为数值"
+                continue
+            yield row, meta, received, None
+        except (ValueError, csv.Error) as e:
+            yield None, {}, received, f"无法解析记录: {str(e)}"
+
+
+class JsonLinesSink:
+    """把每条结果写为一行 JSON, 每个微批结束后刷新"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, record):
+        self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def flush(self):
+        self.stream.flush()
+
+
+class StreamMetrics:
+    """流式预测的计数器、滑动窗口吞吐量和延迟, 所有窗口都有上限"""
+
+    def __init__(self, throughput_window_s=THROUGHPUT_WINDOW_S, lag_window=LAG_WINDOW):
+        self.throughput_window_s = throughput_window_s
+        self.counters = {"received": 0, "parse_errors": 0, "invalid_inputs": 0,
+                         "scored": 0, "alerts": 0, "batches": 0}
+        self.blocked_s = 0.0
+        self.queue_depth = 0
+        self.queue_capacity = 0
+        self.started = time.time()
+        self._batches = deque(maxlen=lag_window)
+        self._lags = deque(maxlen=lag_window)
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for key, count in counts.items():
+                self.counters[key] += count
+
+    def add_blocked(self, seconds):
+        """累计读取端因队列已满而等待的时间"""
+        with self._lock:
+            self.blocked_s += seconds
+
+    def record_batch(self, rows, lags):
+        now = time.time()
+        with self._lock:
+            self.counters["batches"] += 1
+            self._batches.append((now, rows))
+            self._lags.extend(lags)
+
+    def snapshot(self):
+        """返回当前指标字典, 吞吐量单位为行/秒, 延迟单位为秒"""
+        now = time.time()
+        with self._lock:
+            recent = [(t, rows) for t, rows in self._batches
+                      if now - t <= self.throughput_window_s]
+            lags = np.fromiter(self._lags, dtype=np.float64, count=len(self._lags))
+            result = dict(self.counters)
+            result.update(uptime_s=now - self.started, blocked_s=self.blocked_s,
+                          queue_depth=self.queue_depth, queue_capacity=self.queue_capacity)
+
+        window = min(self.throughput_window_s, now - self.started)
+        result["throughput_rps"] = sum(rows for _, rows in recent) / window if window > 0 else 0.0
+        if len(lags):
+            result.update(lag_p50_s=float(np.percentile(lags, 50)),
+                          lag_p95_s=float(np.percentile(lags, 95)),
+                          lag_max_s=float(lags.max()))
+        return result
+
+
+class StreamPipeline:
+    """持续消费记录流, 按 max_batch_size 条或 max_wait_ms 超时组成微批预测
+
+    每条记录输出一行结果到 sink; 预测值超出 OUTPUT_CONCENTRATION_RANGES 时
+    额外向 alert_sink 输出告警. 输入超出 PARAMETER_RANGES 时按 policy
+    (reject/clip/flag, 见 validation.py) 处理.
+    """
+
+    def __init__(self, predictor, prediction_type, sink, alert_sink=None,
+                 max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                 queue_size=DEFAULT_QUEUE_SIZE, metrics=None, policy=REJECT):
+        self.predictor = predictor
+        self.prediction_type = prediction_type
+        self.sink = sink
+        self.alert_sink = alert_sink
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.metrics = metrics or StreamMetrics()
+        self.metrics.queue_capacity = queue_size
+        self.optimal_range = output_range(prediction_type)
+        self.policy = policy
+
+    def _put(self, item, stop):
+        """放入队列, 队列满时阻塞 (背压), 期间仍响应 stop"""
+        started = None
+        while not stop.is_set():
+            try:
+                self.queue.put(item, timeout=POLL_INTERVAL)
+                break
+            except queue.Full:
+                started = started or time.time()
+        if started is not None:
+            self.metrics.add_blocked(time.time() - started)
+
+    def _read(self, records, stop):
+        """读取线程: 推进数据源生成器, 把解析结果送入有界队列"""
+        try:
+            for record in records:
+                if stop.is_set():
+                    break
+                if record is not None:
+                    self._put(record, stop)
+        except Exception as e:
+            self._put(e, stop)
+        finally:
+            self._put(_EOF, stop)
+
+    def batches(self, stop):
+        """从队列中组成微批, 数据源结束后产出剩余记录并停止"""
+        batch = []
+        deadline = None
+        while not stop.is_set():
+            timeout = POLL_INTERVAL if deadline is None else max(0.0, deadline - time.time())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            self.metrics.queue_depth = self.queue.qsize()
+
+            if item is _EOF or isinstance(item, Exception):
+                if batch:
+                    yield batch
+                if isinstance(item, Exception):
+                    raise item
+                return
+            if item is not None:
+                batch.append(item)
+                deadline = deadline or time.time() + self.max_wait
+            if batch and (len(batch) >= self.max_batch_size or time.time() >= deadline):
+                yield batch
+                batch = []
+                deadline = None
+
+    def score_batch(self, batch):
+        """对一个微批做向量化范围检查和预测, 返回输出记录列表"""
+        results = [None] * len(batch)
+        valid_index = []
+        rows = []
+        for i, (row, meta, _, error) in enumerate(batch):
+            if error is not None:
+                results[i] = dict(meta, prediction_type=self.prediction_type, error=error)
+            else:
+                valid_index.append(i)
+                rows.append(row)
+
+        alerts = 0
+        invalid = 0
+        scored = 0
+        if rows:
+            validation = validate_inputs(rows, self.prediction_type, self.policy)
+            ok_rows = np.flatnonzero(validation.valid_rows)
+            predictions, version = self.predictor.predict_versioned(validation.matrix[ok_rows],
+                                                                    self.prediction_type)
+            in_range = output_in_range(predictions, self.prediction_type)
+
+            for j, value, ok in zip(ok_rows, predictions.tolist(), in_range.tolist()):
+                i = valid_index[j]
+                results[i] = dict(batch[i][1], prediction_type=self.prediction_type,
+                                  prediction=value, unit="g/L", in_range=ok,
+                                  optimal_range=self.optimal_range, model_version=version)
+                if validation.invalid[j]:
+                    # clip/flag 策略下预测照常输出, 同时列出超出范围的原始输入
+                    results[i]["invalid_parameters"] = validation.describe_row(j, rows[j])
+                if not ok:
+                    alerts += 1
+            for j in np.flatnonzero(~validation.valid_rows):
+                i = valid_index[j]
+                results[i] = dict(batch[i][1], prediction_type=self.prediction_type,
+                                  error="参数值不在允许范围内",
+                                  invalid_parameters=validation.describe_row(j, rows[j]))
+            invalid = validation.invalid_count
+            scored = len(ok_rows)
+
+        self.metrics.add(received=len(batch), parse_errors=len(batch) - len(rows),
+                         invalid_inputs=invalid, scored=scored, alerts=alerts)
+        return results
+
+    def run(self, records, stop=None, on_stats=None, stats_interval=None):
+        """消费 parse_records 产出的记录直到数据源结束或 stop 被设置"""
+        stop = stop or threading.Event()
+        reader = threading.Thread(target=self._read, args=(records, stop),
+                                  name="stream-reader", daemon=True)
+        reader.start()
+        next_stats = time.time() + stats_interval if stats_interval else None
+        try:
+            for batch in self.batches(stop):
+                results = self.score_batch(batch)
+                now = time.time()
+                lags = []
+                for (_, meta, received, _), result in zip(batch, results):
+                    self.sink.write(result)
+                    if self.alert_sink is not None and result.get("in_range") is False:
+                        self.alert_sink.write(dict(result, alert="out_of_range"))
+                    event = event_time(meta.get("timestamp"))
+                    lags.append(now - (received if event is None else event))
+                self.sink.flush()
+                if self.alert_sink is not None:
+                    self.alert_sink.flush()
+                self.metrics.record_batch(len(batch), lags)
+
+                if next_stats is not None and now >= next_stats and on_stats is not None:
+                    on_stats(self.metrics.snapshot())
+                    next_stats = now + stats_interval
+        finally:
+            stop.set()
+            reader.join(timeout=1.0)
+        return self.metrics.snapshot()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="持续读取实时数据并流式预测出口离子浓度")
+    parser.add_argument("prediction_type", choices=PREDICTION_TYPES)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--follow", metavar="PATH",
+                        help="持续读取追加写入的 CSV 或 JSON-lines 文件")
+    source.add_argument("--read", metavar="PATH", help="读取文件到末尾后退出")
+    source.add_argument("--listen", metavar="HOST:PORT", help="监听本地 TCP 端口, 每行一条记录")
+    parser.add_argument("--from-end", action="store_true", help="--follow 时跳过文件中已有的内容")
+    parser.add_argument("-o", "--output", help="预测结果输出文件 (JSON-lines), 默认标准输出")
+    parser.add_argument("--alerts", help="超出最佳范围的告警输出文件, 默认标准错误")
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS,
+                        help="组成微批的最长等待时间 (毫秒)")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="待预测记录队列上限, 队满时暂停读取")
+    parser.add_argument("--stats-interval", type=float, default=10.0,
+                        help="每隔多少秒向标准错误输出一次吞吐量和延迟指标 (0 表示关闭)")
+    parser.add_argument("--invalid", choices=POLICIES, default=REJECT,
+                        help="输入超出范围时: reject 不预测, clip 裁剪到范围内后预测, flag 照常预测并标记")
+    parser.add_argument("--model-dir", default=BASE_DIR, help="模型和scaler所在目录")
+    parser.add_argument("--fused", action="store_true", help="使用 fused.py 导出的融合模型")
+    parser.add_argument("--watch", action="store_true",
+                        help="监视模型目录, 产物更新后不中断数据流切换到新版本")
+    parser.add_argument("--metrics-interval", type=float, default=0,
+                        help="记录分阶段耗时并每隔多少秒向标准错误输出一行摘要 (0 表示关闭)")
+    args = parser.parse_args(argv)
+    if args.watch and args.fused:
+        parser.error("--watch 不支持融合模型")
+    if args.metrics_interval > 0:
+        METRICS.enable()
+        log_periodically(args.metrics_interval, lambda line: print(line, file=sys.stderr))
+
+    stop = threading.Event()
+    if args.listen:
+        host, _, port = args.listen.rpartition(":")
+        lines = socket_lines(host or "127.0.0.1", int(port), stop=stop,
+                             on_listen=lambda address: print(f"正在监听 {address[0]}:{address[1]}",
+                                                             file=sys.stderr))
+    else:
+        lines = tail_lines(args.follow or args.read, follow=bool(args.follow),
+                           from_end=args.from_end, stop=stop)
+
+    output = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    alerts = open(args.alerts, "a", encoding="utf-8") if args.alerts else sys.stderr
+    loader = (ModelRegistry([args.prediction_type], args.model_dir,
+                            on_swap=lambda old, new: print(f"{new.prediction_type} 已切换到 "
+                                                           f"v{new.version}", file=sys.stderr))
+              if args.watch else None)
+    predictor = BatchPredictor([args.prediction_type], args.model_dir, loader=loader,
+                               fused=args.fused)
+    pipeline = StreamPipeline(predictor, args.prediction_type, JsonLinesSink(output),
+                              JsonLinesSink(alerts), args.max_batch_size, args.max_wait_ms,
+                              args.queue_size, policy=args.invalid)
+
+    def print_stats(stats):
+        print(f"流式预测指标: {json.dumps(stats, ensure_ascii=False)}", file=sys.stderr)
+
+    try:
+        stats = pipeline.run(parse_records(lines, args.prediction_type), stop, print_stats,
+                             args.stats_interval or None)
+        print_stats(stats)
+    except KeyboardInterrupt:
+        stop.set()
+        print_stats(pipeline.metrics.snapshot())
+    finally:
+        if args.output:
+            output.close()
+        if args.alerts:
+            alerts.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
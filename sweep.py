@@ -0,0 +1,153 @@
+"""单参数/双参数敏感性扫描: 其余参数固定, 在 PARAMETER_RANGES 内扫描一条曲线或一张网格
+
+用法示例:
+    python sweep.py OAC_W "Current Density" --y Electrolyte_Time --num 500 -o sweep.csv
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from config import PREDICTION_TYPES, PARAMETER_RANGES, INPUT_ORDER, default_values
+from loader import BASE_DIR
+from predictor import BatchPredictor
+from validation import output_in_range, output_range
+
+# 每次送入模型的网格点数, 同时也是生成网格时的分块大小
+SWEEP_CHUNK_SIZE = 32768
+
+# 单轴最大分辨率
+MAX_RESOLUTION = 1000
+
+
+def base_row(base_values, prediction_type):
+    """把基准输入 (字典或按 INPUT_ORDER 排列的序列) 转为一维数组"""
+    input_order = INPUT_ORDER[prediction_type]
+    if isinstance(base_values, dict):
+        missing = [key for key in input_order if key not in base_values]
+        if missing:
+            raise ValueError(f"{prediction_type} 缺少基准参数: {', '.join(missing)}")
+        return np.array([base_values[key] for key in input_order], dtype=np.float64)
+
+    row = np.asarray(base_values, dtype=np.float64).reshape(-1)
+    if len(row) != len(input_order):
+        raise ValueError(f"{prediction_type} 需要 {len(input_order)} 个基准参数, 实际为 {len(row)}")
+    return row
+
+
+def sweep_axis(param, num, value_range=None):
+    """某参数的扫描取值, 默认覆盖其 PARAMETER_RANGES"""
+    if not 2 <= num <= MAX_RESOLUTION:
+        raise ValueError(f"扫描分辨率需在 2 – {MAX_RESOLUTION} 之间, 实际为 {num}")
+    low, high = value_range or PARAMETER_RANGES[param]
+    return np.linspace(low, high, num)
+
+
+def sweep(predictor, prediction_type, base_values, params, num=200, value_ranges=None,
+          chunk_size=SWEEP_CHUNK_SIZE):
+    """扫描一个或两个参数, 返回网格上的预测值
+
+    网格按块生成并预测, 内存占用与 chunk_size × 特征数 成正比, 与网格总大小无关.
+    返回字典: params, axes, predictions (形状与 axes 长度一致), in_range, optimal_range
+    """
+    params = [params] if isinstance(params, str) else list(params)
+    if not 1 <= len(params) <= 2 or len(set(params)) != len(params):
+        raise ValueError("只支持扫描一个或两个不同的参数")
+    input_order = INPUT_ORDER[prediction_type]
+    unknown = [param for param in params if param not in input_order]
+    if unknown:
+        raise ValueError(f"{prediction_type} 不使用参数: {', '.join(unknown)}")
+
+    nums = [num] * len(params) if np.isscalar(num) else list(num)
+    value_ranges = value_ranges or [None] * len(params)
+    axes = [sweep_axis(param, n, r) for param, n, r in zip(params, nums, value_ranges)]
+    columns = [input_order.index(param) for param in params]
+    shape = tuple(len(axis) for axis in axes)
+    total = int(np.prod(shape))
+
+    row = base_row(base_values, prediction_type)
+    predictions = np.empty(total, dtype=np.float64)
+    for start in range(0, total, chunk_size):
+        flat_index = np.arange(start, min(start + chunk_size, total))
+        block = np.repeat(row[None, :], len(flat_index), axis=0)
+        for column, axis, index in zip(columns, axes, np.unravel_index(flat_index, shape)):
+            block[:, column] = axis[index]
+        predictions[start:start + len(flat_index)] = predictor.predict_matrix(block, prediction_type)
+
+    predictions = predictions.reshape(shape)
+    return {
+        "prediction_type": prediction_type,
+        "params": params,
+        "axes": axes,
+        "predictions": predictions,
+        "in_range": output_in_range(predictions, prediction_type),
+        "optimal_range": output_range(prediction_type),
+    }
+
+
+def sweep_1d(predictor, prediction_type, base_values, param, num=200, value_range=None):
+    """单参数扫描曲线"""
+    return sweep(predictor, prediction_type, base_values, [param], num, [value_range])
+
+
+def sweep_2d(predictor, prediction_type, base_values, param_x, param_y, num_x=200, num_y=200,
+             range_x=None, range_y=None):
+    """双参数扫描网格, predictions[i, j] 对应 (axes[0][i], axes[1][j])"""
+    return sweep(predictor, prediction_type, base_values, [param_x, param_y],
+                 [num_x, num_y], [range_x, range_y])
+
+
+def to_table(result):
+    """把扫描结果展开为 (参数列..., prediction, in_range) 的二维数组和表头"""
+    grids = np.meshgrid(*result["axes"], indexing="ij")
+    columns = [grid.ravel() for grid in grids]
+    columns += [result["predictions"].ravel(), result["in_range"].ravel().astype(np.float64)]
+    header = list(result["params"]) + [result["prediction_type"], "in_range"]
+    return np.column_stack(columns), header
+
+
+def parse_overrides(items):
+    """解析 --set 参数名=数值"""
+    overrides = {}
+    for item in items or []:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"--set 需要 参数名=数值 的格式: {item}")
+        overrides[key.strip()] = float(value)
+    return overrides
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="在 PARAMETER_RANGES 内做敏感性扫描")
+    parser.add_argument("prediction_type", choices=PREDICTION_TYPES)
+    parser.add_argument("x", help="扫描的第一个参数")
+    parser.add_argument("--y", help="扫描的第二个参数 (可选)")
+    parser.add_argument("--num", type=int, default=200, help="每个参数的取值个数")
+    parser.add_argument("--set", action="append", metavar="NAME=VALUE",
+                        help="覆盖默认的固定参数值, 可重复")
+    parser.add_argument("-o", "--output", help="输出 CSV 文件, 默认只打印摘要")
+    parser.add_argument("--model-dir", default=BASE_DIR, help="模型和scaler所在目录")
+    parser.add_argument("--fused", action="store_true", help="使用 fused.py 导出的融合模型")
+    args = parser.parse_args(argv)
+
+    base_values = default_values(args.prediction_type)
+    base_values.update(parse_overrides(args.set))
+    predictor = BatchPredictor([args.prediction_type], args.model_dir, fused=args.fused)
+    params = [args.x] + ([args.y] if args.y else [])
+    result = sweep(predictor, args.prediction_type, base_values, params, args.num)
+
+    predictions = result["predictions"]
+    print(f"{args.prediction_type} 扫描 {' × '.join(params)}: {predictions.size} 个点, "
+          f"预测范围 {predictions.min():.3f} – {predictions.max():.3f} g/L, "
+          f"最佳范围内占比 {result['in_range'].mean():.1%}")
+
+    if args.output:
+        table, header = to_table(result)
+        np.savetxt(args.output, table, delimiter=",", header=",".join(header), comments="",
+                   fmt="%.6g")
+        print(f"扫描结果已写入 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
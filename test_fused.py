@@ -0,0 +1,63 @@
+"""融合模型与原始三步预测 (scaler_X -> model -> scaler_y) 的一致性测试
+
+运行: python -m pytest -q test_fused.py
+"""
+import numpy as np
+import pytest
+
+from config import PREDICTION_TYPES
+from fused import FusedModel, sample_inputs
+from loader import load_artifacts
+from predictor import predict_array
+
+# 融合后只差浮点运算顺序, 实测最大误差约 1.4e-14 g/L
+ATOL = 1e-9
+N_SAMPLES = 5000
+
+
+def fused_and_original(prediction_type):
+    model_info = load_artifacts(prediction_type, use_bundle=False)
+    return FusedModel.from_artifacts(prediction_type, model_info), model_info
+
+
+def border_inputs(fused_model, seed=0):
+    """每个分裂各取阈值本身及其相邻的两个 float64 作为该特征的输入, 其余特征随机"""
+    ensemble = fused_model.ensemble
+    if ensemble.kind == "oblivious":
+        features, borders = ensemble.features.ravel(), ensemble.borders.ravel()
+    else:
+        is_leaf = (ensemble.left == np.arange(ensemble.n_nodes)[None, :]).ravel()
+        features = ensemble.feature.ravel()[~is_leaf]
+        borders = ensemble.threshold.ravel()[~is_leaf]
+    finite = np.isfinite(borders)
+    features, borders = features[finite], borders[finite]
+
+    values = np.concatenate([borders, np.nextafter(borders, np.inf),
+                             np.nextafter(borders, -np.inf)])
+    columns = np.tile(features, 3)
+    X = sample_inputs(fused_model.prediction_type, len(values), seed)[1:]
+    X[np.arange(len(values)), columns] = values
+    return X
+
+
+@pytest.mark.parametrize("prediction_type", PREDICTION_TYPES)
+@pytest.mark.parametrize("seed", [0, 1])
+def test_fused_matches_predict_array(prediction_type, seed):
+    fused_model, model_info = fused_and_original(prediction_type)
+    X = sample_inputs(prediction_type, N_SAMPLES, seed)
+
+    expected = predict_array(model_info, X)
+    actual = fused_model.predict(X)
+
+    assert actual.shape == expected.shape
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=ATOL)
+
+
+@pytest.mark.parametrize("prediction_type", PREDICTION_TYPES)
+def test_fused_matches_predict_array_at_split_borders(prediction_type):
+    # 原始模型以 float32 比较归一化后的特征, 阈值附近的输入最容易走错分支
+    fused_model, model_info = fused_and_original(prediction_type)
+    X = border_inputs(fused_model)
+
+    np.testing.assert_allclose(fused_model.predict(X), predict_array(model_info, X),
+                               rtol=0, atol=ATOL)
@@ -0,0 +1,174 @@
+"""电解周期轨迹预测: 多组工况 (如各槽组) × Electrolyte_Time 时间轴一次批量预测
+
+每组工况的其余输入在整个时间轴上不变, 只改写时间列; 工况按块展开为
+(工况数, 时间点数, 特征数) 的张量后整块送入模型, 不逐行构造输入.
+返回每条轨迹首次离开 OUTPUT_CONCENTRATION_RANGES 的时间.
+
+用法示例:
+    python trajectory.py OAC_W OCC_W --states tank_groups.csv --id-column tank_group -o traj.csv
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from config import PREDICTION_TYPES, PARAMETER_RANGES, INPUT_ORDER, default_values
+from loader import BASE_DIR
+from predictor import BatchPredictor, read_table, write_table, to_feature_matrix
+from sweep import parse_overrides
+from validation import validate_inputs, output_in_range, output_range
+
+TIME_PARAM = "Electrolyte_Time"
+
+# 每次送入模型的行数 (工况数 × 时间点数)
+TRAJECTORY_CHUNK_SIZE = 65536
+
+# 摘要中逐条列出离开最佳范围的工况数上限
+MAX_LISTED_STATES = 20
+
+
+def time_axis(start=None, stop=None, step=1.0):
+    """时间轴 (天), 默认以 step 为间隔覆盖 Electrolyte_Time 的 PARAMETER_RANGES"""
+    low, high = PARAMETER_RANGES[TIME_PARAM]
+    start = low if start is None else start
+    stop = high if stop is None else stop
+    if not low <= start < stop <= high:
+        raise ValueError(f"时间轴需在 {low} – {high} 天之内, 实际为 {start} – {stop}")
+    if step <= 0:
+        raise ValueError(f"时间步长必须为正数, 实际为 {step}")
+    # 按整数步数生成, 避免 arange 的浮点误差在 stop 前留下一个几乎重合的点
+    count = int(np.floor((stop - start) / step + 1e-9))
+    times = start + step * np.arange(count + 1, dtype=np.float64)
+    if stop - times[-1] > step * 1e-9:
+        return np.append(times, stop)
+    times[-1] = stop
+    return times
+
+
+def first_exit(times, in_range):
+    """每条轨迹首次超出最佳范围的时间, 一直在范围内时为 NaN, 起点即超出时为 times[0];
+    in_range 形状为 (S, T)"""
+    outside = ~in_range
+    left = outside.any(axis=1)
+    return np.where(left, times[outside.argmax(axis=1)], np.nan)
+
+
+def forecast(predictor, prediction_type, states, times=None, chunk_size=TRAJECTORY_CHUNK_SIZE):
+    """预测每组工况在时间轴上的浓度轨迹
+
+    states 为按 INPUT_ORDER 排列的 S×F 矩阵、DataFrame 或字典, 其中的 Electrolyte_Time
+    列会被时间轴取代. 返回字典: times, predictions 和 in_range (形状为 S×T),
+    first_exit (长度为 S), optimal_range
+    """
+    times = time_axis() if times is None else np.asarray(times, dtype=np.float64)
+    states = to_feature_matrix(states, prediction_type).copy()
+    time_column = INPUT_ORDER[prediction_type].index(TIME_PARAM)
+
+    # 时间列用范围内的值代替后校验其余参数
+    states[:, time_column] = times[0]
+    validation = validate_inputs(states, prediction_type)
+    if not validation.ok:
+        bad = np.flatnonzero(validation.invalid)
+        names = sorted({item["name"] for i in bad for item in validation.describe_row(i)})
+        raise ValueError(f"{prediction_type} 第 {', '.join(str(i) for i in bad[:10])} 组工况"
+                         f"参数超出允许范围: {', '.join(names)}")
+
+    n_states, n_times, n_features = len(states), len(times), states.shape[1]
+    per_chunk = max(1, chunk_size // max(1, n_times))
+    block = np.empty((min(per_chunk, n_states), n_times, n_features), dtype=np.float64)
+    predictions = np.empty((n_states, n_times), dtype=np.float64)
+    for start in range(0, n_states, per_chunk):
+        count = min(per_chunk, n_states - start)
+        tensor = block[:count]
+        tensor[:] = states[start:start + count, None, :]
+        tensor[:, :, time_column] = times
+        predictions[start:start + count] = predictor.predict_matrix(
+            tensor.reshape(-1, n_features), prediction_type).reshape(count, n_times)
+
+    in_range = output_in_range(predictions, prediction_type)
+    return {
+        "prediction_type": prediction_type,
+        "times": times,
+        "predictions": predictions,
+        "in_range": in_range,
+        "first_exit": first_exit(times, in_range),
+        "optimal_range": output_range(prediction_type),
+    }
+
+
+def to_frame(results, ids):
+    """把多个预测类型的轨迹展开为 (工况, Electrolyte_Time, 各类型预测值, 各类型 in_range) 长表"""
+    import pandas as pd
+
+    first = next(iter(results.values()))
+    n_states, n_times = first["predictions"].shape
+    frame = pd.DataFrame({"state": np.repeat(np.asarray(ids), n_times),
+                          TIME_PARAM: np.tile(first["times"], n_states)})
+    for pred_type, result in results.items():
+        frame[pred_type] = result["predictions"].ravel()
+        frame[f"{pred_type}_in_range"] = result["in_range"].ravel()
+    return frame
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="预测各组工况在整个电解周期内的浓度轨迹")
+    parser.add_argument("prediction_types", nargs="+", choices=PREDICTION_TYPES,
+                        metavar="prediction_type", help=", ".join(PREDICTION_TYPES))
+    parser.add_argument("--states", help="工况表 (CSV/Parquet), 每行一组工况, 列名与 INPUT_ORDER 一致;"
+                                         " 默认为 PARAMETERS_CONFIG 中的一组默认值")
+    parser.add_argument("--id-column", help="工况表中标识槽组的列, 默认为行号")
+    parser.add_argument("--set", action="append", metavar="NAME=VALUE",
+                        help="未提供 --states 时覆盖默认参数值, 可重复")
+    parser.add_argument("--start", type=float, help="起始天数, 默认为 Electrolyte_Time 下限")
+    parser.add_argument("--stop", type=float, help="结束天数, 默认为 Electrolyte_Time 上限")
+    parser.add_argument("--step", type=float, default=1.0, help="时间步长 (天)")
+    parser.add_argument("-o", "--output", help="轨迹长表输出文件 (CSV/Parquet)")
+    parser.add_argument("--model-dir", default=BASE_DIR, help="模型和scaler所在目录")
+    parser.add_argument("--fused", action="store_true", help="使用 fused.py 导出的融合模型")
+    args = parser.parse_args(argv)
+
+    times = time_axis(args.start, args.stop, args.step)
+    overrides = parse_overrides(args.set)
+    unknown = [key for key in overrides
+               if not any(key in INPUT_ORDER[pred_type] for pred_type in args.prediction_types)]
+    if unknown:
+        parser.error(f"未知的参数: {', '.join(unknown)}")
+    frame = read_table(args.states) if args.states else None
+    if frame is not None and args.id_column and args.id_column not in frame.columns:
+        parser.error(f"工况表中没有列 {args.id_column}")
+
+    predictor = BatchPredictor(args.prediction_types, args.model_dir, fused=args.fused)
+    results = {}
+    for pred_type in args.prediction_types:
+        if frame is None:
+            states = default_values(pred_type)
+            states.update({key: value for key, value in overrides.items() if key in states})
+            states = {key: [value] for key, value in states.items()}
+        else:
+            states = frame
+        results[pred_type] = forecast(predictor, pred_type, states, times)
+
+    n_states = len(next(iter(results.values()))["predictions"])
+    ids = (frame[args.id_column].to_numpy() if frame is not None and args.id_column
+           else np.arange(n_states))
+    print(f"{n_states} 组工况 × {len(times)} 个时间点 ({times[0]:g} – {times[-1]:g} 天)")
+    for pred_type, result in results.items():
+        low, high = result["optimal_range"]
+        exits = result["first_exit"]
+        print(f"{pred_type} (最佳范围 {low} – {high} g/L): "
+              f"{int(np.isnan(exits).sum())} 组全程在范围内, "
+              f"{int((exits == times[0]).sum())} 组起点即超出范围")
+        leaving = np.flatnonzero(exits > times[0])
+        for i in leaving[np.argsort(exits[leaving], kind="stable")][:MAX_LISTED_STATES]:
+            print(f"    {ids[i]}: 第 {exits[i]:g} 天离开最佳范围")
+        if len(leaving) > MAX_LISTED_STATES:
+            print(f"    ... 另有 {len(leaving) - MAX_LISTED_STATES} 组")
+
+    if args.output:
+        write_table(to_frame(results, ids), args.output)
+        print(f"轨迹已写入 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
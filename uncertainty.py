@@ -0,0 +1,243 @@
+"""预测区间和落入最佳范围的概率, 与点预测在同一次树集成遍历中得到
+
+成员预测的来源 (结果中的 method):
+    residual     有与当前产物一致的残差校准文件 residuals_<类型>.json 时, 成员预测为
+                 点预测加上留出集残差 (观测值 − 预测值) 的分位数, 即经验预测区间
+    ensemble     OCC_W (AdaBoost) 各回归树的输出, 权重为 estimator_weights; 点预测为其
+                 加权中位数, 区间为加权分位数
+    convergence  OAC_W/OCC_D (CatBoost) 没有残差校准时的虚拟集成: 在后一半迭代中均匀选取
+                 virtual_ensembles 个截断位置的分阶段预测, 以完整模型的预测为中心平移.
+                 它只反映模型在后期迭代中的变化幅度 (收敛程度), 收敛的模型上区间极窄,
+                 不是预测区间, 其 prob_in_range 也不能与前两种比较
+成员预测经 scaler_y 逆变换为 g/L 后再计算区间和概率.
+
+残差校准由 retrain.py 在写出新产物时用留出集生成, 也可对现有模型单独生成:
+    python uncertainty.py OAC_W lab_holdout.csv
+
+用法示例:
+    result = predict_with_uncertainty(model_info, X, "OCC_W", level=0.9)
+    result["lower"], result["upper"], result["prob_in_range"], result["method"]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import weakref
+
+import numpy as np
+
+from config import PREDICTION_TYPES
+from fused import (EVAL_CHUNK_SIZE, ObliviousTreeEnsemble, WeightedMedianTreeEnsemble,
+                   ensemble_from_model)
+from loader import BASE_DIR, source_records, stale_sources
+from validation import output_range
+
+DEFAULT_LEVEL = 0.9
+DEFAULT_VIRTUAL_ENSEMBLES = 20
+
+RESIDUAL = "residual"
+ENSEMBLE = "ensemble"
+CONVERGENCE = "convergence"
+
+RESIDUALS_FILE_PATTERN = "residuals_{}.json"
+# 残差校准保存的分位数个数 (0%, 1%, ..., 100%), 每个分位数作为一个等权成员
+RESIDUAL_QUANTILES = 101
+MIN_CALIBRATION_ROWS = 20
+
+# 结果字典中每行一个值的字段
+UNCERTAINTY_KEYS = ("prediction", "lower", "upper", "std", "prob_in_range")
+
+# id(原始模型) → 数组化集成; 导出 CatBoost 模型较慢, 每个模型只导出一次,
+# 模型对象被回收时移除 (CatBoost 模型不可哈希, 不能用 WeakKeyDictionary)
+_ensembles = {}
+
+
+def model_ensemble(model):
+    """返回模型对应的数组化集成; 模型包中的 TreeModel 直接使用其 ensemble 属性"""
+    ensemble = getattr(model, "ensemble", None)
+    if ensemble is not None:
+        return ensemble
+    key = id(model)
+    ensemble = _ensembles.get(key)
+    if ensemble is None:
+        ensemble = _ensembles[key] = ensemble_from_model(model)
+        weakref.finalize(model, _ensembles.pop, key, None)
+    return ensemble
+
+
+def residuals_path(prediction_type, base_dir=BASE_DIR):
+    return os.path.join(base_dir, RESIDUALS_FILE_PATTERN.format(prediction_type))
+
+
+def write_residuals(prediction_type, residuals, base_dir=BASE_DIR):
+    """把留出集残差 (观测值 − 预测值, g/L) 的分位数写入残差校准文件, 并记录来源产物"""
+    residuals = np.asarray(residuals, dtype=np.float64)
+    residuals = residuals[np.isfinite(residuals)]
+    if len(residuals) < MIN_CALIBRATION_ROWS:
+        raise ValueError(f"{prediction_type} 只有 {len(residuals)} 个残差, "
+                         f"至少需要 {MIN_CALIBRATION_ROWS} 个才能校准预测区间")
+    calibration = {
+        "prediction_type": prediction_type,
+        "rows": len(residuals),
+        "rmse": float(np.sqrt(np.mean(residuals ** 2))),
+        "quantiles": np.quantile(residuals, np.linspace(0, 1, RESIDUAL_QUANTILES)).tolist(),
+        "sources": source_records(prediction_type, base_dir),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    path = residuals_path(prediction_type, base_dir)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(calibration, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return calibration
+
+
+def load_residuals(prediction_type, base_dir=BASE_DIR):
+    """与当前原始产物一致的残差分位数数组; 文件不存在或产物已更新 (校准过期) 时返回 None"""
+    try:
+        with open(residuals_path(prediction_type, base_dir), encoding="utf-8") as f:
+            calibration = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if stale_sources(calibration.get("sources", {}), prediction_type, base_dir):
+        return None
+    return np.asarray(calibration["quantiles"], dtype=np.float64)
+
+
+def interval_method(ensemble, residuals=None):
+    """区间的来源: residual、ensemble 或 convergence, 见模块说明"""
+    if residuals is not None:
+        return RESIDUAL
+    return ENSEMBLE if isinstance(ensemble, WeightedMedianTreeEnsemble) else CONVERGENCE
+
+
+def member_predictions(ensemble, X, virtual_ensembles=DEFAULT_VIRTUAL_ENSEMBLES):
+    """一次遍历树集成, 返回 (点预测 (N,), 成员预测 (N, M), 成员权重 (M,)), 单位与集成输出相同"""
+    if isinstance(ensemble, WeightedMedianTreeEnsemble):
+        outputs = ensemble.tree_outputs(X)
+        return ensemble.weighted_median(outputs), outputs, ensemble.weights
+    if isinstance(ensemble, ObliviousTreeEnsemble):
+        staged = np.cumsum(ensemble.tree_outputs(X), axis=0)
+        staged += ensemble.bias
+        point = staged[-1]
+        stages = np.unique(np.linspace(ensemble.n_trees // 2, ensemble.n_trees - 1,
+                                       max(2, virtual_ensembles)).round().astype(np.intp))
+        virtual = staged[stages].T
+        members = point[:, None] + (virtual - virtual.mean(axis=1, keepdims=True))
+        return point, members, np.ones(len(stages))
+    raise TypeError(f"不支持计算预测区间的集成类型: {type(ensemble).__name__}")
+
+
+def weighted_quantiles(members, weights, quantiles):
+    """按行计算加权分位数, 返回形状 (len(quantiles), N); 取法与 AdaBoost 的加权中位数一致"""
+    rows = np.arange(len(members))
+    sorted_idx = np.argsort(members, axis=1)
+    weight_cdf = np.cumsum(weights[sorted_idx], axis=1)
+    total = weight_cdf[:, -1][:, None]
+    result = np.empty((len(quantiles), len(members)), dtype=np.float64)
+    for i, q in enumerate(quantiles):
+        index = (weight_cdf >= q * total).argmax(axis=1)
+        result[i] = members[rows, sorted_idx[rows, index]]
+    return result
+
+
+def summarize(point, members, weights, prediction_type, level=DEFAULT_LEVEL):
+    """由 g/L 单位的点预测和成员预测计算区间、加权标准差和落入最佳范围的概率"""
+    alpha = (1.0 - level) / 2.0
+    lower, upper = weighted_quantiles(members, weights, [alpha, 1.0 - alpha])
+    normalized = weights / weights.sum()
+    mean = members @ normalized
+    std = np.sqrt(((members - mean[:, None]) ** 2) @ normalized)
+
+    limits = output_range(prediction_type)
+    if limits is None:
+        prob_in_range = np.ones(len(point))
+    else:
+        inside = (members >= limits[0]) & (members <= limits[1])
+        prob_in_range = np.minimum(inside @ normalized, 1.0)
+    return {"prediction": point, "lower": lower, "upper": upper, "std": std,
+            "prob_in_range": prob_in_range, "level": level}
+
+
+def _inverse_scale(scaler_y, values):
+    shape = values.shape
+    return np.maximum(scaler_y.inverse_transform(values.reshape(-1, 1)).reshape(shape), 0)
+
+
+def predict_with_uncertainty(model_info, X, prediction_type, level=DEFAULT_LEVEL,
+                             virtual_ensembles=DEFAULT_VIRTUAL_ENSEMBLES, folded=None,
+                             residuals=None):
+    """对 N×F 矩阵 (原始单位) 返回点预测、区间和概率, 各为长度 N 的数组, 以及 method
+
+    model_info 为 {"model", "scaler_X", "scaler_y"}; 使用融合模型时改为传入 folded
+    (已折叠 scaler 的集成, 输出即为 g/L). residuals 为 load_residuals 返回的残差分位数,
+    给出时区间由点预测加残差得到. 点预测取自同一次遍历, 与 predict_array 的差异
+    只来自导出数组化集成时的浮点舍入.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    if folded is None:
+        ensemble = model_ensemble(model_info["model"])
+        scaler_X, scaler_y = model_info["scaler_X"], model_info["scaler_y"]
+    else:
+        ensemble = folded
+
+    parts = []
+    for start in range(0, len(X), EVAL_CHUNK_SIZE):
+        block = X[start:start + EVAL_CHUNK_SIZE]
+        if folded is None:
+            # 与 CatBoost 和 sklearn 的树一致, 以 float32 的特征值与阈值比较
+            block = scaler_X.transform(block).astype(np.float32)
+        if residuals is None:
+            point, members, weights = member_predictions(ensemble, block, virtual_ensembles)
+        else:
+            point, members, weights = ensemble.predict(block), None, np.ones(len(residuals))
+        if folded is None:
+            point = _inverse_scale(scaler_y, point)
+            members = None if members is None else _inverse_scale(scaler_y, members)
+        else:
+            point = np.maximum(point, 0)
+            members = None if members is None else np.maximum(members, 0)
+        if members is None:
+            members = np.maximum(point[:, None] + residuals, 0)
+        parts.append(summarize(point, members, weights, prediction_type, level))
+
+    result = {key: (np.concatenate([part[key] for part in parts]) if parts
+                    else np.empty(0, dtype=np.float64))
+              for key in UNCERTAINTY_KEYS}
+    result.update(level=level, method=interval_method(ensemble, residuals))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="用带标签的留出数据为当前模型生成残差校准,"
+                                                 " 使预测区间成为经验预测区间")
+    parser.add_argument("prediction_type", choices=PREDICTION_TYPES)
+    parser.add_argument("data", help="未参与训练的带标签数据 (CSV/Parquet), 列为 INPUT_ORDER 加目标列")
+    parser.add_argument("--target", help="目标列名, 默认与预测类型相同")
+    parser.add_argument("--model-dir", default=BASE_DIR, help="模型和scaler所在目录, 校准文件也写入此处")
+    args = parser.parse_args(argv)
+
+    from loader import load_artifacts
+    from predictor import predict_array
+    from retrain import labelled_chunks
+    from validation import REJECT, validate_inputs
+
+    model_info = load_artifacts(args.prediction_type, args.model_dir, use_bundle=False)
+    residuals = []
+    for X, y in labelled_chunks(args.data, args.prediction_type, args.target):
+        keep = validate_inputs(X, args.prediction_type, REJECT).valid_rows & np.isfinite(y)
+        if not keep.any():
+            continue
+        residuals.append(y[keep] - predict_array(model_info, X[keep]))
+    residuals = np.concatenate(residuals) if residuals else np.empty(0)
+    calibration = write_residuals(args.prediction_type, residuals, args.model_dir)
+    quantiles = calibration["quantiles"]
+    print(f"{args.prediction_type}: {calibration['rows']} 行残差, RMSE {calibration['rmse']:.4f} g/L, "
+          f"5%–95% 残差 {quantiles[5]:+.4f} – {quantiles[95]:+.4f} g/L, "
+          f"已写入 {residuals_path(args.prediction_type, args.model_dir)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
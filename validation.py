@@ -0,0 +1,184 @@
+"""向量化的输入校验和输出范围检查
+
+PARAMETER_RANGES 和 OUTPUT_CONCENTRATION_RANGES 按预测类型编译为上下界数组, 只生成一次
+(lru_cache). 整个 N×F 输入矩阵或 N×K 预测矩阵都用一次广播比较完成检查, 不逐行循环.
+超出范围的处理策略:
+    reject  有违规的行不参与预测 (valid_rows 为 False)
+    clip    把输入裁剪到允许范围后全部预测, mask 记录被裁剪的元素
+    flag    原样预测全部行, 只标记违规
+
+NaN/inf 视为违规; clip 无法修复 NaN, 含 NaN 的行 (flag 策略下还有含 inf 的行) 都不参与预测.
+
+用法示例:
+    result = validate_inputs(matrix, "OCC_W", policy="reject")
+    predictions = predictor.predict_matrix(result.matrix[result.valid_rows], "OCC_W")
+"""
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from config import (PARAMETER_RANGES, OUTPUT_CONCENTRATION_RANGES, INPUT_ORDER, ALL_TARGETS,
+                    COMBINED_INPUT_ORDER, PREDICTION_TYPES)
+from metrics import METRICS
+
+REJECT = "reject"
+CLIP = "clip"
+FLAG = "flag"
+POLICIES = (REJECT, CLIP, FLAG)
+
+# 按块比较, 使中间布尔数组留在 CPU 缓存中
+VALIDATION_CHUNK_ROWS = 8192
+
+
+class Bounds:
+    """某预测类型各输入列 (或各输出) 的上下界, 未配置范围的列为 (-inf, inf)"""
+
+    def __init__(self, names, low, high):
+        self.names = list(names)
+        self.low = low
+        self.high = high
+        self.low.setflags(write=False)
+        self.high.setflags(write=False)
+
+
+def input_columns(prediction_type):
+    """预测类型的输入列顺序, ALL 为 COMBINED_INPUT_ORDER"""
+    if prediction_type == ALL_TARGETS:
+        return COMBINED_INPUT_ORDER
+    return INPUT_ORDER[prediction_type]
+
+
+@lru_cache(maxsize=None)
+def input_bounds(prediction_type):
+    names = input_columns(prediction_type)
+    ranges = [PARAMETER_RANGES.get(key, (-np.inf, np.inf)) for key in names]
+    return Bounds(names, np.array([low for low, _ in ranges], dtype=np.float64),
+                  np.array([high for _, high in ranges], dtype=np.float64))
+
+
+@lru_cache(maxsize=None)
+def output_bounds(prediction_type):
+    """输出浓度的上下界数组; ALL 时按 PREDICTION_TYPES 每个预测类型一列"""
+    names = PREDICTION_TYPES if prediction_type == ALL_TARGETS else [prediction_type]
+    ranges = [OUTPUT_CONCENTRATION_RANGES.get(key, (-np.inf, np.inf)) for key in names]
+    return Bounds(names, np.array([low for low, _ in ranges], dtype=np.float64),
+                  np.array([high for _, high in ranges], dtype=np.float64))
+
+
+@lru_cache(maxsize=None)
+def output_range(prediction_type):
+    """OUTPUT_CONCENTRATION_RANGES 中的 (下限, 上限), 用于显示和报告; 未配置时为 None"""
+    limits = OUTPUT_CONCENTRATION_RANGES.get(prediction_type)
+    return None if limits is None else (float(limits[0]), float(limits[1]))
+
+
+class ValidationResult:
+    """一次校验的结果
+
+    matrix      clip 策略下为裁剪后的副本, 否则为原矩阵
+    mask        N×F 布尔矩阵, True 表示该元素超出范围 (裁剪前)
+    invalid     长度为 N, 该行是否有任一违规
+    valid_rows  长度为 N, 该行是否应参与预测 (由策略决定)
+    """
+
+    def __init__(self, prediction_type, policy, matrix, mask, invalid, valid_rows, bounds):
+        self.prediction_type = prediction_type
+        self.policy = policy
+        self.matrix = matrix
+        self.mask = mask
+        self.invalid = invalid
+        self.valid_rows = valid_rows
+        self.bounds = bounds
+
+    @property
+    def ok(self):
+        return not self.invalid.any()
+
+    @property
+    def invalid_count(self):
+        return int(self.invalid.sum())
+
+    def column_counts(self):
+        """{列名: 超出范围的行数}, 只包含有违规的列"""
+        counts = self.mask.sum(axis=0)
+        return {name: int(count) for name, count in zip(self.bounds.names, counts) if count}
+
+    def describe_row(self, i, values=None):
+        """列出第 i 行超出允许范围的参数: [{"name", "value", "min", "max"}]
+
+        values 为原始输入行 (clip 策略下 matrix 已被裁剪时用于报告原值)
+        """
+        row = self.matrix[i] if values is None else values
+        return [{"name": self.bounds.names[j], "value": float(row[j]),
+                 "min": float(self.bounds.low[j]), "max": float(self.bounds.high[j])}
+                for j in np.flatnonzero(self.mask[i])]
+
+
+def validate_inputs(matrix, prediction_type, policy=REJECT):
+    """按 PARAMETER_RANGES 校验 N×F 矩阵 (列顺序与 input_columns 一致), 返回 ValidationResult"""
+    if policy not in POLICIES:
+        raise ValueError(f"未知的校验策略: {policy}")
+    started = time.perf_counter() if METRICS.enabled else None
+    bounds = input_bounds(prediction_type)
+    matrix = np.asarray(matrix, dtype=np.float64)
+    if matrix.ndim != 2 or matrix.shape[1] != len(bounds.names):
+        raise ValueError(f"{prediction_type} 需要 {len(bounds.names)} 列输入, "
+                         f"实际形状为 {matrix.shape}")
+
+    mask = _violation_mask(matrix, bounds)
+    invalid = np.zeros(len(matrix), dtype=bool)
+    # 绝大多数批次没有违规, 整体 any() 远快于按行归约
+    if mask.any():
+        invalid = mask.any(axis=1)
+
+    valid_rows = ~invalid
+    bad_rows = np.flatnonzero(invalid)
+    if len(bad_rows) and policy == CLIP:
+        matrix = matrix.copy()
+        matrix[bad_rows] = np.clip(matrix[bad_rows], bounds.low, bounds.high)
+        valid_rows[bad_rows] = ~np.isnan(matrix[bad_rows]).any(axis=1)
+    elif len(bad_rows) and policy == FLAG:
+        valid_rows[bad_rows] = np.isfinite(matrix[bad_rows]).all(axis=1)
+
+    if started is not None:
+        METRICS.observe("stage_seconds", time.perf_counter() - started,
+                        prediction_type=prediction_type, stage="validate")
+        METRICS.increment("invalid_inputs_total", int(invalid.sum()),
+                          prediction_type=prediction_type)
+    return ValidationResult(prediction_type, policy, matrix, mask, invalid, valid_rows, bounds)
+
+
+def _violation_mask(matrix, bounds):
+    """N×F 布尔矩阵, 写成 not (low <= x <= high), NaN 与任何值比较都为 False, 因此会被标记"""
+    mask = np.empty(matrix.shape, dtype=bool)
+    scratch = np.empty((min(VALIDATION_CHUNK_ROWS, len(matrix)), matrix.shape[1]), dtype=bool)
+    for start in range(0, len(matrix), VALIDATION_CHUNK_ROWS):
+        block = matrix[start:start + VALIDATION_CHUNK_ROWS]
+        out = mask[start:start + VALIDATION_CHUNK_ROWS]
+        np.greater_equal(block, bounds.low, out=out)
+        np.less_equal(block, bounds.high, out=scratch[:len(block)])
+        out &= scratch[:len(block)]
+        np.logical_not(out, out=out)
+    return mask
+
+
+def range_violations(matrix, prediction_type):
+    """逐元素检查输入是否超出 PARAMETER_RANGES, 返回 N×F 的布尔矩阵"""
+    return validate_inputs(matrix, prediction_type, FLAG).mask
+
+
+def output_in_range(predictions, prediction_type):
+    """检查预测值是否落在 OUTPUT_CONCENTRATION_RANGES 内, 返回与 predictions 同形状的布尔数组
+
+    ALL 时 predictions 为 N×K 矩阵, 列顺序与 PREDICTION_TYPES 一致
+    """
+    predictions = np.asarray(predictions)
+    bounds = output_bounds(prediction_type)
+    if prediction_type == ALL_TARGETS:
+        low, high = bounds.low, bounds.high
+    else:
+        low, high = bounds.low[0], bounds.high[0]
+    in_range = np.greater_equal(predictions, low)
+    in_range &= predictions <= high
+    return in_range